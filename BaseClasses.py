@@ -16,6 +16,7 @@ import dataclasses
 
 from typing_extensions import NotRequired, TypedDict
 
+import generation_profile
 import NetUtils
 import Options
 import Utils
@@ -582,6 +583,7 @@ class MultiWorld():
 
         return False
 
+    @generation_profile.profiled("spheres")
     def get_spheres(self) -> Iterator[Set[Location]]:
         """
         yields a set of locations for each logical sphere
@@ -609,6 +611,7 @@ class MultiWorld():
                 state.collect(location.item, True, location)
             locations -= sphere
 
+    @generation_profile.profiled("sendable_spheres")
     def get_sendable_spheres(self) -> Iterator[Set[Location]]:
         """
         yields a set of multiserver sendable locations (location.item.code: int) for each logical sphere
@@ -652,6 +655,7 @@ class MultiWorld():
                 state.collect(location.item, True, location)
             locations -= sphere
 
+    @generation_profile.profiled("fulfills_accessibility")
     def fulfills_accessibility(self, state: Optional[CollectionState] = None):
         """Check if accessibility rules are fulfilled with current or supplied state."""
         if not state:
@@ -716,6 +720,91 @@ class MultiWorld():
         return False
 
 
+class SphereAnalysis:
+    """
+    A single sphere search over all filled locations of a multiworld, collecting events as soon as they are reachable.
+    Shared by the multidata spheres and the accessibility check at the end of generation,
+    so they don't each have to search from an empty state.
+    """
+    multiworld: MultiWorld
+    sendable_spheres: List[Set[Location]]
+    """The spheres of multiserver sendable locations, the same as yielded by `MultiWorld.get_sendable_spheres`."""
+    state: CollectionState
+    """The state after collecting every reachable location."""
+    unreachable: Set[Location]
+    """Filled locations that could not be reached."""
+
+    @generation_profile.profiled("sphere_analysis")
+    def __init__(self, multiworld: MultiWorld) -> None:
+        self.multiworld = multiworld
+        self.sendable_spheres = []
+        state = self.state = CollectionState(multiworld)
+        locations: Set[Location] = set()
+        events: Set[Location] = set()
+        for location in multiworld.get_filled_locations():
+            if type(location.item.code) is int and type(location.address) is int:
+                locations.add(location)
+            else:
+                events.add(location)
+
+        def cull_events() -> None:
+            nonlocal events
+            done_events: Set[Union[Location, None]] = {None}
+            while done_events:
+                done_events = set()
+                for event in events:
+                    if event.can_reach(state):
+                        state.collect(event.item, True, event)
+                        done_events.add(event)
+                events -= done_events
+
+        while locations:
+            cull_events()
+            sphere = {location for location in locations if location.can_reach(state)}
+            self.sendable_spheres.append(sphere)
+            if not sphere:
+                self.sendable_spheres.append(set(locations))  # unreachable locations
+                break
+
+            for location in sphere:
+                state.collect(location.item, True, location)
+            locations -= sphere
+        # events behind the last sphere still count for accessibility
+        cull_events()
+
+        self.unreachable = locations | events
+
+    @generation_profile.profiled("fulfills_accessibility")
+    def fulfills_accessibility(self) -> bool:
+        """Check if accessibility rules are fulfilled, like `MultiWorld.fulfills_accessibility` from an empty state."""
+        multiworld = self.multiworld
+        players: Dict[str, Set[int]] = {
+            "minimal": set(),
+            "items": set(),
+            "full": set()
+        }
+        for player, world in multiworld.worlds.items():
+            players[world.options.accessibility.current_key].add(player)
+
+        missing = [location for location in multiworld.get_locations()
+                   if (location.player in players["full"] or location.advancement)
+                   and (location in self.unreachable if location.item else not location.can_reach(self.state))]
+        required = [location for location in missing if location.player in players["full"]
+                    or (location.item and location.item.player not in players["minimal"])]
+        if multiworld.has_beaten_game(self.state) and not required:
+            return True
+        if missing:
+            if __debug__:
+                from Fill import FillError
+                raise FillError(
+                    f"Could not access required locations for accessibility check. Missing: {missing}",
+                    multiworld=multiworld,
+                )
+            logging.warning(f"Could not access required locations for accessibility check."
+                            f" Missing: {missing}")
+        return False
+
+
 PathValue = Tuple[str, Optional["PathValue"]]
 
 
@@ -822,16 +911,21 @@ class CollectionState():
             queue.extend(blocked_connections)
 
     def copy(self) -> CollectionState:
-        ret = CollectionState(self.multiworld)
+        # skip __init__, collecting the precollected items into ret would be wasted work
+        ret = CollectionState.__new__(CollectionState)
+        ret.multiworld = self.multiworld
         ret.prog_items = {player: counter.copy() for player, counter in self.prog_items.items()}
         ret.reachable_regions = {player: region_set.copy() for player, region_set in
                                  self.reachable_regions.items()}
         ret.blocked_connections = {player: entrance_set.copy() for player, entrance_set in
                                    self.blocked_connections.items()}
+        ret.stale = {player: True for player in self.stale}
         ret.advancements = self.advancements.copy()
         ret.path = self.path.copy()
         ret.locations_checked = self.locations_checked.copy()
         ret.allow_partial_entrances = self.allow_partial_entrances
+        for function in self.additional_init_functions:
+            function(ret, self.multiworld)
         for function in self.additional_copy_functions:
             ret = function(self, ret)
         return ret
@@ -1699,6 +1793,7 @@ class Spoiler:
             self.entrances[(entrance, direction, player)] = \
                 {"player": player, "entrance": entrance, "exit": exit_, "direction": direction}
 
+    @generation_profile.profiled("playthrough")
     def create_playthrough(self, create_paths: bool = True) -> None:
         """Destructive to the multiworld while it is run, damage gets repaired afterwards."""
         from itertools import chain
@@ -1851,6 +1946,7 @@ class Spoiler:
                         self.paths[str(multiworld.get_region('Inverted Big Bomb Shop', player))] = \
                             get_path(state, multiworld.get_region('Inverted Big Bomb Shop', player))
 
+    @generation_profile.profiled("spoiler")
     def to_file(self, filename: str) -> None:
         from itertools import chain
         from worlds import AutoWorld
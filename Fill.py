@@ -1,9 +1,11 @@
 import collections
 import itertools
 import logging
+import time
 import typing
 from collections import Counter, deque
 
+import generation_profile
 from BaseClasses import CollectionState, Item, Location, LocationProgressType, MultiWorld, PlandoItemBlock
 from Options import Accessibility
 
@@ -33,6 +35,7 @@ def sweep_from_pool(base_state: CollectionState, itempool: typing.Sequence[Item]
     return new_state
 
 
+@generation_profile.profiled("fill_restrictive", "name")
 def fill_restrictive(multiworld: MultiWorld, base_state: CollectionState, locations: typing.List[Location],
                      item_pool: typing.List[Item], single_player_placement: bool = False, lock: bool = False,
                      swap: bool = True, on_place: typing.Optional[typing.Callable[[Location], None]] = None,
@@ -254,6 +257,7 @@ def fill_restrictive(multiworld: MultiWorld, base_state: CollectionState, locati
     item_pool.extend(unplaced_items)
 
 
+@generation_profile.profiled("remaining_fill", "name")
 def remaining_fill(multiworld: MultiWorld,
                    locations: typing.List[Location],
                    itempool: typing.List[Item],
@@ -486,6 +490,7 @@ def distribute_early_items(multiworld: MultiWorld,
     return fill_locations, itempool
 
 
+@generation_profile.profiled("distribute_items_restrictive")
 def distribute_items_restrictive(multiworld: MultiWorld,
                                  panic_method: typing.Literal["swap", "raise", "start_inventory"] = "swap") -> None:
     assert all(item.location is None for item in multiworld.itempool), (
@@ -731,6 +736,7 @@ def flood_items(multiworld: MultiWorld) -> None:
                 break
 
 
+@generation_profile.profiled("balance_multiworld_progression")
 def balance_multiworld_progression(multiworld: MultiWorld) -> None:
     # A system to reduce situations where players have no checks remaining, popularly known as "BK mode."
     # Overall progression balancing algorithm:
@@ -748,6 +754,7 @@ def balance_multiworld_progression(multiworld: MultiWorld) -> None:
     else:
         logging.info(f"Balancing multiworld progression for {len(balanceable_players)} Players.")
         logging.debug(balanceable_players)
+        start = time.perf_counter()
         state: CollectionState = CollectionState(multiworld)
         checked_locations: typing.Set[Location] = set()
         unchecked_locations: typing.Set[Location] = set(multiworld.get_locations())
@@ -856,25 +863,39 @@ def balance_multiworld_progression(multiworld: MultiWorld) -> None:
                         items_to_test = list(candidate_items[player])
                         items_to_test.sort()
                         multiworld.random.shuffle(items_to_test)
-                        while items_to_test:
-                            testing = items_to_test.pop()
+
+                        def is_sufficient(kept_items: typing.Iterable[Location]) -> bool:
+                            """Check if the player still reaches its goal without the items that are not kept."""
                             reducing_state = state.copy()
                             for location in itertools.chain((
                                     l for l in items_to_replace
                                     if l.item.player == player
-                            ), items_to_test):
+                            ), kept_items):
                                 reducing_state.collect(location.item, True, location)
 
                             reducing_state.sweep_for_advancements(locations=locations_to_test)
 
                             if multiworld.has_beaten_game(balancing_state):
-                                if not multiworld.has_beaten_game(reducing_state):
-                                    items_to_replace.append(testing)
+                                return multiworld.has_beaten_game(reducing_state)
+                            reduced_sphere = get_sphere_locations(reducing_state, locations_to_test)
+                            p = item_percentage(player, reachable_locations_count[player] + len(reduced_sphere))
+                            return p >= threshold_percentages[player]
+
+                        # Each item is tested in turn, and has to be replaced if the player falls short without it
+                        # and the items that were tested before and don't have to be replaced.
+                        # As logic is monotone, if the player doesn't fall short without a whole batch of the next
+                        # items, none of them would have to be replaced one by one, so they get dropped all at once.
+                        # Batches grow while that holds and shrink down to single items to find the ones to replace.
+                        batch_size = 1
+                        while items_to_test:
+                            batch_size = min(batch_size, len(items_to_test))
+                            if is_sufficient(items_to_test[:-batch_size]):
+                                del items_to_test[-batch_size:]
+                                batch_size *= 2
+                            elif batch_size == 1:
+                                items_to_replace.append(items_to_test.pop())
                             else:
-                                reduced_sphere = get_sphere_locations(reducing_state, locations_to_test)
-                                p = item_percentage(player, reachable_locations_count[player] + len(reduced_sphere))
-                                if p < threshold_percentages[player]:
-                                    items_to_replace.append(testing)
+                                batch_size //= 2
 
                     old_moved_item_count = moved_item_count
 
@@ -921,6 +942,9 @@ def balance_multiworld_progression(multiworld: MultiWorld) -> None:
                 logging.warning("Progression Balancing ran out of paths.")
                 break
 
+        logging.info(f"Progression balancing moved {moved_item_count} items "
+                     f"in {time.perf_counter() - start:.2f} seconds.")
+
 
 def swap_location_item(location_1: Location, location_2: Location, check_locked: bool = True) -> None:
     """Swaps Items of locations. Does NOT swap flags like shop_slot or locked, but does swap event"""
@@ -1,17 +1,20 @@
 from __future__ import annotations
 
 import argparse
+import concurrent.futures
 import copy
+import hashlib
 import logging
 import os
 import random
 import string
 import sys
+import time
 import urllib.parse
 import urllib.request
 from collections import Counter
 from itertools import chain
-from typing import Any
+from typing import Any, Iterable, NamedTuple
 
 import ModuleUpdate
 
@@ -51,6 +54,16 @@ def mystery_argparse(argv: list[str] | None = None) -> argparse.Namespace:
                         help="Output rolled player options to csv (made for async multiworld).")
     parser.add_argument("--plando", default=defaults.plando_options,
                         help="List of options that can be set manually. Can be combined, for example \"bosses, items\"")
+    parser.add_argument("--roll_processes", type=int, default=defaults.roll_processes,
+                        help="Amount of processes to parse player files and roll their options in, 0 to do both in "
+                             "this process.")
+    parser.add_argument("--batch", metavar="JOBS",
+                        help="File with the options of one generation on each line, which are added to the other "
+                             "options, or - to read them from stdin as they come in. The generations run one after "
+                             "another in this process, sharing imported worlds.")
+    parser.add_argument("--batch_processes", type=int, default=0,
+                        help="Amount of processes to run the generations of --batch in, each running one after "
+                             "another. 0 to run them in this process.")
     parser.add_argument("--skip_prog_balancing", action="store_true",
                         help="Skip progression balancing step during generation.")
     parser.add_argument("--skip_output", action="store_true",
@@ -59,12 +72,23 @@ def mystery_argparse(argv: list[str] | None = None) -> argparse.Namespace:
     parser.add_argument("--spoiler_only", action="store_true",
                         help="Skips generation assertion and multidata, outputting only a spoiler log. "
                              "Intended for debugging and testing purposes.")
+    parser.add_argument("--profile_report", action="store_true",
+                        help="Write timings of each generation step and world, sweep and rule evaluation counts and "
+                             "peak memory usage as json and csv files next to the output.")
+    parser.add_argument("--checkpoint", action="store_true",
+                        help="Save the placements after filling and after progression balancing to a checkpoint "
+                             "file next to the output, to be able to --resume from there.")
+    parser.add_argument("--resume", metavar="CHECKPOINT",
+                        help="Resume a generation from a checkpoint file written with --checkpoint, using the same "
+                             "player files. Stages in the checkpoint are restored instead of run again.")
     args = parser.parse_args(argv)
 
     if args.skip_output and args.spoiler_only:
         parser.error("Cannot mix --skip_output and --spoiler_only")
     elif args.spoiler == 0 and args.spoiler_only:
         parser.error("Cannot use --spoiler_only when --spoiler=0. Use --skip_output or set --spoiler to a different value")
+    if args.race and (args.checkpoint or args.resume):
+        parser.error("Cannot use --checkpoint or --resume with --race, as race generations can't be reproduced")
 
     if not os.path.isabs(args.weights_file_path):
         args.weights_file_path = os.path.join(args.player_files_path, args.weights_file_path)
@@ -80,16 +104,24 @@ def get_seed_name(random_source) -> str:
 
 
 def main(args=None) -> tuple[argparse.Namespace, int]:
+    if not args:
+        args = mystery_argparse()
+
     # __name__ == "__main__" check so unittests that already imported worlds don't trip this.
-    if __name__ == "__main__" and "worlds" in sys.modules:
+    # generations of a batch share the imported worlds and the log of the batch
+    if __name__ == "__main__" and not args.batch and "worlds" in sys.modules:
         raise Exception("Worlds system should not be loaded before logging init.")
 
-    if not args:
-        args = mystery_argparse()
+    if args.resume:
+        from generation_checkpoint import Checkpoint
+        checkpoint_seed = Checkpoint.load(args.resume).seed
+        if args.seed is not None and args.seed != checkpoint_seed:
+            raise ValueError(f"Checkpoint {args.resume} is of seed {checkpoint_seed}, not of seed {args.seed}.")
+        args.seed = checkpoint_seed
 
     seed = get_seed(args.seed)
 
-    if __name__ == "__main__":
+    if __name__ == "__main__" and not args.batch:
         Utils.init_logging(f"Generate_{seed}", loglevel=args.log_level, add_timestamp=args.log_time)
     random.seed(seed)
     seed_name = get_seed_name(random)
@@ -126,33 +158,38 @@ def main(args=None) -> tuple[argparse.Namespace, int]:
     player_files: dict[int, str] = {}
     player_errors: list[str] = []
     allow_quantity = args.allow_quantity
+    player_file_paths: dict[str, str] = {}
     for file in os.scandir(args.player_files_path):
         fname = file.name
         if file.is_file() and not fname.startswith(".") and not fname.lower().endswith(".ini") and \
                 os.path.join(args.player_files_path, fname) not in {args.meta_file_path, args.weights_file_path}:
-            path = os.path.join(args.player_files_path, fname)
-            try:
-                weights_for_file = []
-                for doc_idx, yaml in enumerate(read_weights_yamls(path)):
-                    if yaml is None:
-                        logging.warning(f"Ignoring empty yaml document #{doc_idx + 1} in {fname}")
-                    else:
-                        quantity = yaml.get("quantity", 1)
-                        if quantity <= 0:
-                            raise ValueError("A quantity of 0 or less is invalid. Please change it to at least 1.")
-                        if not allow_quantity and quantity > 1:
-                            raise ValueError("Quantity greater than 1 is deactivated by host settings.")
-
-                        for _ in range(quantity):
-                            weights_for_file.append(yaml)
-                weights_cache[fname] = tuple(weights_for_file)
+            player_file_paths[fname] = os.path.join(args.player_files_path, fname)
+    player_file_yamls = read_all_weights_yamls(list(player_file_paths.values()), args.roll_processes)
+    for fname, yamls in zip(player_file_paths, player_file_yamls):
+        try:
+            if isinstance(yamls, Exception):
+                raise yamls
+            weights_for_file = []
+            for doc_idx, yaml in enumerate(yamls):
+                if yaml is None:
+                    logging.warning(f"Ignoring empty yaml document #{doc_idx + 1} in {fname}")
+                else:
+                    quantity = yaml.get("quantity", 1)
+                    if quantity <= 0:
+                        raise ValueError("A quantity of 0 or less is invalid. Please change it to at least 1.")
+                    if not allow_quantity and quantity > 1:
+                        raise ValueError("Quantity greater than 1 is deactivated by host settings.")
+
+                    for _ in range(quantity):
+                        weights_for_file.append(yaml)
+            weights_cache[fname] = tuple(weights_for_file)
 
-            except Exception as e:
-                logging.exception(f"Exception reading weights in file {fname}")
-                player_errors.append(
-                    f"{len(player_errors) + 1}. "
-                    f"File {fname} is invalid. Please fix your yaml.\n{Utils.get_all_causes(e)}"
-                )
+        except Exception as e:
+            logging.exception(f"Exception reading weights in file {fname}")
+            player_errors.append(
+                f"{len(player_errors) + 1}. "
+                f"File {fname} is invalid. Please fix your yaml.\n{Utils.get_all_causes(e)}"
+            )
 
     # sort dict for consistent results across platforms:
     weights_cache = {key: value for key, value in sorted(weights_cache.items(), key=lambda k: k[0].casefold())}
@@ -218,9 +255,16 @@ def main(args=None) -> tuple[argparse.Namespace, int]:
 
     settings_cache: dict[str, tuple[argparse.Namespace, ...] | None] = {fname: None for fname in weights_cache}
     if args.sameoptions:
+        roll_weights = [yaml for yamls in weights_cache.values() for yaml in yamls]
+        rolled = iter(roll_all_settings(roll_weights, [random.getrandbits(64) for _ in roll_weights],
+                                        args.plando, args.roll_processes))
         for fname, yamls in weights_cache.items():
+            file_settings = [next(rolled) for _ in yamls]
             try:
-                settings_cache[fname] = tuple(roll_settings(yaml, args.plando) for yaml in yamls)
+                for settings_object in file_settings:
+                    if isinstance(settings_object, Exception):
+                        raise settings_object
+                settings_cache[fname] = tuple(file_settings)
             except Exception as e:
                 logging.exception(f"Exception reading settings in file {fname}")
                 player_errors.append(
@@ -239,6 +283,24 @@ def main(args=None) -> tuple[argparse.Namespace, int]:
     name_counter: Counter[str] = Counter()
     args.player_options = {}
 
+    player_settings: dict[int, argparse.Namespace | Exception] = {}
+    if not args.sameoptions:
+        # roll the same players from the same weights as below
+        roll_players: list[int] = []
+        roll_weights: list[dict] = []
+        player = 1
+        while player <= args.multi:
+            path = player_path_cache[player]
+            if not path:
+                player += 1
+                continue
+            for yaml in weights_cache[path]:
+                roll_players.append(player)
+                roll_weights.append(yaml)
+                player += 1
+        player_settings = dict(zip(roll_players, roll_all_settings(
+            roll_weights, [random.getrandbits(64) for _ in roll_players], args.plando, args.roll_processes)))
+
     player = 1
     while player <= args.multi:
         path = player_path_cache[player]
@@ -253,7 +315,9 @@ def main(args=None) -> tuple[argparse.Namespace, int]:
                 # Use the cached settings object if it exists, otherwise roll settings within the try-catch
                 # Invariant: settings_cache[path] and weights_cache[path] have the same length
                 cached = settings_cache[path]
-                settings_object: argparse.Namespace = (cached[doc_index] if cached else roll_settings(yaml, args.plando))
+                settings_object = cached[doc_index] if cached else player_settings[player]
+                if isinstance(settings_object, Exception):
+                    raise settings_object
 
                 for k, v in vars(settings_object).items():
                     if v is not None:
@@ -299,16 +363,101 @@ def main(args=None) -> tuple[argparse.Namespace, int]:
     return args, seed
 
 
+class BatchJobResult(NamedTuple):
+    line: int
+    """The line of the job in the jobs of the batch."""
+    argv: list[str]
+    seed: int | None
+    seed_name: str | None
+    roll_time: float
+    """Seconds it took to read the player files and roll their options."""
+    generation_time: float
+    """Seconds it took to generate the multiworld and its output after rolling."""
+    error: str | None
+
+
+def run_batch_job(line: int, argv: list[str]) -> BatchJobResult:
+    """Generate with the options of a command line, see `run_batch`."""
+    from Main import main as ERmain
+    start = time.perf_counter()
+    rolled: float | None = None
+    seed: int | None = None
+    seed_name: str | None = None
+    error: str | None = None
+    try:
+        try:
+            args = mystery_argparse(argv)
+        except SystemExit as e:  # argparse exits on invalid options, which should only fail this job
+            raise ValueError(f"Invalid options {argv}") from e
+        erargs, seed = main(args)
+        seed_name = erargs.outputname
+        rolled = time.perf_counter()
+        ERmain(erargs, seed)
+    except Exception as e:
+        logging.exception(f"Batch job on line {line} failed.")
+        error = Utils.get_all_causes(e)
+    end = time.perf_counter()
+    if rolled is None:
+        rolled = end
+    result = BatchJobResult(line, argv, seed, seed_name, rolled - start, end - rolled, error)
+    logging.info(f"Batch job on line {line} {'failed' if error else 'done'}: seed {seed}, "
+                 f"rolling took {result.roll_time:.2f}s, generating {result.generation_time:.2f}s.")
+    return result
+
+
+def _init_batch_process(log_level: str, log_time: bool) -> None:
+    if not logging.getLogger().handlers:  # processes that were not forked
+        Utils.init_logging(f"Generate_batch_{os.getpid()}", loglevel=log_level, add_timestamp=log_time)
+
+
+def run_batch(jobs: Iterable[str], base_argv: list[str], processes: int = 0) -> list[BatchJobResult]:
+    """
+    Run a queue of generations in warm processes, sharing the imported worlds and their data between them, instead of
+    starting a process per generation.
+
+    :param jobs: The options of a generation per line, which get added to `base_argv`. Empty lines and lines starting
+                 with # are skipped. Lines are read as the previous jobs run, so this can be a pipe.
+    :param base_argv: Options shared by all generations.
+    :param processes: Amount of processes to run generations in at the same time, 0 to run them in this process.
+    """
+    import shlex
+    start = time.perf_counter()
+    job_argvs = ((line_number, base_argv + shlex.split(line))
+                 for line_number, line in enumerate((line.strip() for line in jobs), 1)
+                 if line and not line.startswith("#"))
+    if processes > 0:
+        base_args = mystery_argparse(base_argv)
+        with concurrent.futures.ProcessPoolExecutor(processes, initializer=_init_batch_process,
+                                                    initargs=(base_args.log_level, base_args.log_time)) as pool:
+            futures = [pool.submit(run_batch_job, line, argv) for line, argv in job_argvs]
+            results = [future.result() for future in futures]
+    else:
+        results = [run_batch_job(line, argv) for line, argv in job_argvs]
+    failed = sum(result.error is not None for result in results)
+    logging.info(f"Batch of {len(results)} generations done in {time.perf_counter() - start:.2f}s, {failed} failed.")
+    return results
+
+
 def read_weights_yamls(path) -> tuple[Any, ...]:
+    yaml = read_weights_text(path)
+    weights = load_cached_weights(yaml)
+    if weights is None:
+        weights = parse_weights_yamls(yaml)
+        cache_weights(yaml, weights)
+    return weights
+
+
+def read_weights_text(path) -> str:
     try:
         if urllib.parse.urlparse(path).scheme in ('https', 'file'):
-            yaml = str(urllib.request.urlopen(path).read(), "utf-8-sig")
-        else:
-            with open(path, 'rb') as f:
-                yaml = str(f.read(), "utf-8-sig")
+            return str(urllib.request.urlopen(path).read(), "utf-8-sig")
+        with open(path, 'rb') as f:
+            return str(f.read(), "utf-8-sig")
     except Exception as e:
         raise Exception(f"Failed to read weights ({path})") from e
 
+
+def parse_weights_yamls(yaml: str) -> tuple[Any, ...]:
     from yaml.error import MarkedYAMLError
     try:
         return tuple(parse_yamls(yaml))
@@ -325,6 +474,103 @@ def read_weights_yamls(path) -> tuple[Any, ...]:
         raise ex
 
 
+def get_weights_cache_path(yaml: str) -> str:
+    """Path of the cached parse of a weights file's content, for the parser of this version."""
+    digest = hashlib.sha256(f"{__version__}\n{yaml}".encode("utf-8")).hexdigest()
+    return Utils.cache_path("weights", f"{digest}.pickle")
+
+
+def load_cached_weights(yaml: str) -> tuple[Any, ...] | None:
+    """The weights parsed from the same content before, None if they are not cached."""
+    path = get_weights_cache_path(yaml)
+    try:
+        with open(path, "rb") as f:
+            weights = Utils.restricted_loads(f.read())
+        os.utime(path)  # keep weights that are in use, see clean_weights_cache
+        return weights
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.debug(f"Could not read cached weights {path}: {e}")
+        return None
+
+
+def cache_weights(yaml: str, weights: tuple[Any, ...]) -> None:
+    path = get_weights_cache_path(yaml)
+    try:
+        data = Utils.restricted_dumps(weights)
+    except Exception:
+        return  # yaml can hold types that are not safe to unpickle, like timestamps, these get parsed every time
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except OSError as e:
+        logging.debug(f"Could not cache weights {path}: {e}")
+
+
+def clean_weights_cache(max_age: float = 30 * 24 * 60 * 60, interval: float = 24 * 60 * 60) -> None:
+    """Remove cached weights that were not used for `max_age` seconds, if the cache was not cleaned for `interval`."""
+    directory = Utils.cache_path("weights")
+    marker = os.path.join(directory, ".cleaned")
+    now = time.time()
+    try:
+        if os.stat(marker).st_mtime > now - interval:
+            return
+    except OSError:
+        pass
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return
+    oldest = now - max_age
+    for entry in entries:
+        try:
+            if entry.name != ".cleaned" and entry.stat().st_mtime < oldest:
+                os.remove(entry.path)
+        except OSError:
+            pass
+    try:
+        with open(marker, "wb"):
+            pass
+    except OSError as e:
+        logging.debug(f"Could not mark weights cache {directory} as cleaned: {e}")
+
+
+def read_all_weights_yamls(paths: list[str], processes: int = 0) -> list[tuple[Any, ...] | Exception]:
+    """
+    Read the weights of multiple files, parsing those that are not cached in a pool of `processes` processes.
+    The exception reading a file raised is returned in place of its weights.
+    """
+    results: list[Any] = []
+    texts: dict[int, str] = {}
+    for index, path in enumerate(paths):
+        try:
+            yaml = read_weights_text(path)
+        except Exception as e:
+            results.append(e)
+            continue
+        weights = load_cached_weights(yaml)
+        if weights is None:
+            texts[index] = yaml
+        results.append(weights)
+    futures: dict[int, concurrent.futures.Future[tuple[Any, ...]]] = {}
+    if processes > 0 and len(texts) > 1:
+        with concurrent.futures.ProcessPoolExecutor(min(processes, len(texts))) as pool:
+            futures = {index: pool.submit(parse_weights_yamls, yaml) for index, yaml in texts.items()}
+    for index, yaml in texts.items():
+        try:
+            results[index] = futures[index].result() if futures else parse_weights_yamls(yaml)
+        except Exception as e:
+            results[index] = e
+        else:
+            cache_weights(yaml, results[index])
+    clean_weights_cache()
+    return results
+
+
 def interpret_on_off(value) -> bool:
     return {"on": True, "off": False}.get(value, value)
 
@@ -633,6 +879,44 @@ def roll_settings(weights: dict, plando_options: PlandoOptions = PlandoOptions.b
     return ret
 
 
+def roll_seeded_settings(weights: dict, plando_options: PlandoOptions, seed: int) -> argparse.Namespace:
+    """
+    Roll options like `roll_settings`, with the random module seeded with `seed`, so the rolled options only depend on
+    the weights and the seed, not on what was rolled before or which process rolls them.
+    """
+    state = random.getstate()
+    random.seed(seed)
+    try:
+        return roll_settings(weights, plando_options)
+    finally:
+        random.setstate(state)
+
+
+def roll_all_settings(weights: list[dict], seeds: list[int], plando_options: PlandoOptions,
+                      processes: int = 0) -> list[argparse.Namespace | Exception]:
+    """
+    Roll options for each weights with the seed at the same index, see `roll_seeded_settings`, in a pool of
+    `processes` processes. The exception rolling raised is returned in place of the options.
+    """
+    futures: list[concurrent.futures.Future[argparse.Namespace] | None] = [None] * len(weights)
+    if processes > 0 and len(weights) > 1:
+        with concurrent.futures.ProcessPoolExecutor(min(processes, len(weights))) as pool:
+            futures = [pool.submit(roll_seeded_settings, player_weights, plando_options, seed)
+                       for player_weights, seed in zip(weights, seeds)]
+    results: list[argparse.Namespace | Exception] = []
+    for future, player_weights, seed in zip(futures, weights, seeds):
+        if future and not future.exception():
+            results.append(future.result())
+            continue
+        # rolling again in this process raises the error of the weights with its full traceback,
+        # or gets the options that could not be sent back from their process
+        try:
+            results.append(roll_seeded_settings(player_weights, plando_options, seed))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
 def roll_alttp_settings(ret: argparse.Namespace, weights):
     ret.sprite_pool = weights.get('sprite_pool', [])
     ret.sprite = get_choice_legacy('sprite', weights, "Link")
@@ -660,8 +944,17 @@ def roll_alttp_settings(ret: argparse.Namespace, weights):
 
 if __name__ == '__main__':
     import atexit
+    # only the worlds of the games that get rolled need to be imported, see worlds.WorldIndex
+    os.environ.setdefault("ARCHIPELAGO_LAZY_WORLDS", "1")
     confirmation = atexit.register(input, "Press enter to close.")
-    erargs, seed = main()
+    erargs = mystery_argparse()
+    if erargs.batch:
+        Utils.init_logging("Generate_batch", loglevel=erargs.log_level, add_timestamp=erargs.log_time)
+        atexit.unregister(confirmation)  # batches run unattended
+        with sys.stdin if erargs.batch == "-" else open(erargs.batch, encoding="utf-8-sig") as batch_jobs:
+            batch_results = run_batch(batch_jobs, sys.argv[1:], erargs.batch_processes)
+        sys.exit(any(result.error for result in batch_results))
+    erargs, seed = main(erargs)
     from Main import main as ERmain
     multiworld = ERmain(erargs, seed)
     if __debug__:
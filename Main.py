@@ -1,29 +1,68 @@
 import collections
-from collections.abc import Mapping
+import contextlib
+from collections.abc import Iterator, Mapping
 import concurrent.futures
 import logging
+import multiprocessing
 import os
 import tempfile
 import time
 from typing import Any
 import zipfile
-import zlib
 
+import generation_checkpoint
+import generation_profile
 import worlds
-from BaseClasses import CollectionState, Item, Location, LocationProgressType, MultiWorld
+from BaseClasses import CollectionState, Item, Location, LocationProgressType, MultiWorld, SphereAnalysis
 from Fill import FillError, balance_multiworld_progression, distribute_items_restrictive, flood_items, \
     parse_planned_blocks, distribute_planned_blocks, resolve_early_locations_for_planned
 from NetUtils import convert_to_base_types
 from Options import StartInventoryPool
-from Utils import __version__, output_path, restricted_dumps, version_tuple
+from Utils import Version, __version__, output_path, version_tuple
 from settings import get_settings
 from worlds import AutoWorld
 from worlds.generic.Rules import exclusion_rules, locality_rules
 
 __all__ = ["main"]
 
+_output_multiworld: MultiWorld | None = None
+"""The multiworld that forked output processes inherit from the generating process."""
+
+
+def _generate_output_in_process(player: int, output_directory: str) -> None:
+    assert _output_multiworld is not None, "generate_output processes have to be forked from the generating process"
+    AutoWorld.call_single(_output_multiworld, "generate_output", player, output_directory)
+
+
+@contextlib.contextmanager
+def _output_process_pool(multiworld: MultiWorld, processes: int) -> Iterator[concurrent.futures.ProcessPoolExecutor]:
+    """A pool of processes forked from this one, which inherit the multiworld for as long as the pool is used."""
+    global _output_multiworld
+    _output_multiworld = multiworld
+    try:
+        with concurrent.futures.ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("fork")) as pool:
+            yield pool
+    finally:
+        _output_multiworld = None
+
 
 def main(args, seed=None, baked_server_options: dict[str, object] | None = None):
+    if not getattr(args, "profile_report", False):
+        return _main(args, seed, baked_server_options)
+
+    with generation_profile.profiling() as profile:
+        multiworld = _main(args, seed, baked_server_options)
+    report_base = output_path(f"AP_{multiworld.seed_name}_Profile")
+    player_seconds = profile.seconds_by_player()
+    profile.write_json(f"{report_base}.json", seed_name=multiworld.seed_name, version=__version__, players=[
+        {"player": player, "name": multiworld.player_name[player], "game": multiworld.game[player],
+         "seconds": player_seconds.get(player, 0.0)} for player in multiworld.player_ids])
+    profile.write_csv(f"{report_base}.csv")
+    logging.info(f"Wrote generation profile report to {report_base}.json and {report_base}.csv")
+    return multiworld
+
+
+def _main(args, seed=None, baked_server_options: dict[str, object] | None = None):
     if not baked_server_options:
         baked_server_options = get_settings().server_options.as_dict()
     assert isinstance(baked_server_options, dict)
@@ -51,21 +90,21 @@ def main(args, seed=None, baked_server_options: dict[str, object] | None = None)
     multiworld.state = CollectionState(multiworld)
     logger.info('Archipelago Version %s  -  Seed: %s\n', __version__, multiworld.seed)
 
-    logger.info(f"Found {len(AutoWorld.AutoWorldRegister.world_types)} World Types:")
-    longest_name = max(len(text) for text in AutoWorld.AutoWorldRegister.world_types)
-
-    world_classes = AutoWorld.AutoWorldRegister.world_types.values()
+    # uses the world index, so that worlds don't have to be imported with lazy world loading
+    indexed_worlds = worlds.world_index.worlds
+    logger.info(f"Found {len(indexed_worlds)} World Types:")
+    longest_name = max(len(text) for text in indexed_worlds)
 
-    version_count = max(len(cls.world_version.as_simple_string()) for cls in world_classes)
-    item_count = len(str(max(len(cls.item_names) for cls in world_classes)))
-    location_count = len(str(max(len(cls.location_names) for cls in world_classes)))
+    version_count = max(len(Version(*world.world_version).as_simple_string()) for world in indexed_worlds.values())
+    item_count = len(str(max(world.item_count for world in indexed_worlds.values())))
+    location_count = len(str(max(world.location_count for world in indexed_worlds.values())))
 
-    for name, cls in AutoWorld.AutoWorldRegister.world_types.items():
-        if not cls.hidden and len(cls.item_names) > 0:
+    for name, world in indexed_worlds.items():
+        if not world.hidden and world.item_count > 0:
             logger.info(f" {name:{longest_name}}: "
-                        f"v{cls.world_version.as_simple_string():{version_count}} | "
-                        f"Items: {len(cls.item_names):{item_count}} | "
-                        f"Locations: {len(cls.location_names):{location_count}}")
+                        f"v{Version(*world.world_version).as_simple_string():{version_count}} | "
+                        f"Items: {world.item_count:{item_count}} | "
+                        f"Locations: {world.location_count:{location_count}}")
 
     del item_count, location_count
 
@@ -193,17 +232,44 @@ def main(args, seed=None, baked_server_options: dict[str, object] | None = None)
 
     AutoWorld.call_all(multiworld, "pre_fill")
 
-    logger.info(f'Filling the multiworld with {len(multiworld.itempool)} items.')
-
-    if multiworld.algorithm == 'flood':
-        flood_items(multiworld)  # different algo, biased towards early game progress items
-    elif multiworld.algorithm == 'balanced':
-        distribute_items_restrictive(multiworld, get_settings().generator.panic_method)
+    checkpoint: generation_checkpoint.Checkpoint | None = None
+    checkpoint_path = output_path(f"AP_{multiworld.seed_name}_Checkpoint.apcheckpoint")
+    if getattr(args, "resume", None):
+        checkpoint = generation_checkpoint.Checkpoint.load(args.resume)
+        checkpoint.verify(multiworld)
+        logger.info(f"Resuming from checkpoint {args.resume} with stages: {', '.join(checkpoint.results)}")
+    elif getattr(args, "checkpoint", False):
+        checkpoint = generation_checkpoint.Checkpoint(multiworld)
+
+    def run_stage(stage: str) -> bool:
+        """Restore the stage from the checkpoint if it has it, returns whether the stage has to be run."""
+        return not (checkpoint and checkpoint.restore(stage, multiworld))
+
+    def finish_stage(stage: str) -> None:
+        if checkpoint and getattr(args, "checkpoint", False):
+            checkpoint.record(stage, multiworld)
+            checkpoint.save(checkpoint_path)
+            logger.info(f"Saved {stage} stage to checkpoint {checkpoint_path}")
+
+    if run_stage("fill"):
+        logger.info(f'Filling the multiworld with {len(multiworld.itempool)} items.')
+
+        if multiworld.algorithm == 'flood':
+            flood_items(multiworld)  # different algo, biased towards early game progress items
+        elif multiworld.algorithm == 'balanced':
+            distribute_items_restrictive(multiworld, get_settings().generator.panic_method)
+        finish_stage("fill")
+    else:
+        logger.info("Restored fill from checkpoint.")
 
     AutoWorld.call_all(multiworld, 'post_fill')
 
     if multiworld.players > 1 and not args.skip_prog_balancing:
-        balance_multiworld_progression(multiworld)
+        if run_stage("balancing"):
+            balance_multiworld_progression(multiworld)
+            finish_stage("balancing")
+        else:
+            logger.info("Restored progression balancing from checkpoint.")
     else:
         logger.info("Progression balancing skipped.")
 
@@ -233,10 +299,31 @@ def main(args, seed=None, baked_server_options: dict[str, object] | None = None)
     with output as temp_dir:
         output_players = [player for player in multiworld.player_ids if AutoWorld.World.generate_output.__code__
                           is not multiworld.worlds[player].generate_output.__code__]
-        with concurrent.futures.ThreadPoolExecutor(len(output_players) + 2) as pool:
-            check_accessibility_task = pool.submit(multiworld.fulfills_accessibility)
-
-            output_file_futures = [pool.submit(AutoWorld.call_stage, multiworld, "generate_output", temp_dir)]
+        process_players: list[int] = []
+        output_processes = get_settings().generator.output_processes
+        if output_processes > 0:
+            if "fork" in multiprocessing.get_all_start_methods():
+                process_players = [player for player in output_players
+                                   if multiworld.worlds[player].process_safe_output]
+                output_players = [player for player in output_players if player not in process_players]
+            else:
+                logger.warning("The output_processes setting only works on systems that can fork processes, "
+                               "generating all output in threads instead.")
+        process_pool: contextlib.AbstractContextManager[concurrent.futures.ProcessPoolExecutor | None] = \
+            _output_process_pool(multiworld, min(output_processes, len(process_players))) if process_players \
+            else contextlib.nullcontext()
+        output_file_futures: list[concurrent.futures.Future[Any]] = []
+        with process_pool as processes, concurrent.futures.ThreadPoolExecutor(len(output_players) + 2) as pool:
+            if processes:
+                # threads of the pool only start with the first task, so the processes get forked before them and
+                # inherit the multiworld without pickling it
+                output_file_futures += [processes.submit(_generate_output_in_process, player, temp_dir)
+                                        for player in process_players]
+
+            # one sphere search shared by the accessibility check and the multidata spheres
+            sphere_analysis_task = pool.submit(SphereAnalysis, multiworld)
+
+            output_file_futures.append(pool.submit(AutoWorld.call_stage, multiworld, "generate_output", temp_dir))
             for player in output_players:
                 # skip starting a thread for methods that say "pass".
                 output_file_futures.append(
@@ -321,7 +408,7 @@ def main(args, seed=None, baked_server_options: dict[str, object] | None = None)
 
                 # get spheres -> filter address==None -> skip empty
                 spheres: list[dict[int, set[int]]] = []
-                for sphere in multiworld.get_sendable_spheres():
+                for sphere in sphere_analysis_task.result().sendable_spheres:
                     current_sphere: dict[int, set[int]] = collections.defaultdict(set)
                     for sphere_location in sphere:
                         current_sphere[sphere_location.player].add(sphere_location.address)
@@ -353,14 +440,13 @@ def main(args, seed=None, baked_server_options: dict[str, object] | None = None)
                 for key in ("slot_data", "er_hint_data"):
                     multidata[key] = convert_to_base_types(multidata[key])
 
-                serialized_multidata = zlib.compress(restricted_dumps(multidata), 9)
+                serialized_multidata = NetUtils.encode_multidata(multidata)
 
                 with open(os.path.join(temp_dir, f'{outfilebase}.archipelago'), 'wb') as f:
-                    f.write(bytes([3]))  # version of format
                     f.write(serialized_multidata)
 
             output_file_futures.append(pool.submit(write_multidata))
-            if not check_accessibility_task.result():
+            if not sphere_analysis_task.result().fulfills_accessibility():
                 if not multiworld.can_beat_game():
                     raise FillError("Game appears as unbeatable. Aborting.", multiworld=multiworld)
                 else:
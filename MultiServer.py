@@ -2,20 +2,24 @@ from __future__ import annotations
 
 import argparse
 import asyncio
+import bisect
 import collections
 import contextlib
 import copy
 import datetime
 import functools
 import hashlib
+import heapq
 import inspect
 import itertools
 import logging
 import math
 import operator
+import os
 import pickle
 import random
 import shlex
+import struct
 import threading
 import time
 import typing
@@ -44,7 +48,8 @@ import NetUtils
 import Utils
 from Utils import version_tuple, restricted_loads, Version, async_start, get_intended_text
 from NetUtils import Endpoint, ClientStatus, NetworkItem, decode, encode, NetworkPlayer, Permission, NetworkSlot, \
-    SlotType, LocationStore, MultiData, Hint, HintStatus
+    SlotType, LocationStore, MultiData, MultiDataSections, Hint, HintStatus, multidata_format_version, \
+    pop_location_store
 from BaseClasses import ItemClassification
 
 
@@ -134,6 +139,23 @@ modify_functions = {
 }
 
 
+def valid_key_arguments(args: typing.Dict[str, typing.Any]) -> bool:
+    """Whether the arguments of a Get or SetNotify package have valid keys and prefixes."""
+    if "keys" not in args and "prefixes" not in args:
+        return False
+    prefixes = args.get("prefixes", [])
+    return type(args.get("keys", [])) is list and type(prefixes) is list and all(type(prefix) is str
+                                                                                for prefix in prefixes)
+
+
+def valid_set_arguments(args: typing.Dict[str, typing.Any]) -> bool:
+    """Whether the arguments of a Set package, or one of its sets, have a valid key and operations."""
+    if type(args.get("key")) is not str or args["key"].startswith("_read_") or type(args.get("operations")) is not list:
+        return False
+    return all(type(operation) is dict and operation.get("operation") in modify_functions
+               for operation in args["operations"])
+
+
 def get_saving_second(seed_name: str, interval: int = 60) -> int:
     # save at expected times so other systems using savegame can expect it
     # represents the target second of the auto_save_interval at which to save
@@ -156,6 +178,10 @@ class Client(Endpoint):
         "no_items",
         "no_locations",
         "no_text",
+        "outbox",
+        "outbox_size",
+        "outbox_sent",
+        "sender",
     )
 
     version: Version
@@ -171,6 +197,12 @@ class Client(Endpoint):
     no_items: bool
     no_locations: bool
     no_text: bool
+    outbox: list[str]
+    """Encoded messages waiting to be sent, without the brackets of their lists, see `Context.queue_encoded_msgs`."""
+    outbox_size: int
+    outbox_sent: asyncio.Future[bool] | None
+    """Resolves once the messages in the outbox are sent, created when something waits for that."""
+    sender: asyncio.Task[None] | None
 
     def __init__(self, socket: "ServerConnection", ctx: Context) -> None:
         super().__init__(socket)
@@ -187,6 +219,10 @@ class Client(Endpoint):
         self.no_items = False
         self.no_locations = False
         self.no_text = False
+        self.outbox = []
+        self.outbox_size = 0
+        self.outbox_sent = None
+        self.sender = None
 
     @property
     def items_handling(self):
@@ -213,10 +249,177 @@ class Client(Endpoint):
 team_slot = typing.Tuple[int, int]
 
 
+class SaveJournal:
+    """
+    Keeps track of the changes to the save of a Context for journaled saving, where saving appends only what changed
+    since the last save as an entry to a journal. Once the journal grows larger than the full save, the full save gets
+    written again with a new journal id and a new journal is started, which is called compacting.
+
+    Location checks, hints and data storage changes are recorded as they happen and received items are tracked by the
+    length of their lists. All other parts of the save are small and are part of an entry as a whole if they changed.
+    """
+    journaled_keys: typing.ClassVar[typing.Tuple[str, ...]] = \
+        ("location_checks", "received_items", "hints", "stored_data")
+    entry_header: typing.ClassVar[struct.Struct] = struct.Struct("<I")
+    """Length of an encoded entry in a journal file."""
+    file_header: typing.ClassVar[struct.Struct] = struct.Struct("<Q")
+    """Journal id of a journal file."""
+
+    journal_id: int
+    """Random id of the full save the journal continues. Entries of another journal id don't belong to it."""
+    save_size: typing.Optional[int]
+    """Size of the full save in bytes, None if there is none yet."""
+    size: int
+    """Size of the entries since the full save in bytes."""
+    compact_next: bool
+    """Compact on the next save, as the journal could be missing changes."""
+    location_checks: typing.Dict[team_slot, typing.Set[int]]
+    hints: typing.Set[team_slot]
+    stored_data: typing.Set[str]
+    """Changes recorded on the event loop, taken by the saving thread under `lock`."""
+    lock: threading.Lock
+    received_item_counts: typing.Dict[typing.Tuple[int, int, bool], int]
+    state: typing.Dict[str, bytes]
+    """The pickled parts of the save that are not tracked otherwise, as of the last entry or full save."""
+
+    def __init__(self) -> None:
+        self.journal_id = 0
+        self.save_size = None
+        self.size = 0
+        self.compact_next = False
+        self.location_checks = {}
+        self.hints = set()
+        self.stored_data = set()
+        self.lock = threading.Lock()
+        self.received_item_counts = {}
+        self.state = {}
+
+    def add_location_checks(self, team: int, slot: int, locations: typing.Iterable[int]) -> None:
+        with self.lock:
+            self.location_checks.setdefault((team, slot), set()).update(locations)
+
+    def add_hints(self, team: int, slot: int) -> None:
+        with self.lock:
+            self.hints.add((team, slot))
+
+    def add_stored_data(self, key: str) -> None:
+        with self.lock:
+            self.stored_data.add(key)
+
+    def should_compact(self, exit_save: bool = False) -> bool:
+        return exit_save or self.compact_next or self.save_size is None or self.size > self.save_size
+
+    def start(self, ctx: Context, journal_id: int, save_size: typing.Optional[int], size: int = 0) -> None:
+        """Start tracking changes to the current state of the Context, continuing the journal of a full save."""
+        self.journal_id = journal_id
+        self.save_size = save_size
+        self.size = size
+        with self.lock:
+            self.location_checks = {}
+            self.hints = set()
+            self.stored_data = set()
+        self.received_item_counts = {key: len(items) for key, items in ctx.received_items.items()}
+        self.state = {key: pickle.dumps(value) for key, value in ctx.get_save_state().items()}
+
+    def compact(self, ctx: Context, encode_save: typing.Callable[[dict], bytes]) -> bytes:
+        """
+        Encode a full save with a new journal id. Changes made while saving get into the next entry.
+        Until `compacted` is called with the size of the written save, the next save is going to compact again.
+        """
+        self.compact_next = True
+        self.start(ctx, random.getrandbits(63), None)
+        save = ctx.get_save()
+        save["journal_id"] = self.journal_id
+        return encode_save(save)
+
+    def compacted(self, save_size: int) -> None:
+        self.save_size = save_size
+        self.compact_next = False
+
+    def get_entry(self, ctx: Context) -> bytes:
+        """Encode the changes since the last entry or full save into a new entry and start tracking anew."""
+        with self.lock:
+            location_checks, self.location_checks = self.location_checks, {}
+            hints, self.hints = self.hints, set()
+            stored_data, self.stored_data = self.stored_data, set()
+        received_items: typing.Dict[typing.Tuple[int, int, bool], typing.Tuple[int, typing.List[NetworkItem]]] = {}
+        for key, items in tuple(ctx.received_items.items()):
+            count = self.received_item_counts.get(key, 0)
+            if len(items) > count:
+                received_items[key] = count, items[count:]
+                self.received_item_counts[key] = count + len(received_items[key][1])
+        state: typing.Dict[str, bytes] = {}
+        for key, value in ctx.get_save_state().items():
+            value = pickle.dumps(value)
+            if self.state.get(key) != value:
+                state[key] = self.state[key] = value
+        entry = {
+            "state": state,
+            "location_checks": location_checks,
+            "received_items": received_items,
+            "hints": {key: set(ctx.hints[key]) for key in hints},
+            "stored_data": {key: ctx.stored_data[key] for key in stored_data if key in ctx.stored_data},
+        }
+        # Does not use Utils.restricted_dumps because we'd rather make a save than not make one
+        data = zlib.compress(pickle.dumps(entry))
+        self.size += len(data)
+        return data
+
+    @staticmethod
+    def replay(savedata: dict, entries: typing.Iterable[bytes]) -> bool:
+        """
+        Apply the entries of a journal to its full save. Entries are idempotent, so replaying an entry whose changes
+        are already part of the save does not change it.
+
+        :return: False if an entry could not be decoded, which stops the replay.
+        """
+        for data in entries:
+            try:
+                entry = restricted_loads(zlib.decompress(data))
+                state = {key: restricted_loads(value) for key, value in entry["state"].items()}
+            except Exception as e:
+                logging.exception(e)
+                return False
+            savedata.update(state)
+            location_checks = savedata["location_checks"]
+            for key, locations in entry["location_checks"].items():
+                location_checks[key] = location_checks.get(key, set()) | locations
+            for key, (start, items) in entry["received_items"].items():
+                savedata["received_items"].setdefault(key, [])[start:start + len(items)] = items
+            savedata["hints"].update(entry["hints"])
+            savedata.setdefault("stored_data", {}).update(entry["stored_data"])
+        return True
+
+    @classmethod
+    def read_file(cls, data: bytes) -> typing.Tuple[int, typing.List[bytes], bool]:
+        """
+        Split a journal file into its journal id and entries.
+
+        :return: The journal id, the entries and whether the file ended after a complete entry. Writing an entry can
+                 get interrupted by a crash, leaving an incomplete last entry that gets ignored.
+        """
+        journal_id, = cls.file_header.unpack_from(data)
+        entries: typing.List[bytes] = []
+        offset = cls.file_header.size
+        while offset + cls.entry_header.size <= len(data):
+            length, = cls.entry_header.unpack_from(data, offset)
+            offset += cls.entry_header.size
+            if offset + length > len(data):
+                break
+            entries.append(data[offset:offset + length])
+            offset += length
+        return journal_id, entries, offset == len(data)
+
+
 class Context:
     dumper = staticmethod(encode)
     loader = staticmethod(decode)
 
+    max_frame_size = 65536
+    """Messages queued for a client are sent together in frames of up to about this many characters."""
+    max_outbox_size = 64 * 1024 * 1024
+    """Clients with more than this many characters of messages waiting to be sent to them get disconnected."""
+
     simple_options = {"hint_cost": int,
                       "location_check_points": int,
                       "server_password": str,
@@ -238,6 +441,11 @@ class Context:
     stored_data: typing.Dict[str, object]
     read_data: typing.Dict[str, object]
     stored_data_notification_clients: typing.Dict[str, typing.Set[Client]]
+    stored_data_prefix_notification_clients: typing.Dict[str, typing.Set[Client]]
+    stored_data_keys: typing.List[str]
+    """The keys of stored_data in sorted order, to find the keys starting with a prefix."""
+    stored_data_sizes: typing.Dict[str, int]
+    """The encoded size of each value of stored_data."""
     slot_info: typing.Dict[int, NetworkSlot]
     generator_version = Version(0, 0, 0)
     checksums: typing.Dict[str, str]
@@ -285,6 +493,8 @@ class Context:
         self.location_check_points = location_check_points
         self.hints_used = collections.defaultdict(int)
         self.hints: typing.Dict[team_slot, typing.Set[Hint]] = collections.defaultdict(set)
+        # all hints in self.hints by team, finding player and location, to only recheck the hints of new checks
+        self.hint_index: typing.Dict[typing.Tuple[int, int, int], typing.Set[Hint]] = {}
         self.release_mode: str = release_mode
         self.remaining_mode: str = remaining_mode
         self.collect_mode: str = collect_mode
@@ -304,6 +514,11 @@ class Context:
         self.auto_save_interval = 60  # in seconds
         self.auto_saver_thread: typing.Optional[threading.Thread] = None
         self.save_dirty = False
+        self.save_journal: typing.Optional[SaveJournal] = None
+        # encoded parts of messages that are sent again on every connect, see the "Encoded messages" methods
+        self.encoded_parts: typing.Dict[typing.Hashable, str] = {}
+        self.encoded_players: typing.Optional[typing.Tuple[typing.Tuple[typing.Tuple[team_slot, str], ...], str]] = None
+        self.encoded_items: typing.Dict[typing.Hashable, typing.Tuple[typing.List[NetworkItem], int, str]] = {}
         self.tags = ['AP']
         self.games: typing.Dict[int, str] = {}
         self.minimum_client_versions: typing.Dict[int, Version] = {}
@@ -313,6 +528,9 @@ class Context:
         self.random = random.Random()
         self.stored_data = {}
         self.stored_data_notification_clients = collections.defaultdict(weakref.WeakSet)
+        self.stored_data_prefix_notification_clients = collections.defaultdict(weakref.WeakSet)
+        self.stored_data_keys = []
+        self.stored_data_sizes = {}
         self.read_data = {}
         self.spheres = []
 
@@ -334,19 +552,18 @@ class Context:
     # Data package retrieval
     def _load_game_data(self):
         import worlds
-        self.gamespackage = worlds.network_data_package["games"]
+        self.gamespackage = {}
 
-        self.item_name_groups = {world_name: world.item_name_groups for world_name, world in
-                                 worlds.AutoWorldRegister.world_types.items()}
-        self.location_name_groups = {world_name: world.location_name_groups for world_name, world in
-                                     worlds.AutoWorldRegister.world_types.items()}
-        for world_name, world in worlds.AutoWorldRegister.world_types.items():
-            self.non_hintable_names[world_name] = world.hint_blacklist
+        # uses the world index, so that worlds don't have to be imported with lazy world loading
+        for world_name, indexed_world in worlds.world_index.worlds.items():
+            self.non_hintable_names[world_name] = indexed_world.hint_blacklist
 
-        for game_package in self.gamespackage.values():
-            # remove groups from data sent to clients
-            del game_package["item_name_groups"]
-            del game_package["location_name_groups"]
+        for world_name, game_package in worlds.network_data_package["games"].items():
+            # remove groups from data sent to clients, copying the packages that are shared with the world index
+            self.gamespackage[world_name] = {key: value for key, value in game_package.items()
+                                             if key not in ("item_name_groups", "location_name_groups")}
+            self.item_name_groups[world_name] = game_package["item_name_groups"]
+            self.location_name_groups[world_name] = game_package["location_name_groups"]
 
     def _init_game_data(self):
         for game_name, game_package in self.gamespackage.items():
@@ -374,50 +591,145 @@ class Context:
     def location_names_for_game(self, game: str) -> typing.Optional[typing.Dict[str, int]]:
         return self.gamespackage[game]["location_name_to_id"] if game in self.gamespackage else None
 
+    # Encoded messages
+    def encode_part(self, key: typing.Hashable, get_value: typing.Callable[[], typing.Any]) -> str:
+        """Returns the encoded value of a part of a message that doesn't change while the multidata is loaded."""
+        encoded = self.encoded_parts.get(key)
+        if encoded is None:
+            encoded = self.encoded_parts[key] = self.dumper(get_value())
+        return encoded
+
+    def encode_players_package(self) -> str:
+        """Returns the encoded `get_players_package`, which changes with the aliases."""
+        aliases = tuple(self.name_aliases.items())
+        if self.encoded_players is None or self.encoded_players[0] != aliases:
+            self.encoded_players = aliases, self.dumper(self.get_players_package())
+        return self.encoded_players[1]
+
+    def encode_items(self, key: typing.Hashable, items: typing.List[NetworkItem]) -> str:
+        """
+        Returns the encoded items of a list that only gets appended to, without the surrounding brackets.
+        The encoding of the items already encoded for the same key is reused, only new items get encoded.
+        """
+        cached = self.encoded_items.get(key)
+        if cached is not None and cached[0] is items and cached[1] <= len(items):
+            _, count, encoded = cached
+            if count == len(items):
+                return encoded
+            new_items = self.dumper(items[count:])[1:-1]
+            encoded = f"{encoded},{new_items}" if encoded else new_items
+        else:
+            encoded = self.dumper(items)[1:-1]
+        self.encoded_items[key] = items, len(items), encoded
+        return encoded
+
+    def encode_received_items(self, client: Client) -> str:
+        """Returns an encoded `ReceivedItems` message of all items a client has received."""
+        start_inventory = get_start_inventory(self, client.slot, client.remote_start_inventory)
+        items = get_received_items(self, client.team, client.slot, client.remote_items)
+        parts = []
+        if start_inventory:
+            parts.append(self.encode_items(("start_inventory", client.slot), start_inventory))
+        if items:
+            parts.append(self.encode_items((client.team, client.slot, client.remote_items), items))
+        return f'{{"cmd":"ReceivedItems","index":0,"items":[{",".join(parts)}]}}'
+
+    def encode_data_package(self, games: typing.Iterable[str]) -> str:
+        """Returns an encoded `DataPackage` message of the given games."""
+        packages = ",".join(
+            f"{self.dumper(game)}:{self.encode_part(('game_package', game), lambda: self.gamespackage[game])}"
+            for game in games)
+        return f'{{"cmd":"DataPackage","data":{{"games":{{{packages}}}}}}}'
+
+    def encode_with_parts(self, msg: dict, parts: typing.Dict[str, str]) -> str:
+        """Encodes a message, adding the already encoded values of parts to it."""
+        encoded = self.dumper(msg)[:-1]
+        return encoded + "".join(f",{self.dumper(key)}:{value}" for key, value in parts.items()) + "}"
+
     # General networking
-    async def send_msgs(self, endpoint: Endpoint, msgs: typing.Iterable[dict]) -> bool:
-        if not endpoint.socket or not endpoint.socket.open:
-            return False
-        msg = self.dumper(msgs)
-        try:
-            await endpoint.socket.send(msg)
-        except websockets.ConnectionClosed:
-            self.logger.exception(f"Exception during send_msgs, could not send {msg}")
-            await self.disconnect(endpoint)
+    async def send_msgs(self, endpoint: Client, msgs: typing.Iterable[dict]) -> bool:
+        return await self.send_encoded_msgs(endpoint, self.dumper(msgs))
+
+    async def send_encoded_msgs(self, endpoint: Client, msg: str) -> bool:
+        """Queues encoded messages like `queue_encoded_msgs` and waits until they are sent."""
+        if not self.queue_encoded_msgs(endpoint, msg):
             return False
-        else:
-            if self.log_network:
-                self.logger.info(f"Outgoing message: {msg}")
-            return True
+        if not endpoint.outbox:
+            return True  # an empty list, with nothing else queued to wait for
+        if endpoint.outbox_sent is None:
+            endpoint.outbox_sent = asyncio.get_running_loop().create_future()
+        return await asyncio.shield(endpoint.outbox_sent)
 
-    async def send_encoded_msgs(self, endpoint: Endpoint, msg: str) -> bool:
-        if not endpoint.socket or not endpoint.socket.open:
+    def queue_encoded_msgs(self, endpoint: Client, msg: str) -> bool:
+        """
+        Queues encoded messages to be sent to a client, together with the other messages queued for it until the
+        next iteration of the event loop. Disconnects clients that can't keep up with the messages queued for them.
+
+        :return: False if the client is not connected.
+        """
+        if not endpoint.socket or not endpoint.socket.open or endpoint.outbox_size > self.max_outbox_size:
             return False
-        try:
-            await endpoint.socket.send(msg)
-        except websockets.ConnectionClosed:
-            self.logger.exception("Exception during send_encoded_msgs")
-            await self.disconnect(endpoint)
+        if len(msg) > 2:  # not an empty list
+            endpoint.outbox.append(msg[1:-1])
+            endpoint.outbox_size += len(msg)
+        if endpoint.outbox_size > self.max_outbox_size:
+            # the outbox gets cleared once sending fails
+            self.logger.warning(f"Disconnecting a client that has {endpoint.outbox_size} characters of messages "
+                                f"waiting to be sent to it.")
+            async_start(endpoint.socket.close(1011, "Too slow to receive messages"))
             return False
-        else:
-            if self.log_network:
-                self.logger.info(f"Outgoing message: {msg}")
-            return True
+        if endpoint.sender is None and endpoint.outbox:
+            endpoint.sender = asyncio.create_task(self._send_outbox(endpoint))
+        return True
 
-    async def broadcast_send_encoded_msgs(self, endpoints: typing.Iterable[Endpoint], msg: str) -> bool:
-        sockets = []
-        for endpoint in endpoints:
-            if endpoint.socket and endpoint.socket.open:
-                sockets.append(endpoint.socket)
+    async def _send_outbox(self, endpoint: Client) -> None:
+        """Sends the messages in the outbox of a client in frames, until no more are queued."""
+        sent: asyncio.Future[bool] | None = None
         try:
-            websockets.broadcast(sockets, msg)
-        except RuntimeError:
-            self.logger.exception("Exception during broadcast_send_encoded_msgs")
-            return False
-        else:
-            if self.log_network:
-                self.logger.info(f"Outgoing broadcast: {msg}")
-            return True
+            while endpoint.outbox:
+                msgs = endpoint.outbox
+                sent = endpoint.outbox_sent
+                endpoint.outbox = []
+                endpoint.outbox_size = 0
+                endpoint.outbox_sent = None
+                start = 0
+                while start < len(msgs):
+                    end = start + 1
+                    size = len(msgs[start])
+                    while end < len(msgs) and size + len(msgs[end]) < self.max_frame_size:
+                        size += len(msgs[end]) + 1
+                        end += 1
+                    frame = f"[{','.join(msgs[start:end])}]"
+                    start = end
+                    try:
+                        await endpoint.socket.send(frame)
+                    except websockets.ConnectionClosed:
+                        self.logger.exception("Exception during send_encoded_msgs")
+                        await self.disconnect(endpoint)
+                        return
+                    if self.log_network:
+                        self.logger.info(f"Outgoing message: {frame}")
+                if sent:
+                    sent.set_result(True)
+                    sent = None
+        finally:
+            # anything left couldn't be sent
+            endpoint.sender = None
+            for future in (sent, endpoint.outbox_sent):
+                if future and not future.done():
+                    future.set_result(False)
+            endpoint.outbox.clear()
+            endpoint.outbox_size = 0
+            endpoint.outbox_sent = None
+
+    async def broadcast_send_encoded_msgs(self, endpoints: typing.Iterable[Client], msg: str) -> bool:
+        self.queue_broadcast(endpoints, msg)
+        return True
+
+    def queue_broadcast(self, endpoints: typing.Iterable[Client], msg: str):
+        """Queues encoded messages to be sent to multiple clients, see `queue_encoded_msgs`."""
+        for endpoint in endpoints:
+            self.queue_encoded_msgs(endpoint, msg)
 
     def broadcast_all(self, msgs: typing.List[dict]):
         msg_is_text = all(msg["cmd"] == "PrintJSON" for msg in msgs)
@@ -427,7 +739,7 @@ class Context:
             for endpoint in self.endpoints
             if endpoint.auth and not (msg_is_text and endpoint.no_text)
         )
-        async_start(self.broadcast_send_encoded_msgs(endpoints, data))
+        self.queue_broadcast(endpoints, data)
 
     def broadcast_text_all(self, text: str, additional_arguments: dict = {}):
         self.logger.info("Notice (all): %s" % text)
@@ -441,11 +753,10 @@ class Context:
             for endpoint in itertools.chain.from_iterable(self.clients[team].values())
             if not (msg_is_text and endpoint.no_text)
         )
-        async_start(self.broadcast_send_encoded_msgs(endpoints, data))
+        self.queue_broadcast(endpoints, data)
 
     def broadcast(self, endpoints: typing.Iterable[Client], msgs: typing.List[dict]):
-        msgs = self.dumper(msgs)
-        async_start(self.broadcast_send_encoded_msgs(endpoints, msgs))
+        self.queue_broadcast(endpoints, self.dumper(msgs))
 
     async def disconnect(self, endpoint: Client):
         if endpoint in self.endpoints:
@@ -458,14 +769,14 @@ class Context:
         if not client.auth or client.no_text:
             return
         self.logger.info("Notice (Player %s in team %d): %s" % (client.name, client.team + 1, text))
-        async_start(self.send_msgs(client, [{"cmd": "PrintJSON", "data": [{ "text": text }], **additional_arguments}]))
+        self.queue_encoded_msgs(client, self.dumper([{"cmd": "PrintJSON", "data": [{ "text": text }],
+                                                      **additional_arguments}]))
 
     def notify_client_multiple(self, client: Client, texts: typing.List[str], additional_arguments: dict = {}):
         if not client.auth or client.no_text:
             return
-        async_start(self.send_msgs(client,
-                                   [{"cmd": "PrintJSON", "data": [{ "text": text }], **additional_arguments}
-                                    for text in texts]))
+        self.queue_encoded_msgs(client, self.dumper([{"cmd": "PrintJSON", "data": [{ "text": text }],
+                                                      **additional_arguments} for text in texts]))
 
     # loading
     def load(self, multidatapath: str, use_embedded_server_options: bool = False):
@@ -486,13 +797,15 @@ class Context:
         self.data_filename = multidatapath
 
     @staticmethod
-    def decompress(data: bytes) -> dict:
+    def decompress(data: bytes) -> MultiData | MultiDataSections:
         format_version = data[0]
-        if format_version > 3:
+        if format_version > multidata_format_version:
             raise Utils.VersionException("Incompatible multidata.")
+        if format_version == multidata_format_version:
+            return MultiDataSections(data)
         return restricted_loads(zlib.decompress(data[1:]))
 
-    def _load(self, decoded_obj: MultiData, game_data_packages: typing.Dict[str, typing.Any],
+    def _load(self, decoded_obj: MultiData | MultiDataSections, game_data_packages: typing.Dict[str, typing.Any],
               use_embedded_server_options: bool):
 
         self.read_data = {}
@@ -513,6 +826,9 @@ class Context:
         for player, version in clients_ver.items():
             self.minimum_client_versions[player] = max(Version(*version), min_version)
 
+        self.encoded_parts.clear()
+        self.encoded_players = None
+        self.encoded_items.clear()
         self.slot_info = decoded_obj["slot_info"]
         self.games = {slot: slot_info.game for slot, slot_info in self.slot_info.items()}
         self.groups = {slot: set(slot_info.group_members) for slot, slot_info in self.slot_info.items()
@@ -535,7 +851,7 @@ class Context:
         self.seed_name = decoded_obj["seed_name"]
         self.random.seed(self.seed_name)
         self.connect_names = decoded_obj['connect_names']
-        self.locations = LocationStore(decoded_obj.pop("locations"))  # pre-emptively free memory
+        self.locations = pop_location_store(decoded_obj)  # pre-emptively free memory
         self.slot_data = decoded_obj['slot_data']
         for slot, data in self.slot_data.items():
             self.read_data[f"slot_data_{slot}"] = lambda data=data: data
@@ -548,6 +864,8 @@ class Context:
 
         for slot, hints in decoded_obj["precollected_hints"].items():
             self.hints[0, slot].update(hints)
+            for hint in hints:
+                self.index_hint(0, hint)
 
         # declare slots that aren't players as done
         for slot, slot_info in self.slot_info.items():
@@ -594,6 +912,12 @@ class Context:
 
     def _save(self, exit_save: bool = False) -> bool:
         try:
+            if self.save_journal:
+                try:
+                    return self._save_journaled(exit_save)
+                except Exception:
+                    self.save_journal.compact_next = True  # the changes of a lost entry are only in the next full save
+                    raise
             # Does not use Utils.restricted_dumps because we'd rather make a save than not make one
             encoded_save = pickle.dumps(self.get_save())
             with open(self.save_filename, "wb") as f:
@@ -604,24 +928,95 @@ class Context:
         else:
             return True
 
-    def init_save(self, enabled: bool = True):
+    @property
+    def journal_filename(self) -> str:
+        return self.save_filename + ".journal"
+
+    def _save_journaled(self, exit_save: bool) -> bool:
+        journal = self.save_journal
+        if journal.should_compact(exit_save):
+            data = journal.compact(self, lambda save: zlib.compress(pickle.dumps(save)))
+            # write the new save next to the old one first, so a crash leaves either of them intact
+            with open(self.save_filename + ".tmp", "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(self.save_filename + ".tmp", self.save_filename)
+            # entries of the old journal don't belong to the new save anymore and get ignored if writing this fails
+            with open(self.journal_filename, "wb") as f:
+                f.write(journal.file_header.pack(journal.journal_id))
+            journal.compacted(len(data))
+        else:
+            data = journal.get_entry(self)
+            with open(self.journal_filename, "ab") as f:
+                f.write(journal.entry_header.pack(len(data)) + data)
+                f.flush()
+                os.fsync(f.fileno())
+        return True
+
+    def init_save(self, enabled: bool = True, journal: bool = False):
+        """
+        Load the save and start saving regularly.
+
+        :param enabled: Whether to save at all.
+        :param journal: Append the changes to a journal when saving instead of writing the whole save every time.
+        """
         self.saving = enabled
         if self.saving:
             if not self.save_filename:
-                import os
                 name, ext = os.path.splitext(self.data_filename)
                 self.save_filename = name + '.apsave' if ext.lower() in ('.archipelago', '.zip') \
                     else self.data_filename + '_' + 'apsave'
+            # unless the journal of the loaded save can be continued, journaled saving starts with a full save
+            save_size: typing.Optional[int] = None
+            journal_id = 0
             try:
                 with open(self.save_filename, 'rb') as f:
-                    save_data = restricted_loads(zlib.decompress(f.read()))
-                    self.set_save(save_data)
+                    data = f.read()
+                    save_data = restricted_loads(zlib.decompress(data))
+                # a journal left by journaled saving is replayed even if saving without one now
+                appendable = self._replay_journal_file(save_data) and journal
+                self.set_save(save_data)
             except FileNotFoundError:
                 self.logger.error('No save data found, starting a new game')
             except Exception as e:
                 self.logger.exception(e)
+            else:
+                journal_id = save_data.get("journal_id", 0)
+                if appendable:
+                    save_size = len(data)
+            if journal:
+                self.save_journal = SaveJournal()
+                try:
+                    journal_size = os.path.getsize(self.journal_filename)
+                except OSError:
+                    journal_size = 0
+                self.save_journal.start(self, journal_id, save_size, journal_size)
             self._start_async_saving()
 
+    def _replay_journal_file(self, save_data: dict) -> bool:
+        """
+        Apply the journal belonging to a save to it.
+
+        :return: Whether new entries can be appended to the journal file, which is not the case if it is missing,
+                 belongs to another save or could only be applied partially.
+        """
+        try:
+            with open(self.journal_filename, "rb") as f:
+                journal_id, entries, complete = SaveJournal.read_file(f.read())
+        except FileNotFoundError:
+            return False
+        except struct.error:
+            return False  # crashed while creating the journal
+        if journal_id != save_data.get("journal_id", 0):
+            self.logger.info("Ignoring save journal of another save.")
+            return False
+        if not complete:
+            self.logger.warning("Save journal ends in an incomplete entry, which was probably cut off by a crash.")
+        replayed = SaveJournal.replay(save_data, entries)
+        self.logger.info(f"Replayed {len(entries)} entries of the save journal.")
+        return replayed and complete
+
     def _start_async_saving(self, atexit_save: bool = True):
         if not self.auto_saver_thread:
             def save_regularly():
@@ -655,13 +1050,21 @@ class Context:
 
     def get_save(self) -> dict:
         self.recheck_hints()
+        d = self.get_save_state()
+        d.update({
+            "received_items": self.received_items,
+            "hints": dict(self.hints),
+            "location_checks": dict(self.location_checks),
+            "stored_data": self.stored_data,
+        })
+        return d
+
+    def get_save_state(self) -> dict:
+        """All of the save except the parts SaveJournal tracks the changes of."""
         d = {
             "version": self.save_version,
             "connect_names": self.connect_names,
-            "received_items": self.received_items,
             "hints_used": dict(self.hints_used),
-            "hints": dict(self.hints),
-            "location_checks": dict(self.location_checks),
             "name_aliases": self.name_aliases,
             "client_game_state": dict(self.client_game_state),
             "client_activity_timers": tuple(
@@ -670,7 +1073,6 @@ class Context:
                 (key, value.timestamp()) for key, value in self.client_connection_timers.items()),
             "random_state": self.random.getstate(),
             "group_collected": dict(self.group_collected),
-            "stored_data": self.stored_data,
             "game_options": {"hint_cost": self.hint_cost, "location_check_points": self.location_check_points,
                              "server_password": self.server_password, "password": self.password,
                              "release_mode": self.release_mode,
@@ -690,6 +1092,7 @@ class Context:
         self.received_items = savedata["received_items"]
         self.hints_used.update(savedata["hints_used"])
         self.hints.update(savedata["hints"])
+        self.reindex_hints()
 
         self.name_aliases.update(savedata["name_aliases"])
         self.client_game_state.update(savedata["client_game_state"])
@@ -719,11 +1122,42 @@ class Context:
 
         if "stored_data" in savedata:
             self.stored_data = savedata["stored_data"]
+            self.index_stored_data()
         # count items and slots from lists for items_handling = remote
         self.logger.info(
             f'Loaded save file with {sum([len(v) for k, v in self.received_items.items() if k[2]])} received items '
             f'for {sum(k[2] for k in self.received_items)} players')
 
+    # data storage
+    def index_stored_data(self) -> None:
+        """Rebuild the sorted keys and sizes of stored_data after replacing it."""
+        self.stored_data_keys = sorted(self.stored_data)
+        self.stored_data_sizes = {key: len(self.dumper(value)) for key, value in self.stored_data.items()}
+
+    def set_stored_data(self, key: str, value: typing.Any) -> None:
+        if key not in self.stored_data:
+            bisect.insort(self.stored_data_keys, key)
+        self.stored_data[key] = value
+        self.stored_data_sizes[key] = len(self.dumper(value))
+        if self.save_journal:
+            self.save_journal.add_stored_data(key)
+
+    def get_stored_data_keys(self, prefix: str) -> typing.List[str]:
+        """Returns the keys of stored_data starting with a prefix, in sorted order."""
+        keys = self.stored_data_keys
+        start = end = bisect.bisect_left(keys, prefix)
+        while end < len(keys) and keys[end].startswith(prefix):
+            end += 1
+        return keys[start:end]
+
+    def get_stored_data_subscribers(self, key: str) -> typing.Set[Client]:
+        """Returns the clients that registered to receive updates of a key, by the key or a prefix of it."""
+        targets = set(self.stored_data_notification_clients.get(key, ()))
+        for prefix, clients in self.stored_data_prefix_notification_clients.items():
+            if key.startswith(prefix):
+                targets.update(clients)
+        return targets
+
     # rest
 
     def get_hint_cost(self, slot):
@@ -732,11 +1166,27 @@ class Context:
         return 0
 
     def recheck_hints(self, team: typing.Optional[int] = None, slot: typing.Optional[int] = None,
-                      changed: typing.Optional[typing.Set[team_slot]] = None) -> None:
+                      changed: typing.Optional[typing.Set[team_slot]] = None,
+                      locations: typing.Optional[typing.Iterable[int]] = None) -> None:
         """Refreshes the hints for the specified team/slot. Providing 'None' for either team or slot
         will refresh all teams or all slots respectively. If a set is passed for 'changed', each (team,slot)
         pair that has at least one hint modified will be added to the set.
+        If 'locations' of the specified team/slot are passed, like ones that just got checked,
+        only the hints for these locations are refreshed.
         """
+        if locations is not None:
+            assert team is not None and slot is not None, "locations can only be rechecked for a specific team/slot"
+            for location in locations:
+                for hint in tuple(self.hint_index.get((team, slot, location), ())):
+                    new_hint = hint.re_check(self, team)
+                    if hint == new_hint:
+                        continue
+                    for player in self.slot_set(hint.receiving_player) | {hint.finding_player}:
+                        if changed is not None:
+                            changed.add((team, player))
+                        self.replace_hint(team, player, hint, new_hint)
+            return
+
         for hint_team, hint_slot in self.hints:
             if team != hint_team and team is not None:
                 continue  # Check specified team only, all if team is None
@@ -748,13 +1198,35 @@ class Context:
                 new_hints.add(new_hint)
                 if hint == new_hint:
                     continue
+                self.unindex_hint(hint_team, hint)
+                self.index_hint(hint_team, new_hint)
                 for player in self.slot_set(hint.receiving_player) | {hint.finding_player}:
                     if changed is not None:
                         changed.add((hint_team,player))
                     if slot is not None and slot != player:
                         self.replace_hint(hint_team, player, hint, new_hint)
+                if self.save_journal:
+                    self.save_journal.add_hints(hint_team, hint_slot)
             self.hints[hint_team, hint_slot] = new_hints
 
+    def index_hint(self, team: int, hint: Hint) -> None:
+        self.hint_index.setdefault((team, hint.finding_player, hint.location), set()).add(hint)
+
+    def unindex_hint(self, team: int, hint: Hint) -> None:
+        key = team, hint.finding_player, hint.location
+        hints = self.hint_index.get(key)
+        if hints is not None:
+            hints.discard(hint)
+            if not hints:
+                del self.hint_index[key]
+
+    def reindex_hints(self) -> None:
+        """Rebuilds hint_index, needed after self.hints gets changed without going through Context methods."""
+        self.hint_index.clear()
+        for (team, _), hints in self.hints.items():
+            for hint in hints:
+                self.index_hint(team, hint)
+
     def get_rechecked_hints(self, team: int, slot: int):
         self.recheck_hints(team, slot)
         return self.hints[team, slot]
@@ -825,10 +1297,14 @@ class Context:
                 # we can check once if hint already exists
                 if hint not in self.hints[team, hint.finding_player]:
                     self.hints[team, hint.finding_player].add(hint)
+                    self.index_hint(team, hint)
                     new_hint_events.add(hint.finding_player)
                     for player in self.slot_set(hint.receiving_player):
                         self.hints[team, player].add(hint)
                         new_hint_events.add(player)
+                    if self.save_journal:
+                        for player in self.slot_set(hint.receiving_player) | {hint.finding_player}:
+                            self.save_journal.add_hints(team, player)
 
             self.logger.info("Notice (Team #%d): %s" % (team + 1, format_hint(self, team, hint)))
         for slot in new_hint_events:
@@ -839,12 +1315,11 @@ class Context:
                 if not clients:
                     continue
                 client_hints = [datum[1] for datum in sorted(hint_data, key=lambda x: x[0].finding_player != slot)]
-                for client in clients:
-                    async_start(self.send_msgs(client, client_hints))
+                self.queue_broadcast(clients, self.dumper(client_hints))
 
     def get_hint(self, team: int, finding_player: int, seeked_location: int) -> typing.Optional[Hint]:
-        for hint in self.hints[team, finding_player]:
-            if hint.location == seeked_location and hint.finding_player == finding_player:
+        for hint in self.hint_index.get((team, finding_player, seeked_location), ()):
+            if hint in self.hints[team, finding_player]:
                 return hint
         return None
     
@@ -852,6 +1327,10 @@ class Context:
         if old_hint in self.hints[team, slot]:
             self.hints[team, slot].remove(old_hint)
             self.hints[team, slot].add(new_hint)
+            self.unindex_hint(team, old_hint)
+            self.index_hint(team, new_hint)
+            if self.save_journal:
+                self.save_journal.add_hints(team, slot)
     
     # "events"
 
@@ -874,13 +1353,13 @@ class Context:
 
     def on_changed_hints(self, team: int, slot: int):
         key: str = f"_read_hints_{team}_{slot}"
-        targets: typing.Set[Client] = set(self.stored_data_notification_clients[key])
+        targets: typing.Set[Client] = self.get_stored_data_subscribers(key)
         if targets:
             self.broadcast(targets, [{"cmd": "SetReply", "key": key, "value": self.hints[team, slot]}])
 
     def on_client_status_change(self, team: int, slot: int):
         key: str = f"_read_client_status_{team}_{slot}"
-        targets: typing.Set[Client] = set(self.stored_data_notification_clients[key])
+        targets: typing.Set[Client] = self.get_stored_data_subscribers(key)
         if targets:
             self.broadcast(targets, [{"cmd": "SetReply", "key": key, "value": self.client_game_state[team, slot]}])
 
@@ -889,9 +1368,7 @@ def update_aliases(ctx: Context, team: int):
     cmd = ctx.dumper([{"cmd": "RoomUpdate",
                        "players": ctx.get_players_package()}])
 
-    for clients in ctx.clients[team].values():
-        for client in clients:
-            async_start(ctx.send_encoded_msgs(client, cmd))
+    ctx.queue_broadcast(itertools.chain.from_iterable(ctx.clients[team].values()), cmd)
 
 
 async def server(websocket: "ServerConnection", path: str = "/", ctx: Context = None) -> None:
@@ -1077,7 +1554,7 @@ def send_new_items(ctx: Context):
                 items = get_received_items(ctx, team, slot, client.remote_items)
                 if len(start_inventory) + len(items) > client.send_index:
                     first_new_item = max(0, client.send_index - len(start_inventory))
-                    async_start(ctx.send_msgs(client, [{
+                    ctx.queue_encoded_msgs(client, ctx.dumper([{
                         "cmd": "ReceivedItems",
                         "index": client.send_index,
                         "items": start_inventory[client.send_index:] + items[first_new_item:]}]))
@@ -1166,6 +1643,8 @@ def register_location_checks(ctx: Context, team: int, slot: int, locations: typi
         del sortable
 
         ctx.location_checks[team, slot] |= new_locations
+        if ctx.save_journal:
+            ctx.save_journal.add_location_checks(team, slot, new_locations)
         send_new_items(ctx)
         ctx.broadcast(ctx.clients[team][slot], [{
             "cmd": "RoomUpdate",
@@ -1173,7 +1652,7 @@ def register_location_checks(ctx: Context, team: int, slot: int, locations: typi
             "checked_locations": new_locations,  # send back new checks only
         }])
         updated_slots: typing.Set[tuple[int, int]] = set()
-        ctx.recheck_hints(team, slot, updated_slots)
+        ctx.recheck_hints(team, slot, updated_slots, new_locations)
         for hint_team, hint_slot in updated_slots:
             ctx.on_changed_hints(hint_team, hint_slot)
         ctx.save()
@@ -1692,9 +2171,7 @@ class ClientMessageProcessor(CommonCommandProcessor):
         points_available = get_client_points(self.ctx, self.client)
         cost = self.ctx.get_hint_cost(self.client.slot)
         if not input_text:
-            hints = {hint.re_check(self.ctx, self.client.team) for hint in
-                     self.ctx.hints[self.client.team, self.client.slot]}
-            self.ctx.hints[self.client.team, self.client.slot] = hints
+            hints = self.ctx.get_rechecked_hints(self.client.team, self.client.slot)
             self.ctx.notify_hints(self.client.team, list(hints), recipients=(self.client.slot,))
             self.output(f"A hint costs {self.ctx.get_hint_cost(self.client.slot)} points. "
                         f"You have {points_available} points.")
@@ -1920,45 +2397,43 @@ async def process_client_cmd(ctx: Context, client: Client, args: dict):
             connected_packet = {
                 "cmd": "Connected",
                 "team": client.team, "slot": client.slot,
-                "players": ctx.get_players_package(),
                 "missing_locations": get_missing_checks(ctx, team, slot),
                 "checked_locations": get_checked_checks(ctx, team, slot),
-                "slot_info": ctx.slot_info,
                 "hint_points": get_slot_points(ctx, team, slot),
             }
-            reply = [connected_packet]
+            # the parts that are the same for every connect are spliced in already encoded
+            encoded_parts = {
+                "players": ctx.encode_players_package(),
+                "slot_info": ctx.encode_part("slot_info", lambda: ctx.slot_info),
+            }
+            if args.get("slot_data", True):
+                encoded_parts["slot_data"] = ctx.encode_part(("slot_data", client.slot),
+                                                             lambda: ctx.slot_data[client.slot])
+            reply = [ctx.encode_with_parts(connected_packet, encoded_parts)]
             start_inventory = get_start_inventory(ctx, slot, client.remote_start_inventory)
             items = get_received_items(ctx, client.team, client.slot, client.remote_items)
             if (start_inventory or items) and not client.no_items:
-                reply.append({"cmd": 'ReceivedItems', "index": 0, "items": start_inventory + items})
+                reply.append(ctx.encode_received_items(client))
                 client.send_index = len(start_inventory) + len(items)
+            # queued before the messages about joining, so the client receives Connected first
+            ctx.queue_encoded_msgs(client, f"[{','.join(reply)}]")
             if not client.auth:  # if this was a Re-Connect, don't print to console
                 client.auth = True
                 await on_client_joined(ctx, client)
-            if args.get("slot_data", True):
-                connected_packet["slot_data"] = ctx.slot_data[client.slot]
-            await ctx.send_msgs(client, reply)
 
     elif cmd == "GetDataPackage":
         exclusions = args.get("exclusions", [])
         if "games" in args:
-            games = {name: game_data for name, game_data in ctx.gamespackage.items()
-                     if name in set(args.get("games", []))}
-            await ctx.send_msgs(client, [{"cmd": "DataPackage",
-                                          "data": {"games": games}}])
+            games = [name for name in ctx.gamespackage if name in set(args.get("games", []))]
+            await ctx.send_encoded_msgs(client, f"[{ctx.encode_data_package(games)}]")
         # TODO: remove exclusions behaviour around 0.5.0
         elif exclusions:
             exclusions = set(exclusions)
-            games = {name: game_data for name, game_data in ctx.gamespackage.items()
-                     if name not in exclusions}
-
-            package = {"games": games}
-            await ctx.send_msgs(client, [{"cmd": "DataPackage",
-                                          "data": package}])
+            games = [name for name in ctx.gamespackage if name not in exclusions]
+            await ctx.send_encoded_msgs(client, f"[{ctx.encode_data_package(games)}]")
 
         else:
-            await ctx.send_msgs(client, [{"cmd": "DataPackage",
-                                          "data": {"games": ctx.gamespackage}}])
+            await ctx.send_encoded_msgs(client, f"[{ctx.encode_data_package(ctx.gamespackage)}]")
 
     elif client.auth:
         if cmd == "ConnectUpdate":
@@ -1974,8 +2449,7 @@ async def process_client_cmd(ctx: Context, client: Client, args: dict):
                     items = get_received_items(ctx, client.team, client.slot, client.remote_items)
                     if (items or start_inventory) and not client.no_items:
                         client.send_index = len(start_inventory) + len(items)
-                        await ctx.send_msgs(client, [{"cmd": "ReceivedItems", "index": 0,
-                                                      "items": start_inventory + items}])
+                        await ctx.send_encoded_msgs(client, f"[{ctx.encode_received_items(client)}]")
                     else:
                         client.send_index = 0
                 except (ValueError, TypeError) as err:
@@ -2002,8 +2476,7 @@ async def process_client_cmd(ctx: Context, client: Client, args: dict):
             items = get_received_items(ctx, client.team, client.slot, client.remote_items)
             if (start_inventory or items) and not client.no_items:
                 client.send_index = len(start_inventory) + len(items)
-                await ctx.send_msgs(client, [{"cmd": "ReceivedItems", "index": 0,
-                                              "items": start_inventory + items}])
+                await ctx.send_encoded_msgs(client, f"[{ctx.encode_received_items(client)}]")
 
         elif cmd == 'LocationChecks':
             if client.no_locations:
@@ -2160,47 +2633,83 @@ async def process_client_cmd(ctx: Context, client: Client, args: dict):
                     await ctx.send_encoded_msgs(bounceclient, msg)
 
         elif cmd == "Get":
-            if "keys" not in args or type(args["keys"]) != list:
+            if not valid_key_arguments(args):
                 await ctx.send_msgs(client, [{'cmd': 'InvalidPacket', "type": "arguments",
                                               "text": 'Retrieve', "original_cmd": cmd}])
                 return
             args["cmd"] = "Retrieved"
-            keys = args["keys"]
+            keys = args.get("keys", [])
             args["keys"] = {
                 key: ctx.read_data.get(key[6:], lambda: None)() if key.startswith("_read_") else
                      ctx.stored_data.get(key, None)
                 for key in keys
             }
+            for prefix in args.get("prefixes", ()):
+                for key in ctx.get_stored_data_keys(prefix):
+                    args["keys"][key] = ctx.stored_data[key]
             await ctx.send_msgs(client, [args])
 
         elif cmd == "Set":
-            if "key" not in args or args["key"].startswith("_read_") or \
-                    "operations" not in args or not type(args["operations"]) == list:
+            # a Set can also apply the arguments of each of its "sets" at once, for multiple keys
+            if "sets" in args:
+                sets = args.pop("sets")
+                requests = [{**args, **request} for request in sets if type(request) is dict] \
+                    if type(sets) is list else []
+                valid = len(requests) == len(sets)
+            else:
+                requests = [args]
+                valid = True
+            if not valid or not all(valid_set_arguments(request) for request in requests):
                 await ctx.send_msgs(client, [{'cmd': 'InvalidPacket', "type": "arguments",
                                               "text": 'Set', "original_cmd": cmd}])
                 return
-            args["cmd"] = "SetReply"
-            value = ctx.stored_data.get(args["key"], args.get("default", 0))
-            args["original_value"] = copy.copy(value)
-            args["slot"] = client.slot
-            for operation in args["operations"]:
-                func = modify_functions[operation["operation"]]
-                value = func(value, operation["value"])
-            ctx.stored_data[args["key"]] = args["value"] = value
-            targets = set(ctx.stored_data_notification_clients[args["key"]])
-            if args.get("want_reply", False):
-                targets.add(client)
-            if targets:
-                ctx.broadcast(targets, [args])
+            replies: typing.List[typing.Dict[str, typing.Any]] = []
+            values: typing.Dict[str, typing.Any] = {}  # only stored once all operations succeeded
+            try:
+                for request in requests:
+                    key = request["key"]
+                    if key in values:
+                        original_value = values[key]
+                    else:
+                        original_value = ctx.stored_data.get(key, request.get("default", 0))
+                    value = copy.copy(original_value)  # operations may change the value in place
+                    for operation in request["operations"]:
+                        func = modify_functions[operation["operation"]]
+                        value = func(value, operation.get("value"))
+                    values[key] = value
+                    replies.append({**request, "cmd": "SetReply", "original_value": original_value, "value": value,
+                                    "slot": client.slot})
+            except Exception as e:
+                await ctx.send_msgs(client, [{'cmd': 'InvalidPacket', "type": "arguments",
+                                              "text": f'Set: {e}', "original_cmd": cmd}])
+                return
+            for key, value in values.items():
+                ctx.set_stored_data(key, value)
+
+            # each target gets all replies for it at once, encoded once for all targets getting the same replies
+            target_replies: typing.Dict[Client, typing.List[int]] = collections.defaultdict(list)
+            for index, reply in enumerate(replies):
+                targets = ctx.get_stored_data_subscribers(reply["key"])
+                if reply.get("want_reply", False):
+                    targets.add(client)
+                for target in targets:
+                    target_replies[target].append(index)
+            reply_targets: typing.Dict[typing.Tuple[int, ...], typing.List[Client]] = collections.defaultdict(list)
+            for target, indices in target_replies.items():
+                reply_targets[tuple(indices)].append(target)
+            for indices, targets in reply_targets.items():
+                ctx.broadcast(targets, [replies[index] for index in indices])
             ctx.save()
 
         elif cmd == "SetNotify":
-            if "keys" not in args or type(args["keys"]) != list:
+            if not valid_key_arguments(args):
                 await ctx.send_msgs(client, [{'cmd': 'InvalidPacket', "type": "arguments",
                                               "text": 'SetNotify', "original_cmd": cmd}])
                 return
-            for key in args["keys"]:
+            for key in args.get("keys", ()):
                 ctx.stored_data_notification_clients[key].add(client)
+            for prefix in args.get("prefixes", ()):
+                ctx.stored_data_prefix_notification_clients[prefix].add(client)
 
 
 def update_client_status(ctx: Context, client: Client, new_status: ClientStatus):
@@ -2242,6 +2751,16 @@ class ServerCommandProcessor(CommonCommandProcessor):
             self.output("Saving is disabled.")
             return False
 
+    def _cmd_data_storage(self, prefix: str = "") -> bool:
+        """Show the size of the data storage and its largest keys, optionally only of the keys starting with prefix"""
+        keys = self.ctx.get_stored_data_keys(prefix)
+        sizes = self.ctx.stored_data_sizes
+        self.output(f"{len(keys)} keys with {sum(sizes[key] for key in keys)} characters of data"
+                    + (f" starting with {prefix}." if prefix else "."))
+        for key in heapq.nlargest(10, keys, key=sizes.__getitem__):
+            self.output(f"{key}: {sizes[key]} characters")
+        return True
+
     def _cmd_players(self) -> bool:
         """Get information about connected players"""
         self.output(get_players_string(self.ctx))
@@ -2591,6 +3110,9 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument('--password', default=defaults["password"])
     parser.add_argument('--savefile', default=defaults["savefile"])
     parser.add_argument('--disable_save', default=defaults["disable_save"], action='store_true')
+    parser.add_argument('--save_journal', default=defaults["save_journal"], action='store_true',
+                        help="Append changes to a journal when saving, instead of writing the whole save "
+                             "every time. Meant for large multiworlds.")
     parser.add_argument('--cert', help="Path to a SSL Certificate for encryption.")
     parser.add_argument('--cert_key', help="Path to SSL Certificate Key file")
     parser.add_argument('--loglevel', default=defaults["loglevel"],
@@ -2721,7 +3243,7 @@ async def main(args: argparse.Namespace):
         logging.exception(f"Failed to read multiworld data ({e})")
         raise
 
-    ctx.init_save(not args.disable_save)
+    ctx.init_save(not args.disable_save, args.save_journal)
 
     ssl_context = load_server_cert(args.cert, args.cert_key) if args.cert else None
 
@@ -2769,6 +3291,8 @@ async def main(args: argparse.Namespace):
 client_message_processor = ClientMessageProcessor
 
 if __name__ == '__main__':
+    # the server only needs the data packages of the worlds, which the world index has without importing them
+    os.environ.setdefault("ARCHIPELAGO_LAZY_WORLDS", "1")
     try:
         asyncio.run(main(parse_args()))
     except asyncio.exceptions.CancelledError:
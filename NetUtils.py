@@ -1,15 +1,21 @@
 from __future__ import annotations
 
+from array import array
 from collections.abc import Mapping, Sequence
 import typing
 import enum
+import heapq
+import struct
+import sys
 import warnings
+import zlib
 from json import JSONEncoder, JSONDecoder
+from json.encoder import INFINITY, encode_basestring
 
 if typing.TYPE_CHECKING:
     from websockets import WebSocketServerProtocol as ServerConnection
 
-from Utils import ByValue, Version
+from Utils import ByValue, Version, restricted_dumps, restricted_loads
 
 
 class HintStatus(ByValue, enum.IntEnum):
@@ -135,8 +141,122 @@ _encode = JSONEncoder(
 ).encode
 
 
-def encode(obj: typing.Any) -> str:
-    return _encode(_scan_for_TypedTuples(obj))
+_named_tuple_parts: dict[type, tuple[list[str], str]] = {}
+"""The encoded keys of each NamedTuple type's fields, and the encoded end of the NamedTuple including its class."""
+
+
+def _encode_float(o: float) -> str:
+    if o != o:
+        return "NaN"
+    if o == INFINITY:
+        return "Infinity"
+    if o == -INFINITY:
+        return "-Infinity"
+    return float.__repr__(o)
+
+
+def _encode_key(key: typing.Any) -> str:
+    if isinstance(key, str):
+        return encode_basestring(key)
+    if key is True:
+        return '"true"'
+    if key is False:
+        return '"false"'
+    if key is None:
+        return '"null"'
+    if isinstance(key, int):
+        return f'"{int.__repr__(key)}"'
+    if isinstance(key, float):
+        return f'"{_encode_float(key)}"'
+    raise TypeError(f"keys must be str, int, float, bool or None, not {key.__class__.__name__}")
+
+
+def _get_named_tuple_parts(cls: type) -> tuple[list[str], str]:
+    parts = _named_tuple_parts.get(cls)
+    if parts is None:
+        keys = [encode_basestring(field) + ":" for field in cls._fields]
+        parts = _named_tuple_parts[cls] = (
+            ["{" + keys[0]] + ["," + key for key in keys[1:]] if keys else [],
+            ("," if keys else "{") + '"class":' + encode_basestring(cls.__name__) + "}",
+        )
+    return parts
+
+
+def _iterencode(o: typing.Any, append: typing.Callable[[str], None], scan: bool) -> None:
+    # scan: encode NamedTuples as dicts with their class and sets as lists, which values of NamedTuples don't
+    # the most common types of values get encoded in place instead of another call
+    t = type(o)
+    if t is str:
+        append(encode_basestring(o))
+    elif t is int:
+        append(int.__repr__(o))
+    elif o is None:
+        append("null")
+    elif o is True:
+        append("true")
+    elif o is False:
+        append("false")
+    elif t is float:
+        append(_encode_float(o))
+    elif isinstance(o, dict):
+        separator = "{"
+        for key, value in o.items():
+            append(separator + (encode_basestring(key) if type(key) is str else _encode_key(key)) + ":")
+            separator = ","
+            t = type(value)
+            if t is str:
+                append(encode_basestring(value))
+            elif t is int:
+                append(int.__repr__(value))
+            else:
+                _iterencode(value, append, scan)
+        append("}" if separator == "," else "{}")
+    elif scan and isinstance(o, tuple) and hasattr(t, "_fields"):  # NamedTuple is not actually a parent class
+        keys, end = _get_named_tuple_parts(t)
+        for key, value in zip(keys, o):
+            t = type(value)
+            if t is int:
+                append(key + int.__repr__(value))
+            elif t is str:
+                append(key + encode_basestring(value))
+            else:
+                append(key)
+                _iterencode(value, append, False)
+        append(end)
+    elif isinstance(o, (list, tuple)) or (scan and isinstance(o, (set, frozenset))):
+        separator = "["
+        for value in o:
+            t = type(value)
+            if t is int:
+                append(separator + int.__repr__(value))
+            elif t is str:
+                append(separator + encode_basestring(value))
+            else:
+                append(separator)
+                _iterencode(value, append, scan)
+            separator = ","
+        append("]" if separator == "," else "[]")
+    elif isinstance(o, str):
+        append(encode_basestring(o))
+    elif isinstance(o, int):
+        append(int.__repr__(o))
+    elif isinstance(o, float):
+        append(_encode_float(o))
+    else:
+        raise TypeError(f"Object of type {o.__class__.__name__} is not JSON serializable")
+
+
+def _encode_python(obj: typing.Any) -> str:
+    """
+    Encodes a network message to JSON, with NamedTuples like NetworkItem as objects naming their class.
+    Gives the same result as `_encode(_scan_for_TypedTuples(obj))` in a single pass without copying the message.
+    """
+    parts: list[str] = []
+    _iterencode(obj, parts.append, True)
+    return "".join(parts)
+
+
+encode = _encode_python  # replaced by the compiled implementation in _speedups if available
 
 
 def get_any_version(data: dict) -> Version:
@@ -427,20 +547,40 @@ class _LocationStore(dict, typing.MutableMapping[int, typing.Dict[int, typing.Tu
         if len(self.get(0, {})):
             raise ValueError("Invalid player id 0 for location")
 
-    def find_item(self, slots: typing.Set[int], seeked_item_id: int
-                  ) -> typing.Generator[typing.Tuple[int, int, int, int, int], None, None]:
+        # (position, (finding_player, location_id, item_id, receiving_player, item_flags)) by receiver and item,
+        # the position keeping the order of the locations in the store when merging results of several receivers
+        self._receiver_index: typing.Dict[int, typing.Dict[int, typing.List[
+            typing.Tuple[int, typing.Tuple[int, int, int, int, int]]]]] = {}
+        position = 0
         for finding_player, check_data in self.items():
             for location_id, (item_id, receiving_player, item_flags) in check_data.items():
-                if receiving_player in slots and item_id == seeked_item_id:
-                    yield finding_player, location_id, item_id, receiving_player, item_flags
+                self._receiver_index.setdefault(receiving_player, {}).setdefault(item_id, []).append(
+                    (position, (finding_player, location_id, item_id, receiving_player, item_flags)))
+                position += 1
+
+    @classmethod
+    def from_buffer(cls, buffer: typing.Any) -> _LocationStore:
+        """Create a store from a locations table like `pack_locations` writes."""
+        return cls(unpack_locations(buffer))
+
+    def find_item(self, slots: typing.Set[int], seeked_item_id: int
+                  ) -> typing.Generator[typing.Tuple[int, int, int, int, int], None, None]:
+        found = [self._receiver_index[slot][seeked_item_id] for slot in slots
+                 if seeked_item_id in self._receiver_index.get(slot, ())]
+        if len(found) > 1:
+            found = [heapq.merge(*found)]
+        for entries in found:
+            for _, entry in entries:
+                yield entry
 
     def get_for_player(self, slot: int) -> typing.Dict[int, typing.Set[int]]:
         import collections
         all_locations: typing.Dict[int, typing.Set[int]] = collections.defaultdict(set)
-        for source_slot, location_data in self.items():
-            for location_id, values in location_data.items():
-                if values[1] == slot:
-                    all_locations[source_slot].add(location_id)
+        # sorted by position to add the source slots in the order of the store
+        entries = sorted(entry for item_entries in self._receiver_index.get(slot, {}).values()
+                         for entry in item_entries)
+        for _, (source_slot, location_id, _, _, _) in entries:
+            all_locations[source_slot].add(location_id)
         return all_locations
 
     def get_checked(self, state: typing.Dict[typing.Tuple[int, int], typing.Set[int]], team: int, slot: int
@@ -532,3 +672,166 @@ else:
             warnings.warn("_speedups not available. Falling back to pure python LocationStore. "
                           "Install a matching C++ compiler for your platform to compile _speedups.")
             LocationStore = _LocationStore
+    if LocationStore is not _LocationStore:
+        try:
+            from _speedups import encode
+        except ImportError:  # outdated _speedups, which already warned
+            pass
+
+
+def pack_locations(locations: Mapping[int, Mapping[int, Sequence[int]]]) -> bytes:
+    """
+    Lay out the locations of a multidata as a table that `LocationStore.from_buffer` reads directly:
+    the number of players and locations followed by the columns of sender, location, item, receiver and flags
+    of the locations sorted by sender and location, all as little endian 64bit integers.
+    """
+    rows = [(sender, location, *data[:3]) for sender, sender_locations in sorted(locations.items())
+            for location, data in sorted(sender_locations.items())]
+    table = array("q", (len(locations), len(rows)))
+    for column in range(5):
+        table.extend(row[column] for row in rows)
+    if sys.byteorder != "little":
+        table.byteswap()
+    return table.tobytes()
+
+
+def unpack_locations(buffer: typing.Any) -> dict[int, dict[int, tuple[int, int, int]]]:
+    """Read a table written by `pack_locations` back into the dicts of the `locations` of a multidata."""
+    table = array("q")
+    table.frombytes(buffer)
+    if sys.byteorder != "little":
+        table.byteswap()
+    if len(table) < 2 or len(table) != 2 + 5 * table[1]:
+        raise ValueError("Invalid locations table")
+    count = table[1]
+    senders, location_ids, items, receivers, flags = (table[2 + column * count:2 + (column + 1) * count]
+                                                      for column in range(5))
+    locations: dict[int, dict[int, tuple[int, int, int]]] = {}
+    for sender, location, data in zip(senders, location_ids, zip(items, receivers, flags)):
+        locations.setdefault(sender, {})[location] = data
+    if len(locations) < table[0]:
+        # players without locations only show up in the number of players, as the lowest ids without locations
+        player = 0
+        while len(locations) < table[0]:
+            player += 1
+            locations.setdefault(player, {})
+        locations = dict(sorted(locations.items()))
+    return locations
+
+
+multidata_format_version = 4
+"""
+Version of the multidata format `encode_multidata` writes. Versions 1 to 3 are one compressed pickle of the whole
+multidata, version 4 stores each key of the multidata as a separately compressed section, see `MultiDataSections`.
+"""
+
+_section_count = struct.Struct("<I")
+_section_header = struct.Struct("<HQ")  # length of the name, length of the compressed data
+
+
+def _encode_section(name: str, value: typing.Any) -> bytes:
+    if name == "locations":
+        # the columns of the table compress almost as well at the default level, at a fraction of the time of level 9
+        return zlib.compress(pack_locations(value))
+    return zlib.compress(restricted_dumps(value), 9)
+
+
+def _decode_section(name: str, data: typing.Any) -> typing.Any:
+    if name == "locations":
+        return unpack_locations(zlib.decompress(data))
+    return restricted_loads(zlib.decompress(data))
+
+
+class MultiDataSections(typing.MutableMapping[str, typing.Any]):
+    """
+    Multidata in format version 4, which only decodes a section the first time it is accessed.
+
+    The format is the version byte, the number of sections, the name and compressed length of each section and then
+    the compressed sections in that order. The locations section is a table of `pack_locations`, so a `LocationStore`
+    can be built from it without creating the dicts first, see `pop_location_store`. All other sections are pickles.
+    """
+
+    _compressed: dict[str, memoryview]
+    """Compressed data of the sections by their name, in the order of the file."""
+    _decoded: dict[str, typing.Any]
+
+    def __init__(self, data: bytes) -> None:
+        view = memoryview(data)
+        if view[0] != multidata_format_version:
+            raise ValueError(f"Multidata format version {view[0]} is not {multidata_format_version}.")
+        offset = 1
+        count, = _section_count.unpack_from(view, offset)
+        offset += _section_count.size
+        lengths: list[tuple[str, int]] = []
+        for _ in range(count):
+            name_length, length = _section_header.unpack_from(view, offset)
+            offset += _section_header.size
+            lengths.append((bytes(view[offset:offset + name_length]).decode(), length))
+            offset += name_length
+        self._compressed = {}
+        for name, length in lengths:
+            self._compressed[name] = view[offset:offset + length]
+            offset += length
+        if offset != len(view):
+            raise ValueError("Multidata is truncated or has trailing data.")
+        self._decoded = {}
+
+    def __getitem__(self, key: str) -> typing.Any:
+        try:
+            return self._decoded[key]
+        except KeyError:
+            value = self._decoded[key] = _decode_section(key, self._compressed[key])
+            return value
+
+    def __setitem__(self, key: str, value: typing.Any) -> None:
+        if key not in self._compressed:
+            self._compressed[key] = memoryview(b"")
+        self._decoded[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        del self._compressed[key]
+        self._decoded.pop(key, None)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._compressed
+
+    def __iter__(self) -> typing.Iterator[str]:
+        return iter(self._compressed)
+
+    def __len__(self) -> int:
+        return len(self._compressed)
+
+    def pop_location_store(self) -> LocationStore:
+        """Remove the locations from the multidata and build a `LocationStore` of them."""
+        compressed = self._compressed.pop("locations")
+        locations = self._decoded.pop("locations", None)
+        if locations is not None:
+            return LocationStore(locations)
+        return LocationStore.from_buffer(zlib.decompress(compressed))
+
+
+def encode_multidata(multidata: Mapping[str, typing.Any]) -> bytes:
+    """
+    Write a multidata in the current format version, see `MultiDataSections`.
+    Sections of a `MultiDataSections` that were never accessed are copied without decoding them.
+    """
+    sections: list[tuple[bytes, typing.Any]] = []
+    for name in multidata:
+        if isinstance(multidata, MultiDataSections) and name not in multidata._decoded:
+            data = multidata._compressed[name]
+        else:
+            data = _encode_section(name, multidata[name])
+        sections.append((name.encode(), data))
+    parts: list[typing.Any] = [bytes((multidata_format_version,)), _section_count.pack(len(sections))]
+    for name, data in sections:
+        parts.append(_section_header.pack(len(name), len(data)))
+        parts.append(name)
+    parts.extend(data for _, data in sections)
+    return b"".join(parts)
+
+
+def pop_location_store(multidata: MultiData | MultiDataSections) -> LocationStore:
+    """Remove the locations from a decoded multidata of any format version and build a `LocationStore` of them."""
+    if isinstance(multidata, MultiDataSections):
+        return multidata.pop_location_store()
+    return LocationStore(multidata.pop("locations"))
@@ -46,6 +46,14 @@ app.config["SELFGEN"] = True  # application process is in charge of scheduling G
 app.config["JOB_THRESHOLD"] = 1
 # after what time in seconds should generation be aborted, freeing the queue slot. Can be set to None to disable.
 app.config["JOB_TIME"] = 600
+# time in seconds between checks of the database for generations and rooms to start.
+app.config["JOB_POLL_INTERVAL"] = 0.1
+# the same, for when the website runs in the same process (SELFHOST), which notifies of them right away,
+# see WebHostLib.dispatch. The check only finds the work of websites running in other processes then.
+app.config["NOTIFIED_JOB_POLL_INTERVAL"] = 5
+# time in seconds between checks of the database for commands of hosted rooms to run.
+# commands of rooms the website notified of run right away
+app.config["COMMAND_POLL_INTERVAL"] = 5
 # maximum time in seconds since last activity for a room to be hosted
 app.config["MAX_ROOM_TIMEOUT"] = 259200
 # minimum time in days since last activity for a room to be deleted. 0 to disable.
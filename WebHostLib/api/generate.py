@@ -6,7 +6,7 @@ from markupsafe import Markup
 from pony.orm import commit
 
 from Utils import restricted_dumps
-from WebHostLib import app
+from WebHostLib import app, dispatch
 from WebHostLib.check import get_yaml_data, roll_options
 from WebHostLib.generate import get_meta
 from WebHostLib.models import Generation, STATE_QUEUED, Seed, STATE_ERROR
@@ -61,6 +61,7 @@ def generate_api():
                 meta=json.dumps(meta), state=STATE_QUEUED,
                 owner=session["_id"])
             commit()
+            dispatch.notify_generation()
             return {"text": f"Generation of seed {gen.id} started successfully.",
                     "detail": gen.id,
                     "encoded": app.url_map.converters["suuid"].to_url(None, gen.id),
@@ -3,6 +3,7 @@ from __future__ import annotations
 import json
 import logging
 import multiprocessing
+import time
 import typing
 from datetime import timedelta
 from threading import Event, Thread
@@ -12,6 +13,7 @@ from uuid import UUID
 from pony.orm import db_session, select, commit, PrimaryKey, desc
 
 from Utils import restricted_loads, utcnow
+from . import dispatch
 from .locker import Locker, AlreadyRunningException
 
 _stop_event = Event()
@@ -23,6 +25,16 @@ def stop() -> None:
     stop_event = _stop_event
     _stop_event = Event()  # new event for new threads
     stop_event.set()
+    dispatch.generations.notify()  # wake the threads waiting for work
+    dispatch.rooms.notify()
+
+
+def get_job_poll_interval(config: dict) -> float:
+    """Time in seconds between checks of the database for generations and rooms to start."""
+    if config["SELFHOST"]:
+        # the website of this process notifies of them, the database only has to be checked for other websites
+        return config["NOTIFIED_JOB_POLL_INTERVAL"]
+    return config["JOB_POLL_INTERVAL"]
 
 
 def handle_generation_success(seed_id):
@@ -113,7 +125,7 @@ def cleanup(config: dict[str, Any]):
             rooms += Room.select(lambda room: room.last_activity < cutoff).delete(bulk=True)
             seeds += Seed.select(lambda seed: not seed.rooms and seed.creation_time < cutoff).delete(bulk=True)
         slots = Slot.select(lambda slot: not slot.seed).delete(bulk=True)
-        # Command gets deleted by ponyorm Cascade Delete, as Room is Required
+        # Command and SaveJournalEntry get deleted by ponyorm Cascade Delete, as Room is Required
     if rooms or seeds or slots:
         logging.info(f"{rooms} Rooms, {seeds} Seeds and {slots} Slots have been deleted.")
 
@@ -130,7 +142,17 @@ def autohost(config: dict):
                     hosters.append(hoster)
                     hoster.start()
 
-                while not stop_event.wait(0.1):
+                poll_interval = get_job_poll_interval(config)
+                next_poll = 0.
+                while not stop_event.is_set():
+                    notified_rooms = dispatch.rooms.wait(max(0., next_poll - time.monotonic()))
+                    if stop_event.is_set():
+                        break
+                    for room_id in notified_rooms or ():
+                        hosters[room_id.int % len(hosters)].notify_room(room_id)
+                    if time.monotonic() < next_poll:
+                        continue
+                    next_poll = time.monotonic() + poll_interval
                     with db_session:
                         rooms = select(
                             room for room in Room if
@@ -171,7 +193,11 @@ def autogen(config: dict):
                             commit()
                         select(generation for generation in Generation if generation.state == STATE_ERROR).delete()
 
-                    while not stop_event.wait(0.1):
+                    poll_interval = get_job_poll_interval(config)
+                    while not stop_event.is_set():
+                        dispatch.generations.wait(poll_interval)
+                        if stop_event.is_set():
+                            break
                         with db_session:
                             # for update locks the database row(s) during transaction, preventing writes from elsewhere
                             to_start = select(
@@ -195,6 +221,8 @@ class MultiworldInstance():
         self.host = config["HOST_ADDRESS"]
         self.rooms_to_start = multiprocessing.Queue()
         self.rooms_shutting_down = multiprocessing.Queue()
+        self.rooms_notified = multiprocessing.Queue()
+        self.poll_interval = config["COMMAND_POLL_INTERVAL"]
         self.name = f"MultiHoster{id}"
 
     def start(self):
@@ -204,7 +232,8 @@ class MultiworldInstance():
         process = multiprocessing.Process(group=None, target=run_server_process,
                                           args=(self.name, self.ponyconfig, get_static_server_data(),
                                                 self.cert, self.key, self.host,
-                                                self.rooms_to_start, self.rooms_shutting_down),
+                                                self.rooms_to_start, self.rooms_shutting_down,
+                                                self.rooms_notified, self.poll_interval),
                                           name=self.name)
         process.start()
         self.process = process
@@ -213,10 +242,15 @@ class MultiworldInstance():
         while not self.rooms_shutting_down.empty():
             self.room_ids.remove(self.rooms_shutting_down.get(block=True, timeout=None))
         if room_id in self.room_ids:
-            pass  # should already be hosted currently.
-        else:
-            self.room_ids.add(room_id)
-            self.rooms_to_start.put(room_id)
+            return False  # should already be hosted currently.
+        self.room_ids.add(room_id)
+        self.rooms_to_start.put(room_id)
+        return True
+
+    def notify_room(self, room_id):
+        """Start a room the website notified of, or have it run its new commands if it is running already."""
+        if not self.start_room(room_id):
+            self.rooms_notified.put(room_id)
 
     def stop(self):
         if self.process:
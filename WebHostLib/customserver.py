@@ -20,12 +20,13 @@ from pony.orm import commit, db_session, select
 import Utils
 
 from MultiServer import (
-    Context, server, auto_shutdown, ServerCommandProcessor, ClientMessageProcessor, load_server_cert,
+    Context, SaveJournal, server, auto_shutdown, ServerCommandProcessor, ClientMessageProcessor, load_server_cert,
     server_per_message_deflate_factory,
 )
 from Utils import restricted_loads, cache_argsless
 from .locker import Locker
-from .models import Command, GameDataPackage, Room, db
+from .name_tables import NameLookup, NameTables, open_name_tables, write_name_tables
+from .models import Command, GameDataPackage, Room, SaveJournalEntry, db
 
 
 class CustomClientMessageProcessor(ClientMessageProcessor):
@@ -60,8 +61,81 @@ class DBCommandProcessor(ServerCommandProcessor):
         self.ctx.logger.info(text)
 
 
+class DBCommandListener:
+    """
+    Runs the commands the website queued in the database for the rooms of a room hosting process.
+    The commands of all rooms get queried together every `poll_interval` seconds, and those of a room right away when
+    the autohost notifies of it, see `WebHostLib.dispatch`.
+    """
+    poll_interval: float
+    processors: typing.Dict[typing.Any, DBCommandProcessor]
+    """Command processor by room id of the running rooms."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, poll_interval: float):
+        self.loop = loop
+        self.poll_interval = poll_interval
+        self.processors = {}
+        self._notified: typing.Set[typing.Any] = set()
+        self._wake = asyncio.Event()
+
+    def add(self, ctx: WebHostContext) -> None:
+        """Run the commands of a room, starting with those queued while it was not running."""
+        self.processors[ctx.room_id] = DBCommandProcessor(ctx)
+        self._notify(ctx.room_id)
+
+    def remove(self, ctx: WebHostContext) -> None:
+        self.processors.pop(ctx.room_id, None)
+
+    def notify(self, room_id) -> None:
+        """Run the new commands of a room right away, can be called from any thread."""
+        self.loop.call_soon_threadsafe(self._notify, room_id)
+
+    def _notify(self, room_id) -> None:
+        self._notified.add(room_id)
+        self._wake.set()
+
+    async def run(self) -> None:
+        next_poll = self.loop.time() + self.poll_interval
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), max(0., next_poll - self.loop.time()))
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            room_ids, self._notified = self._notified, set()
+            if self.loop.time() >= next_poll:
+                next_poll = self.loop.time() + self.poll_interval
+                room_ids = set(self.processors)
+            room_ids.intersection_update(self.processors)
+            if room_ids:
+                try:
+                    commands = await self.loop.run_in_executor(None, self._take_commands, tuple(room_ids))
+                except Exception as e:
+                    logging.exception(e)
+                    continue
+                for room_id, commandtext in commands:
+                    processor = self.processors.get(room_id)
+                    if processor:
+                        processor(commandtext)
+
+    @staticmethod
+    def _take_commands(room_ids: typing.Tuple[typing.Any, ...]) -> typing.List[typing.Tuple[typing.Any, str]]:
+        with db_session:
+            commands = select(command for command in Command if command.room.id in room_ids).order_by(Command.id)
+            taken = []
+            for command in commands:
+                taken.append((command.room.id, command.commandtext))
+                command.delete()
+            if taken:
+                commit()
+        return taken
+
+
 class WebHostContext(Context):
     room_id: int
+    name_tables_path: typing.Optional[str] = None
+    name_tables: typing.Optional[NameTables]
+    """Name tables of the static data packages shared by all rooms, None if they could not be written."""
 
     def __init__(self, static_server_data: dict, logger: logging.Logger):
         # static server data is used during _load_game_data to load required data,
@@ -88,25 +162,62 @@ class WebHostContext(Context):
             # NOTE: attributes are mutable and shared, so they will have to be copied before being modified
             setattr(self, key, value)
         self.non_hintable_names = collections.defaultdict(frozenset, self.non_hintable_names)
-
-    async def listen_to_db_commands(self):
-        cmdprocessor = DBCommandProcessor(self)
-
-        while not self.exit_event.is_set():
-            await self.main_loop.run_in_executor(None, self._process_db_commands, cmdprocessor)
+        self.name_tables = None
+        if self.name_tables_path:
             try:
-                await asyncio.wait_for(self.exit_event.wait(), 5)
-            except asyncio.TimeoutError:
-                pass
-
-    def _process_db_commands(self, cmdprocessor):
-        with db_session:
-            commands = select(command for command in Command if command.room.id == self.room_id)
-            if commands:
-                for command in commands:
-                    self.main_loop.call_soon_threadsafe(cmdprocessor, command.commandtext)
-                    command.delete()
-                commit()
+                self.name_tables = open_name_tables(self.name_tables_path)
+            except (OSError, ValueError) as e:  # like removed by another WebHost sharing the cache directory
+                self.logger.warning(f"Could not open name tables, building them for this room instead: {e}")
+
+    def _init_game_data(self):
+        if self.name_tables is None:
+            return super()._init_game_data()
+        custom_games = []
+        for game_name, game_package in self.gamespackage.items():
+            checksum = game_package.get("checksum")
+            if checksum:
+                self.checksums[game_name] = checksum
+            if self.name_tables.get(game_name, checksum) is None:
+                custom_games.append(game_name)
+
+        # static games use the shared tables, only custom data packages get tables of their own
+        archipelago_tables = self.name_tables.get("Archipelago", self.checksums.get("Archipelago"))
+        if archipelago_tables:
+            archipelago_item_names = archipelago_tables.item_names
+            archipelago_location_names = archipelago_tables.location_names
+        else:
+            archipelago_package = self.gamespackage.get("Archipelago", {})
+            archipelago_item_names = {item_id: item_name for item_name, item_id
+                                      in archipelago_package.get("item_name_to_id", {}).items()}
+            archipelago_location_names = {location_id: location_name for location_name, location_id
+                                          in archipelago_package.get("location_name_to_id", {}).items()}
+        for game_name, game_package in self.gamespackage.items():
+            if game_name in custom_games:
+                continue
+            tables = self.name_tables.get(game_name, self.checksums[game_name])
+            item_maps = [tables.item_names]
+            location_maps = [tables.location_names]
+            if game_name != "Archipelago":
+                item_maps.insert(0, archipelago_item_names)
+                location_maps.insert(0, archipelago_location_names)
+            self.item_names[game_name] = NameLookup("Unknown item (ID:{})", *item_maps)
+            self.location_names[game_name] = NameLookup("Unknown location (ID:{})", *location_maps)
+            self.all_item_and_group_names[game_name] = tables.all_item_and_group_names
+            self.all_location_and_group_names[game_name] = tables.all_location_and_group_names
+
+        for game_name in custom_games:
+            game_package = self.gamespackage[game_name]
+            for item_name, item_id in game_package["item_name_to_id"].items():
+                self.item_names[game_name][item_id] = item_name
+            for location_name, location_id in game_package["location_name_to_id"].items():
+                self.location_names[game_name][location_id] = location_name
+            self.all_item_and_group_names[game_name] = \
+                set(game_package["item_name_to_id"]) | set(self.item_name_groups[game_name])
+            self.all_location_and_group_names[game_name] = \
+                set(game_package["location_name_to_id"]) | set(self.location_name_groups.get(game_name, []))
+            if game_name != "Archipelago":
+                self.item_names[game_name].update(archipelago_item_names)
+                self.location_names[game_name].update(archipelago_location_names)
 
     @db_session
     def load(self, room_id: int):
@@ -155,32 +266,70 @@ class WebHostContext(Context):
             self.location_name_groups = static_location_name_groups
         return self._load(multidata, game_data_packages, True)
 
-    def init_save(self, enabled: bool = True):
+    def init_save(self, enabled: bool = True, journal: bool = True):
         self.saving = enabled
         if self.saving:
             with db_session:
-                savegame_data = Room.get(id=self.room_id).multisave
+                room = Room.get(id=self.room_id)
+                savegame_data, journal_size = get_room_save(room)
                 if savegame_data:
-                    self.set_save(restricted_loads(savegame_data))
+                    self.set_save(savegame_data)
+                if journal:
+                    self.save_journal = SaveJournal()
+                    save_size = len(room.multisave) if savegame_data and journal_size is not None else None
+                    self.save_journal.start(self, savegame_data.get("journal_id", 0) if savegame_data else 0,
+                                            save_size, journal_size or 0)
             self._start_async_saving(atexit_save=False)
-        asyncio.create_task(self.listen_to_db_commands())
 
-    @db_session
     def _save(self, exit_save: bool = False) -> bool:
-        room = Room.get(id=self.room_id)
-        # Does not use Utils.restricted_dumps because we'd rather make a save than not make one
-        room.multisave = pickle.dumps(self.get_save())
-        # saving only occurs on activity, so we can "abuse" this information to mark this as last_activity
-        if not exit_save:  # we don't want to count a shutdown as activity, which would restart the server again
-            room.last_activity = Utils.utcnow()
+        journal = self.save_journal
+        compact = journal is not None and journal.should_compact(exit_save)
+        try:
+            with db_session:
+                room = Room.get(id=self.room_id)
+                if journal is None:
+                    # Does not use Utils.restricted_dumps because we'd rather make a save than not make one
+                    room.multisave = pickle.dumps(self.get_save())
+                elif compact:
+                    room.multisave = journal.compact(self, pickle.dumps)
+                    SaveJournalEntry.select(lambda entry: entry.room == room).delete(bulk=True)
+                else:
+                    SaveJournalEntry(room=room, journal_id=journal.journal_id, data=journal.get_entry(self))
+                # saving only occurs on activity, so we can "abuse" this information to mark this as last_activity
+                if not exit_save:  # we don't want to count a shutdown as activity, which would restart the server again
+                    room.last_activity = Utils.utcnow()
+                save_size = len(room.multisave)
+        except Exception:
+            if journal is not None:
+                journal.compact_next = True  # the changes of a lost entry are only in the next full save
+            raise
+        if compact:
+            journal.compacted(save_size)
         return True
 
-    def get_save(self) -> dict:
-        d = super(WebHostContext, self).get_save()
+    def get_save_state(self) -> dict:
+        d = super(WebHostContext, self).get_save_state()
         d["video"] = [(tuple(playerslot), videodata) for playerslot, videodata in self.video.items()]
         return d
 
 
+def get_room_save(room: Room) -> typing.Tuple[typing.Optional[dict], typing.Optional[int]]:
+    """
+    Load the multisave of a room with the changes of its save journal applied.
+
+    :return: The save, if there is one, and the size of the journal entries, None if the journal could not be applied.
+    """
+    if not room.multisave:
+        return None, None
+    savegame_data = restricted_loads(room.multisave)
+    journal_id = savegame_data.get("journal_id", 0)
+    entries = [entry.data for entry in room.save_journal.select(lambda entry: entry.journal_id == journal_id)
+               .order_by(SaveJournalEntry.id)]
+    if not SaveJournal.replay(savegame_data, entries):
+        return savegame_data, None
+    return savegame_data, sum(len(data) for data in entries)
+
+
 def get_random_port():
     return random.randint(49152, 65535)
 
@@ -210,6 +359,12 @@ def get_static_server_data() -> dict:
             for world_name, world in worlds.AutoWorldRegister.world_types.items()
         },
     }
+    try:
+        data["name_tables_path"] = write_name_tables(data["gamespackage"], data["item_name_groups"],
+                                                     data["location_name_groups"])
+    except OSError as e:
+        logging.warning(f"Could not write shared name tables, rooms will build their own: {e}")
+        data["name_tables_path"] = None
 
     return data
 
@@ -247,7 +402,8 @@ def tear_down_logging(room_id):
 
 def run_server_process(name: str, ponyconfig: dict, static_server_data: dict,
                        cert_file: typing.Optional[str], cert_key_file: typing.Optional[str],
-                       host: str, rooms_to_run: multiprocessing.Queue, rooms_shutting_down: multiprocessing.Queue):
+                       host: str, rooms_to_run: multiprocessing.Queue, rooms_shutting_down: multiprocessing.Queue,
+                       rooms_notified: multiprocessing.Queue, poll_interval: float):
     from setproctitle import setproctitle
 
     setproctitle(name)
@@ -291,6 +447,7 @@ def run_server_process(name: str, ponyconfig: dict, static_server_data: dict,
     gc.collect()  # free intermediate objects used during setup
 
     loop = asyncio.get_event_loop()
+    command_listener = DBCommandListener(loop, poll_interval)
 
     async def start_room(room_id):
         with Locker(f"RoomLocker {room_id}"):
@@ -299,6 +456,7 @@ def run_server_process(name: str, ponyconfig: dict, static_server_data: dict,
                 ctx = WebHostContext(static_server_data, logger)
                 ctx.load(room_id)
                 ctx.init_save()
+                command_listener.add(ctx)
                 assert ctx.server is None
                 try:
                     ctx.server = websockets.serve(
@@ -356,6 +514,7 @@ def run_server_process(name: str, ponyconfig: dict, static_server_data: dict,
                     setattr(asyncio.current_task(), "save", None)
             finally:
                 try:
+                    command_listener.remove(ctx)
                     ctx.save_dirty = False  # make sure the saving thread does not write to DB after final wakeup
                     ctx.exit_event.set()  # make sure the saving thread stops at some point
                     # NOTE: async saving should probably be an async task and could be merged with shutdown_task
@@ -396,9 +555,15 @@ def run_server_process(name: str, ponyconfig: dict, static_server_data: dict,
                 logging.info(f"Starting room {next_room} on {name}.")
                 del task  # delete reference to task object
 
+    def forward_notifications():
+        while 1:
+            command_listener.notify(rooms_notified.get(block=True, timeout=None))
+
     starter = Starter()
     starter.daemon = True
     starter.start()
+    threading.Thread(target=forward_notifications, name="Notifications", daemon=True).start()
+    loop.create_task(command_listener.run())
     try:
         loop.run_forever()
     finally:
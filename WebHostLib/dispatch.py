@@ -0,0 +1,70 @@
+"""
+Notifications that wake the threads launching generations and rooms as soon as the website queued work for them,
+instead of them polling the database in short intervals.
+
+Notifications only reach threads of the same process, so they work when the website runs in the process that also
+runs autogen and autohost, see `SELFHOST`, `SELFGEN` and `SELFLAUNCH`. All work is in the database either way, which
+those threads still check every `NOTIFIED_JOB_POLL_INTERVAL` seconds with `SELFHOST`, and every `JOB_POLL_INTERVAL`
+seconds without it, and room hosting processes every `COMMAND_POLL_INTERVAL` seconds, to get the work of websites
+running in other processes.
+"""
+from __future__ import annotations
+
+import threading
+import typing
+from uuid import UUID
+
+__all__ = ["Notifier", "generations", "rooms", "notify_generation", "notify_room"]
+
+T = typing.TypeVar("T")
+
+
+class Notifier(typing.Generic[T]):
+    """Wakes a waiting thread, telling it what it was notified of since it last waited."""
+    _condition: threading.Condition
+    _notified: bool
+    _items: set[T]
+
+    def __init__(self) -> None:
+        self._condition = threading.Condition()
+        self._notified = False
+        self._items = set()
+
+    def notify(self, item: T | None = None) -> None:
+        with self._condition:
+            self._notified = True
+            if item is not None:
+                self._items.add(item)
+            self._condition.notify_all()
+
+    def wait(self, timeout: float | None = None) -> set[T] | None:
+        """
+        Wait until notified, unless there were notifications since the last wait already.
+
+        :return: The items notified of, None if timed out without being notified.
+        """
+        with self._condition:
+            if not self._notified:
+                self._condition.wait(timeout)
+            if not self._notified:
+                return None
+            items = self._items
+            self._notified = False
+            self._items = set()
+            return items
+
+
+generations: Notifier[None] = Notifier()
+"""Notified when a generation got queued."""
+rooms: Notifier[UUID] = Notifier()
+"""Notified with the id of a room that should be running, or has new commands to run."""
+
+
+def notify_generation() -> None:
+    """Start queued generations right away, call after committing them."""
+    generations.notify()
+
+
+def notify_room(room_id: UUID) -> None:
+    """Start a room, or have it run its new commands, right away. Call after committing its activity or commands."""
+    rooms.notify(room_id)
@@ -15,7 +15,7 @@ from BaseClasses import get_seed, seeddigits
 from Generate import PlandoOptions, handle_name, mystery_argparse
 from Main import main as ERmain
 from Utils import __version__, restricted_dumps, DaemonThreadPoolExecutor
-from WebHostLib import app
+from WebHostLib import app, dispatch
 from settings import ServerOptions, GeneratorOptions
 from .check import get_yaml_data, roll_options
 from .models import Generation, STATE_ERROR, STATE_QUEUED, Seed, UUID
@@ -102,6 +102,7 @@ def start_generation(options: dict[str, dict | str], meta: dict[str, Any]):
             return render_template("seedError.html", seed_error=meta["error"], details=details)
 
         commit()
+        dispatch.notify_generation()
 
         return redirect(url_for("wait_seed", seed=gen.id))
     else:
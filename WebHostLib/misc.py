@@ -1,4 +1,5 @@
 import datetime
+import functools
 import os
 import warnings
 from enum import StrEnum
@@ -11,7 +12,7 @@ from werkzeug.utils import secure_filename
 
 
 from worlds.AutoWorld import AutoWorldRegister, World
-from . import app, cache
+from . import app, cache, dispatch
 from .markdown import render_markdown
 from .models import Seed, Room, Command, UUID, uuid4
 from Utils import title_sorted, utcnow
@@ -176,6 +177,7 @@ def new_room(seed: UUID):
         abort(404)
     room = Room(seed=seed, owner=session["_id"], tracker=uuid4())
     commit()
+    dispatch.notify_room(room.id)
     return redirect(url_for("host_room", room=room.id))
 
 
@@ -225,6 +227,7 @@ def host_room_command(room: UUID):
         if cmd:
             Command(room=room, commandtext=cmd)
             commit()
+            dispatch.notify_room(room.id)
     return redirect(url_for("host_room", room=room.id))
 
 
@@ -240,7 +243,8 @@ def host_room(room: UUID):
         (not room.last_port and now - room.creation_time < datetime.timedelta(seconds=3))
         or room.last_activity < now - datetime.timedelta(seconds=room.timeout)
     )
-    if now - room.last_activity > datetime.timedelta(minutes=1):
+    activated = now - room.last_activity > datetime.timedelta(minutes=1)
+    if activated:
         # we only set last_activity if needed, otherwise parallel access on /room will cause an internal server error
         # due to "pony.orm.core.OptimisticCheckError: Object Room was updated outside of current transaction"
         room.last_activity = now  # will trigger a spinup, if it's not already running
@@ -267,7 +271,11 @@ def host_room(room: UUID):
         except FileNotFoundError:
             return "", 0
 
-    return render_template("hostRoom.html", room=room, should_refresh=should_refresh, get_log=get_log)
+    response = Response(render_template("hostRoom.html", room=room, should_refresh=should_refresh, get_log=get_log))
+    if activated:
+        # after the request committed last_activity, as the room writes to it as well when it starts
+        response.call_on_close(functools.partial(dispatch.notify_room, room.id))
+    return response
 
 
 @app.route('/favicon.ico')
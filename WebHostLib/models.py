@@ -28,6 +28,7 @@ class Room(db.Entity):
     commands = Set('Command')
     seed = Required('Seed', index=True)
     multisave = Optional(buffer, lazy=True)
+    save_journal = Set('SaveJournalEntry')
     show_spoiler = Required(int, default=0)  # 0 -> never, 1 -> after completion, -> 2 always
     timeout = Required(int, default=lambda: 2 * 60 * 60)  # seconds since last activity to shutdown
     tracker = Optional(UUID, index=True)
@@ -52,6 +53,14 @@ class Command(db.Entity):
     commandtext = Required(str)
 
 
+class SaveJournalEntry(db.Entity):
+    """Changes to the multisave of a room since it was last written in full, see MultiServer.SaveJournal."""
+    id = PrimaryKey(int, auto=True)
+    room = Required(Room, index=True)
+    journal_id = Required(int, size=64)
+    data = Required(buffer, lazy=True)
+
+
 class Generation(db.Entity):
     id = PrimaryKey(UUID, default=uuid4)
     owner = Required(UUID)
@@ -0,0 +1,254 @@
+"""
+Read-only name tables of the static data packages, shared by all rooms of all room hosting processes.
+
+The tables get written to a file once by the process starting the room hosting processes, see `write_name_tables`.
+Each room hosting process maps that file into memory, so all of them share the same pages of it, and all rooms of a
+process use the same tables instead of building their own id to name dicts and name sets. Only the games of a room
+that use a custom data package need name tables of their own.
+
+File layout, all integers are 64 bit in the byte order of the machine that wrote the file:
+ - `magic`, then the offset and length of the index at the end of the file, JSON of the offsets of the tables of
+   each game
+ - string arrays: the count, count + 1 offsets into the strings following them, then the utf-8 encoded strings
+ - id tables: the count, the sorted ids, then a string array of the name of each id
+"""
+from __future__ import annotations
+
+import array
+import bisect
+import hashlib
+import json
+import mmap
+import os
+import time
+import typing
+from collections import ChainMap
+from collections.abc import Iterator, Mapping, Set
+
+import Utils
+
+__all__ = ["GameNameTables", "NameLookup", "NameSet", "NameTable", "NameTables", "open_name_tables",
+           "write_name_tables"]
+
+magic = b"APNAMES1"
+_int_size = 8
+name_tables_max_age = 24 * 60 * 60
+"""Seconds after which name tables files of other data packages get removed, see `write_name_tables`."""
+
+
+class NameSet(Set[str]):
+    """Sorted set of strings in a string array of a name tables file."""
+    __slots__ = ("_offsets", "_strings")
+
+    _offsets: memoryview
+    _strings: memoryview
+
+    def __init__(self, view: memoryview, offset: int):
+        count = view[offset:offset + _int_size].cast("q")[0]
+        offset += _int_size
+        end = offset + (count + 1) * _int_size
+        self._offsets = view[offset:end].cast("q")
+        self._strings = view[end:end + self._offsets[-1]]
+
+    @classmethod
+    def _from_iterable(cls, iterable: typing.Iterable[str]) -> typing.FrozenSet[str]:
+        return frozenset(iterable)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        return str(self._strings[self._offsets[index]:self._offsets[index + 1]], "utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        strings = self._strings
+        offsets = self._offsets
+        for index in range(len(offsets) - 1):
+            yield str(strings[offsets[index]:offsets[index + 1]], "utf-8")
+
+    def __contains__(self, name: object) -> bool:
+        if not isinstance(name, str):
+            return False
+        index = bisect.bisect_left(self, name, hi=len(self))
+        return index < len(self) and self[index] == name
+
+
+class NameTable(Mapping[int, str]):
+    """Id to name table in a name tables file."""
+    __slots__ = ("_ids", "_names")
+
+    _ids: memoryview
+    _names: NameSet
+
+    def __init__(self, view: memoryview, offset: int):
+        count = view[offset:offset + _int_size].cast("q")[0]
+        offset += _int_size
+        end = offset + count * _int_size
+        self._ids = view[offset:end].cast("q")
+        self._names = NameSet(view, end)
+
+    def _find(self, code: object) -> int:
+        """Index of an id in the table, -1 if it is not in it."""
+        if type(code) is not int:
+            return -1
+        index = bisect.bisect_left(self._ids, code)
+        return index if index < len(self._ids) and self._ids[index] == code else -1
+
+    def __getitem__(self, code: int) -> str:
+        index = self._find(code)
+        if index < 0:
+            raise KeyError(code)
+        return self._names[index]
+
+    def __contains__(self, code: object) -> bool:
+        return self._find(code) >= 0
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._ids.tolist())
+
+
+class NameLookup(ChainMap):
+    """
+    Id to name lookup of a game, going through its tables in order.
+    Like the `KeyedDefaultDict`s of `MultiServer.Context`, unknown ids get a placeholder name, without storing it.
+    """
+
+    def __init__(self, unknown: str, *maps: Mapping[int, str]):
+        super().__init__(*maps)
+        self.unknown = unknown
+
+    def __missing__(self, code: int) -> str:
+        return self.unknown.format(code)
+
+
+class GameNameTables(typing.NamedTuple):
+    checksum: str
+    item_names: NameTable
+    location_names: NameTable
+    all_item_and_group_names: NameSet
+    all_location_and_group_names: NameSet
+
+
+class NameTables:
+    """The name tables of all games in a name tables file, see `open_name_tables`."""
+    path: str
+    games: typing.Dict[str, GameNameTables]
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        if view[:len(magic)] != magic:
+            raise ValueError(f"{path} is not a name tables file.")
+        index_offset, index_length = view[len(magic):len(magic) + 2 * _int_size].cast("q")
+        index: typing.Dict[str, typing.Dict[str, typing.Any]] = \
+            json.loads(str(view[index_offset:index_offset + index_length], "utf-8"))
+        self.games = {
+            game: GameNameTables(offsets["checksum"],
+                                 NameTable(view, offsets["item_names"]),
+                                 NameTable(view, offsets["location_names"]),
+                                 NameSet(view, offsets["all_item_and_group_names"]),
+                                 NameSet(view, offsets["all_location_and_group_names"]))
+            for game, offsets in index.items()
+        }
+
+    def get(self, game: str, checksum: typing.Optional[str]) -> typing.Optional[GameNameTables]:
+        """The tables of a game, if there are tables of the data package with the given checksum."""
+        tables = self.games.get(game)
+        if tables is None or checksum is None or tables.checksum != checksum:
+            return None
+        return tables
+
+
+def _pack_ints(values: typing.Iterable[int]) -> bytes:
+    return array.array("q", values).tobytes()
+
+
+def _pack_strings(strings: typing.Iterable[str]) -> bytes:
+    encoded = [string.encode("utf-8") for string in strings]
+    offsets = [0]
+    for string in encoded:
+        offsets.append(offsets[-1] + len(string))
+    data = _pack_ints([len(encoded)]) + _pack_ints(offsets) + b"".join(encoded)
+    return data + bytes(-len(data) % _int_size)
+
+
+def _pack_name_table(name_to_id: typing.Mapping[str, int]) -> bytes:
+    ids, names = zip(*sorted((code, name) for name, code in name_to_id.items())) if name_to_id else ((), ())
+    return _pack_ints([len(ids)]) + _pack_ints(ids) + _pack_strings(names)
+
+
+def write_name_tables(gamespackage: typing.Mapping[str, typing.Mapping[str, typing.Any]],
+                      item_name_groups: typing.Mapping[str, typing.Iterable[str]],
+                      location_name_groups: typing.Mapping[str, typing.Iterable[str]]) -> str:
+    """
+    Write the name tables of data packages into the cache directory, if they are not there yet, replacing older ones.
+    Only games with a checksum get tables, as rooms can't tell if they use the same data package otherwise.
+
+    :return: The path of the file, which is named after the hash of its content.
+    """
+    header_length = len(magic) + 2 * _int_size
+    blocks: typing.List[bytes] = []
+    end = header_length
+    index: typing.Dict[str, typing.Dict[str, typing.Any]] = {}
+
+    def add_block(data: bytes) -> int:
+        nonlocal end
+        blocks.append(data)
+        end += len(data)
+        return end - len(data)
+
+    for game, game_package in sorted(gamespackage.items()):
+        if "checksum" not in game_package:
+            continue
+        item_name_to_id = game_package["item_name_to_id"]
+        location_name_to_id = game_package["location_name_to_id"]
+        index[game] = {
+            "checksum": game_package["checksum"],
+            "item_names": add_block(_pack_name_table(item_name_to_id)),
+            "location_names": add_block(_pack_name_table(location_name_to_id)),
+            "all_item_and_group_names": add_block(_pack_strings(
+                sorted(set(item_name_to_id) | set(item_name_groups.get(game, ()))))),
+            "all_location_and_group_names": add_block(_pack_strings(
+                sorted(set(location_name_to_id) | set(location_name_groups.get(game, ()))))),
+        }
+    encoded_index = json.dumps(index).encode("utf-8")
+    data = magic + _pack_ints((end, len(encoded_index))) + b"".join(blocks) + encoded_index
+
+    path = Utils.cache_path("webhost", f"name_tables_{hashlib.sha256(data).hexdigest()[:16]}.bin")
+    if os.path.exists(path):
+        os.utime(path)  # in use again, see below
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        # remove tables of worlds that were updated since. Other WebHosts using the same cache directory may still be
+        # using recent tables, and files mapped by a process can't be removed on Windows.
+        directory = os.path.dirname(path)
+        expired = time.time() - name_tables_max_age
+        for file_name in os.listdir(directory):
+            if file_name.startswith("name_tables_") and file_name != os.path.basename(path):
+                file_path = os.path.join(directory, file_name)
+                try:
+                    if os.path.getmtime(file_path) < expired:
+                        os.remove(file_path)
+                except OSError:
+                    pass
+    return path
+
+
+_opened: typing.Dict[str, NameTables] = {}
+
+
+def open_name_tables(path: str) -> NameTables:
+    """Map a name tables file into memory, once per process."""
+    tables = _opened.get(path)
+    if tables is None:
+        tables = _opened[path] = NameTables(path)
+    return tables
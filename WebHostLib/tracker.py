@@ -12,6 +12,7 @@ from MultiServer import Context, get_saving_second
 from NetUtils import ClientStatus, Hint, NetworkItem, NetworkSlot, SlotType
 from Utils import restricted_loads, KeyedDefaultDict, utcnow
 from . import app, cache
+from .customserver import get_room_save
 from .models import GameDataPackage, Room
 
 # Multisave is currently updated, at most, every minute.
@@ -56,7 +57,7 @@ class TrackerData:
         """Initialize a new RoomMultidata object for the current room."""
         self.room = room
         self._multidata = Context.decompress(room.seed.multidata)
-        self._multisave = restricted_loads(room.multisave) if room.multisave else {}
+        self._multisave = get_room_save(room)[0] or {}
         self._tracker_cache = {}
 
         self.item_name_to_id: Dict[str, Dict[str, int]] = {}
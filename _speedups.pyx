@@ -9,11 +9,14 @@ This is deliberately .pyx because using a non-compiled "pure python" may be slow
 
 # pip install cython cymem
 import cython
+import sys
 import warnings
+from array import array
 from cpython cimport PyObject
 from typing import Any, Dict, Iterable, Iterator, Generator, Sequence, Tuple, TypeVar, Union, Set, List, TYPE_CHECKING
 from cymem.cymem cimport Pool
 from libc.stdint cimport int64_t, uint32_t
+from libc.stdlib cimport qsort
 from collections import defaultdict
 
 cdef extern from *:
@@ -69,6 +72,19 @@ cdef struct IndexEntry:
     size_t count
 
 
+cdef LocationEntry* _sorted_entries  # entries that _compare_receiver_entries compares, only set during sorting
+
+cdef int _compare_receiver_entries(const void* a, const void* b) noexcept nogil:
+    # sort entry indices of a receiver by item, then by their position in entries
+    cdef size_t i = (<size_t*>a)[0]
+    cdef size_t j = (<size_t*>b)[0]
+    cdef ap_id_t item_i = _sorted_entries[i].item
+    cdef ap_id_t item_j = _sorted_entries[j].item
+    if item_i != item_j:
+        return -1 if item_i < item_j else 1
+    return -1 if i < j else (1 if i > j else 0)
+
+
 if TYPE_CHECKING:
     State = Dict[Tuple[int, int], Set[int]]
 else:
@@ -92,6 +108,9 @@ cdef class LocationStore:
     cdef size_t entry_count
     cdef IndexEntry* sender_index  # 16KB/1000 players
     cdef size_t sender_index_size
+    cdef size_t* receiver_entries  # 800KB/100k items, indices into entries sorted by receiver, item and position
+    cdef IndexEntry* receiver_index  # 16KB/1000 players, ranges in receiver_entries
+    cdef size_t receiver_index_size
     cdef list _keys  # ~36KB/1000 players, speed up iter (28 per int + 8 per list entry)
     cdef list _items  # ~64KB/1000 players, speed up items (56 per tuple + 8 per list entry)
     cdef list _proxies  # ~92KB/1000 players, speed up self[player] (56 per struct + 28 per len + 8 per list entry)
@@ -100,7 +119,8 @@ cdef class LocationStore:
     def get_size(self):
         from sys import getsizeof
         size = getsizeof(self) + getsizeof(self._mem) + getsizeof(self._len) \
-                + sizeof(LocationEntry) * self.entry_count + sizeof(IndexEntry) * self.sender_index_size
+                + sizeof(LocationEntry) * self.entry_count + sizeof(IndexEntry) * self.sender_index_size \
+                + sizeof(size_t) * self.entry_count + sizeof(IndexEntry) * self.receiver_index_size
         size += getsizeof(self._keys) + getsizeof(self._items) + getsizeof(self._proxies)
         size += sum(sizeof(key) for key in self._keys)
         size += sum(sizeof(item) for item in self._items)
@@ -109,14 +129,9 @@ cdef class LocationStore:
         return size
 
     def __init__(self, locations_dict: Dict[int, Dict[int, Sequence[int]]]) -> None:
-        self._mem = Pool()
-        cdef object key
-        self._keys = []
-        self._items = []
-        self._proxies = []
-
         # iterate over everything to get all maxima and validate everything
         cdef size_t max_sender = INVALID_SIZE  # keep track of highest used player id for indexing
+        cdef size_t max_receiver = 0
         cdef size_t sender_count = 0
         cdef size_t count = 0
         for sender, locations in locations_dict.items():
@@ -131,6 +146,7 @@ cdef class LocationStore:
                 receiver = data[1]
                 if receiver < 1 or receiver > MAX_PLAYER_ID:
                     raise ValueError(f"Invalid player id {receiver} for item")
+                max_receiver = max(max_receiver, receiver)
                 count += 1
             sender_count += 1
 
@@ -144,16 +160,7 @@ cdef class LocationStore:
         if not count:
             warnings.warn("Game has no locations")
 
-        # allocate the arrays and invalidate index (0xff...)
-        if count:
-            # leaving entries as NULL if there are none, makes potential memory errors more visible
-            self.entries = <LocationEntry*>self._mem.alloc(count, sizeof(LocationEntry))
-        self.sender_index = <IndexEntry*>self._mem.alloc(max_sender + 1, sizeof(IndexEntry))
-        self._raw_proxies = <PyObject**>self._mem.alloc(max_sender + 1, sizeof(PyObject*))
-
-        assert (not self.entries) == (not count)
-        assert self.sender_index
-        assert self._raw_proxies
+        self._allocate(count, max_sender, max_receiver)
 
         # build entries and index
         cdef size_t i = 0
@@ -172,6 +179,94 @@ cdef class LocationStore:
                 self.sender_index[sender].count += 1
                 i += 1
 
+        self._build_indexes(count, max_sender, max_receiver)
+
+    @classmethod
+    def from_buffer(cls, buffer: Any) -> LocationStore:
+        """
+        Create a store from a locations table like NetUtils.pack_locations writes, without going through dicts.
+        The table is the number of players and locations followed by the columns of sender, location, item, receiver
+        and flags of the locations sorted by sender and location, all as little endian 64bit integers.
+        """
+        rows = array("q")
+        rows.frombytes(buffer)
+        if sys.byteorder != "little":
+            rows.byteswap()
+        cdef int64_t[::1] table = rows
+        cdef size_t length = table.shape[0]
+        if length < 2 or table[1] < 0 or length != 2 + 5 * <size_t>table[1]:
+            raise ValueError("Invalid locations table")
+        if table[0] < 1:
+            raise ValueError(f"Rejecting game with 0 players")
+        if table[0] > MAX_PLAYER_ID:
+            raise ValueError(f"Invalid player id {table[0]} for location")
+        cdef size_t max_sender = table[0]
+        cdef size_t count = table[1]
+        cdef int64_t* senders = &table[0] + 2  # not indexing, which would fail for an empty table
+        cdef int64_t* locations = senders + count
+        cdef int64_t* items = locations + count
+        cdef int64_t* receivers = items + count
+        cdef int64_t* flags = receivers + count
+
+        # validate everything before allocating
+        cdef size_t max_receiver = 0
+        cdef size_t i
+        for i in range(count):
+            if senders[i] < 1 or <size_t>senders[i] > max_sender:
+                raise ValueError(f"Invalid player id {senders[i]} for location")
+            if receivers[i] < 1 or receivers[i] > MAX_PLAYER_ID:
+                raise ValueError(f"Invalid player id {receivers[i]} for item")
+            if i and (senders[i - 1] > senders[i] or senders[i - 1] == senders[i] and locations[i - 1] >= locations[i]):
+                raise ValueError("Locations table is not sorted")
+            max_receiver = max(max_receiver, <size_t>receivers[i])
+
+        if not count:
+            warnings.warn("Game has no locations")
+
+        cdef LocationStore store = LocationStore.__new__(cls)
+        store._allocate(count, max_sender, max_receiver)
+        for i in range(count):
+            if not store.sender_index[senders[i]].count:
+                store.sender_index[senders[i]].start = i
+            store.sender_index[senders[i]].count += 1
+            store.entries[i].sender = senders[i]
+            store.entries[i].location = locations[i]
+            store.entries[i].item = items[i]
+            store.entries[i].receiver = receivers[i]
+            store.entries[i].flags = flags[i]
+        store._build_indexes(count, max_sender, max_receiver)
+        return store
+
+    cdef _allocate(self, size_t count, size_t max_sender, size_t max_receiver):
+        self._mem = Pool()
+        self._keys = []
+        self._items = []
+        self._proxies = []
+
+        # allocate the arrays and invalidate index (0xff...)
+        if count:
+            # leaving entries as NULL if there are none, makes potential memory errors more visible
+            self.entries = <LocationEntry*>self._mem.alloc(count, sizeof(LocationEntry))
+            self.receiver_entries = <size_t*>self._mem.alloc(count, sizeof(size_t))
+        self.sender_index = <IndexEntry*>self._mem.alloc(max_sender + 1, sizeof(IndexEntry))
+        self.receiver_index = <IndexEntry*>self._mem.alloc(max_receiver + 1, sizeof(IndexEntry))
+        self._raw_proxies = <PyObject**>self._mem.alloc(max_sender + 1, sizeof(PyObject*))
+
+        assert (not self.entries) == (not count)
+        assert (not self.receiver_entries) == (not count)
+        assert self.sender_index
+        assert self.receiver_index
+        assert self._raw_proxies
+
+        self.sender_index_size = max_sender + 1
+        self.receiver_index_size = max_receiver + 1
+        self.entry_count = count
+        self._len = max_sender
+
+    cdef _build_indexes(self, size_t count, size_t max_sender, size_t max_receiver):
+        # requires entries and sender_index to be filled in
+        cdef object key
+        cdef size_t i
         # build pyobject caches
         self._proxies.append(None)  # player 0
         assert self.sender_index[0].count == 0
@@ -186,9 +281,29 @@ cdef class LocationStore:
             self._proxies.append(proxy)
             self._raw_proxies[i] = <PyObject*>proxy
 
-        self.sender_index_size = max_sender + 1
-        self.entry_count = count
-        self._len = sender_count
+        # build receiver index, counting entries per receiver, then placing them in order and sorting them by item
+        cdef size_t start
+        for i in range(count):
+            self.receiver_index[self.entries[i].receiver].count += 1
+        start = 0
+        for i in range(max_receiver + 1):
+            self.receiver_index[i].start = start
+            start += self.receiver_index[i].count
+            self.receiver_index[i].count = 0
+        cdef IndexEntry* receiver_range
+        for i in range(count):
+            receiver_range = self.receiver_index + self.entries[i].receiver
+            self.receiver_entries[receiver_range.start + receiver_range.count] = i
+            receiver_range.count += 1
+        global _sorted_entries
+        _sorted_entries = self.entries
+        try:
+            for i in range(max_receiver + 1):
+                if self.receiver_index[i].count > 1:
+                    qsort(self.receiver_entries + self.receiver_index[i].start, self.receiver_index[i].count,
+                          sizeof(size_t), _compare_receiver_entries)
+        finally:
+            _sorted_entries = NULL
 
     # fake dict access
     def __len__(self) -> int:
@@ -215,47 +330,58 @@ cdef class LocationStore:
         return self._items
 
     # specialized accessors
+    cdef size_t _find_first(self, ap_player_t receiver, ap_id_t item) noexcept nogil:
+        # binary search for the first index into receiver_entries of the item for the receiver
+        cdef size_t l = self.receiver_index[receiver].start
+        cdef size_t r = l + self.receiver_index[receiver].count
+        cdef size_t m
+        while l < r:
+            m = (l + r) // 2
+            if self.entries[self.receiver_entries[m]].item < item:
+                l = m + 1
+            else:
+                r = m
+        return l
+
     def find_item(self, slots: Set[int], seeked_item_id: int) -> Generator[Tuple[int, int, int, int, int], None, None]:
         cdef ap_id_t item = seeked_item_id
         cdef ap_player_t receiver
-        cdef ap_player_set* receivers
-        cdef size_t slot_count = len(slots)
-        if slot_count == 1:
-            # specialized implementation for single slot
-            receiver = list(slots)[0]
-            with nogil:
-                for entry in self.entries[:self.entry_count]:
-                    if entry.item == item and entry.receiver == receiver:
-                        with gil:
-                            yield entry.sender, entry.location, entry.item, entry.receiver, entry.flags
-        elif slot_count:
-            # generic implementation with lookup in set
-            receivers = ap_player_set_new(min(1023, slot_count))  # limit top level struct to 16KB
-            if not receivers:
-                raise MemoryError()
-            try:
-                for receiver in slots:
-                    if not ap_player_set_add(receivers, receiver):
-                        raise MemoryError()
-                with nogil:
-                    for entry in self.entries[:self.entry_count]:
-                        if entry.item == item and ap_player_set_contains(receivers, entry.receiver):
-                            with gil:
-                                yield entry.sender, entry.location, entry.item, entry.receiver, entry.flags
-            finally:
-                ap_player_set_free(receivers)
+        cdef size_t i
+        cdef size_t end
+        cdef LocationEntry* entry
+        cdef list found = []
+        for slot in slots:
+            if slot < 1 or slot >= self.receiver_index_size:
+                continue
+            receiver = slot
+            end = self.receiver_index[receiver].start + self.receiver_index[receiver].count
+            i = self._find_first(receiver, item)
+            while i < end and self.entries[self.receiver_entries[i]].item == item:
+                found.append(self.receiver_entries[i])
+                i += 1
+        # yield matches in the order of entries, the same as a search through all entries would
+        if len(slots) > 1:
+            found.sort()
+        for i in found:
+            entry = self.entries + i
+            yield entry.sender, entry.location, entry.item, entry.receiver, entry.flags
 
     def get_for_player(self, slot: int) -> Dict[int, Set[int]]:
-        cdef ap_player_t receiver = slot
         all_locations: Dict[int, Set[int]] = {}
-        with nogil:
-            for entry in self.entries[:self.entry_count]:
-                if entry.receiver == receiver:
-                    with gil:
-                        sender: int = entry.sender
-                        if sender not in all_locations:
-                            all_locations[sender] = set()
-                        all_locations[sender].add(entry.location)
+        if slot < 1 or slot >= self.receiver_index_size:
+            return all_locations
+        cdef ap_player_t receiver = slot
+        cdef size_t start = self.receiver_index[receiver].start
+        cdef size_t count = self.receiver_index[receiver].count
+        cdef size_t i
+        cdef LocationEntry* entry
+        # add senders in the order of entries, the same as a search through all entries would
+        for i in sorted([self.receiver_entries[i] for i in range(start, start + count)]):
+            entry = self.entries + i
+            sender: int = entry.sender
+            if sender not in all_locations:
+                all_locations[sender] = set()
+            all_locations[sender].add(entry.location)
         return all_locations
 
     def get_checked(self, state: State, team: int, slot: int) -> List[int]:
@@ -376,3 +502,129 @@ cdef class PlayerLocationProxy:
         count = self._store.sender_index[self._player].count
         for entry in self._store.entries[start:start+count]:
             yield entry.location, (entry.item, entry.receiver, entry.flags)
+
+
+# JSON encoding of network messages, see NetUtils.encode
+
+from json.encoder import encode_basestring, INFINITY
+
+cdef dict _named_tuple_parts = {}  # NamedTuple type -> (encoded keys, encoded end, template of int values)
+
+
+cdef str _encode_float(object o):
+    if o != o:
+        return "NaN"
+    if o == INFINITY:
+        return "Infinity"
+    if o == -INFINITY:
+        return "-Infinity"
+    return float.__repr__(o)
+
+
+cdef str _encode_key(object key):
+    if isinstance(key, str):
+        return encode_basestring(key)
+    if key is True:
+        return '"true"'
+    if key is False:
+        return '"false"'
+    if key is None:
+        return '"null"'
+    if isinstance(key, int):
+        return f'"{int.__repr__(key)}"'
+    if isinstance(key, float):
+        return f'"{_encode_float(key)}"'
+    raise TypeError(f"keys must be str, int, float, bool or None, not {key.__class__.__name__}")
+
+
+cdef tuple _get_named_tuple_parts(type cls):
+    parts = _named_tuple_parts.get(cls)
+    if parts is None:
+        keys = [encode_basestring(field) + ":" for field in cls._fields]
+        keys = ["{" + keys[0]] + ["," + key for key in keys[1:]] if keys else []
+        end = ("," if keys else "{") + '"class":' + encode_basestring(cls.__name__) + "}"
+        # formats all values at once if they are all ints, like for NetworkItem
+        template = "".join(key.replace("%", "%%") + "%d" for key in keys) + end.replace("%", "%%")
+        parts = _named_tuple_parts[cls] = keys, end, template
+    return <tuple>parts
+
+
+cdef int _encode(list parts, object o, bint scan) except -1:
+    # scan: encode NamedTuples as dicts with their class and sets as lists, which values of NamedTuples don't
+    cdef type t = type(o)
+    cdef str separator
+    cdef list keys
+    cdef Py_ssize_t i
+    if t is str:
+        parts.append(encode_basestring(o))
+    elif t is int:
+        parts.append(int.__repr__(o))
+    elif o is None:
+        parts.append("null")
+    elif o is True:
+        parts.append("true")
+    elif o is False:
+        parts.append("false")
+    elif t is float:
+        parts.append(_encode_float(o))
+    elif isinstance(o, dict):
+        separator = "{"
+        for key, value in (<dict>o).items():
+            parts.append(separator + (encode_basestring(key) if type(key) is str else _encode_key(key)) + ":")
+            separator = ","
+            t = type(value)
+            if t is str:
+                parts.append(encode_basestring(value))
+            elif t is int:
+                parts.append(int.__repr__(value))
+            else:
+                _encode(parts, value, scan)
+        parts.append("}" if separator == "," else "{}")
+    elif scan and isinstance(o, tuple) and hasattr(t, "_fields"):
+        keys, end, template = _get_named_tuple_parts(t)
+        for value in <tuple>o:
+            if type(value) is not int:
+                break
+        else:
+            parts.append(<str>template % o)
+            return 0
+        for i in range(min(len(keys), len(<tuple>o))):
+            value = (<tuple>o)[i]
+            t = type(value)
+            if t is int:
+                parts.append(<str>keys[i] + int.__repr__(value))
+            elif t is str:
+                parts.append(<str>keys[i] + encode_basestring(value))
+            else:
+                parts.append(keys[i])
+                _encode(parts, value, False)
+        parts.append(end)
+    elif isinstance(o, (list, tuple)) or (scan and isinstance(o, (set, frozenset))):
+        separator = "["
+        for value in o:
+            t = type(value)
+            if t is int:
+                parts.append(separator + int.__repr__(value))
+            elif t is str:
+                parts.append(separator + encode_basestring(value))
+            else:
+                parts.append(separator)
+                _encode(parts, value, scan)
+            separator = ","
+        parts.append("]" if separator == "," else "[]")
+    elif isinstance(o, str):
+        parts.append(encode_basestring(o))
+    elif isinstance(o, int):
+        parts.append(int.__repr__(o))
+    elif isinstance(o, float):
+        parts.append(_encode_float(o))
+    else:
+        raise TypeError(f"Object of type {o.__class__.__name__} is not JSON serializable")
+    return 0
+
+
+def encode(obj: Any) -> str:
+    """Encodes a network message to JSON in a single pass, see NetUtils._encode_python."""
+    cdef list parts = []
+    _encode(parts, obj, True)
+    return "".join(parts)
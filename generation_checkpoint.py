@@ -0,0 +1,182 @@
+"""
+Checkpoints of a generation for the `--checkpoint` and `--resume` options of Generate.py.
+
+A MultiWorld can't be written to disk as a whole, as its worlds hold functions like access rules. A checkpoint holds
+the results of the expensive stages after the worlds are created instead: which item ended up in each location and the
+states of all random sources. Resuming creates the MultiWorld again from the same player files and seed, checks that it
+is the same as the one the checkpoint was made from, and restores the results of checkpointed stages instead of running
+them again.
+"""
+import hashlib
+import zlib
+from typing import Any
+
+from BaseClasses import Item, Location, MultiWorld
+from Utils import __version__, restricted_dumps, restricted_loads
+
+__all__ = ["Checkpoint", "CheckpointError", "stages"]
+
+stages = ("fill", "balancing")
+"""The stages of a generation that can be checkpointed, in the order they run in."""
+
+checkpoint_version = 1
+
+ItemKey = tuple[int, str, int]
+"""The player, name and classification of an item."""
+
+
+class CheckpointError(Exception):
+    """Raised if a checkpoint can't be used to resume a generation."""
+
+
+def _item_key(item: Item) -> ItemKey:
+    return item.player, item.name, int(item.classification)
+
+
+def _get_random_states(multiworld: MultiWorld) -> tuple[Any, dict[int, Any]]:
+    return multiworld.random.getstate(), {player: world.random.getstate()
+                                          for player, world in multiworld.worlds.items()}
+
+
+def _get_fingerprint(multiworld: MultiWorld) -> str:
+    """A hash of the locations, items and random states of a MultiWorld that a checkpoint can continue from."""
+    fingerprint = hashlib.sha256()
+    for location in sorted(multiworld.get_locations(), key=lambda location: (location.player, location.name)):
+        item = location.item
+        fingerprint.update(repr((location.player, location.name, item and _item_key(item))).encode())
+    for key in sorted(_item_key(item) for item in multiworld.itempool):
+        fingerprint.update(repr(key).encode())
+    fingerprint.update(repr(_get_random_states(multiworld)).encode())
+    return fingerprint.hexdigest()
+
+
+class Checkpoint:
+    """The results of the checkpointed stages of one generation."""
+
+    seed: int
+    seed_name: str
+    players: dict[int, tuple[str, str]]
+    """The game and name of each player."""
+    fingerprint: str
+    """Identifies the MultiWorld before the first checkpointed stage, see `_get_fingerprint`."""
+    results: dict[str, dict[str, Any]]
+    """The result of each checkpointed stage by the name of the stage."""
+
+    def __init__(self, multiworld: MultiWorld) -> None:
+        """Start a checkpoint of a MultiWorld that is about to run the first stage in `stages`."""
+        self.seed = multiworld.seed
+        self.seed_name = multiworld.seed_name
+        self.players = {player: (multiworld.game[player], multiworld.player_name[player])
+                        for player in multiworld.player_ids}
+        self.fingerprint = _get_fingerprint(multiworld)
+        self.results = {}
+
+    @classmethod
+    def load(cls, path: str) -> "Checkpoint":
+        with open(path, "rb") as f:
+            data = restricted_loads(zlib.decompress(f.read()))
+        if data.get("checkpoint_version") != checkpoint_version or data.get("version") != __version__:
+            raise CheckpointError(f"Checkpoint {path} was written by a different version of Archipelago.")
+        checkpoint = cls.__new__(cls)
+        checkpoint.seed = data["seed"]
+        checkpoint.seed_name = data["seed_name"]
+        checkpoint.players = data["players"]
+        checkpoint.fingerprint = data["fingerprint"]
+        checkpoint.results = data["results"]
+        return checkpoint
+
+    def save(self, path: str) -> None:
+        data = {
+            "checkpoint_version": checkpoint_version,
+            "version": __version__,
+            "seed": self.seed,
+            "seed_name": self.seed_name,
+            "players": self.players,
+            "fingerprint": self.fingerprint,
+            "results": self.results,
+        }
+        with open(path, "wb") as f:
+            f.write(zlib.compress(restricted_dumps(data), 9))
+
+    def verify(self, multiworld: MultiWorld) -> None:
+        """Check that a MultiWorld about to run the first stage in `stages` is the one this checkpoint was made of."""
+        if multiworld.seed != self.seed:
+            raise CheckpointError(f"The checkpoint is of seed {self.seed}, not of seed {multiworld.seed}.")
+        players = {player: (multiworld.game[player], multiworld.player_name[player])
+                   for player in multiworld.player_ids}
+        if players != self.players:
+            raise CheckpointError(f"The checkpoint is of players {self.players}, not of players {players}.")
+        if _get_fingerprint(multiworld) != self.fingerprint:
+            raise CheckpointError("The multiworld differs from the one the checkpoint was made of. "
+                                  "Only generations with the same player files, options and worlds can be resumed.")
+
+    def record(self, stage: str, multiworld: MultiWorld) -> None:
+        """Store the result of a stage that just finished."""
+        assert stage in stages, f"Unknown generation stage {stage}"
+        random_state, world_random_states = _get_random_states(multiworld)
+        self.results[stage] = {
+            "placements": {(location.player, location.name): (_item_key(location.item), location.locked)
+                           for location in multiworld.get_filled_locations()},
+            "precollected": [_item_key(item) for items in multiworld.precollected_items.values() for item in items],
+            "random_state": random_state,
+            "world_random_states": world_random_states,
+        }
+
+    def restore(self, stage: str, multiworld: MultiWorld) -> bool:
+        """
+        Restore the result of a stage instead of running it.
+
+        :return: False if the stage was not checkpointed and has to be run.
+        """
+        result = self.results.get(stage)
+        if result is None:
+            return False
+
+        placements: dict[tuple[int, str], tuple[ItemKey, bool]] = result["placements"]
+        # items that are not where the checkpoint has them, by their key
+        spare_items: dict[ItemKey, list[Item]] = {}
+        for item in multiworld.itempool:
+            if item.location is None:
+                spare_items.setdefault(_item_key(item), []).append(item)
+        unfilled: list[tuple[Location, ItemKey, bool]] = []
+        for location in multiworld.get_locations():
+            placement = placements.get((location.player, location.name))
+            item = location.item
+            if item is not None and (placement is None or placement[0] != _item_key(item)):
+                location.item = None
+                item.location = None
+                spare_items.setdefault(_item_key(item), []).append(item)
+            if placement is not None:
+                if location.item is None:
+                    unfilled.append((location, *placement))
+                else:
+                    location.locked = placement[1]
+
+        def take_item(key: ItemKey) -> Item:
+            items = spare_items.get(key)
+            if items:
+                return items.pop()
+            # like items created as filler when moving progression to start inventory
+            player, name, classification = key
+            item = multiworld.create_item(name, player)
+            if int(item.classification) != classification:
+                raise CheckpointError(f"Could not find item {name} of player {player} to restore.")
+            return item
+
+        precollected = {player: [_item_key(item) for item in items]
+                        for player, items in multiworld.precollected_items.items()}
+        for key in result["precollected"]:
+            player_precollected = precollected.get(key[0], [])
+            if key in player_precollected:
+                player_precollected.remove(key)
+            else:
+                multiworld.push_precollected(take_item(key))
+
+        for location, key, locked in unfilled:
+            multiworld.push_item(location, take_item(key), False)
+            location.locked = locked
+
+        multiworld.random.setstate(result["random_state"])
+        for player, random_state in result["world_random_states"].items():
+            multiworld.worlds[player].random.setstate(random_state)
+        return True
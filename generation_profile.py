@@ -0,0 +1,211 @@
+"""
+Collects timings and counters of a generation for the `--profile_report` option of Generate.py,
+and writes them as a report next to the output files.
+"""
+import csv
+import functools
+import inspect
+import json
+import sys
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, TypeVar
+
+__all__ = ["GenerationProfile", "Timing", "active_profile", "profiled", "profiling", "record"]
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+@dataclass
+class Timing:
+    step: str
+    """The generation step, like the name of a World method or "fill_restrictive"."""
+    name: str = ""
+    """What the step was run for, like the game of a World method or the name of a fill."""
+    player: int | None = None
+    calls: int = 0
+    seconds: float = 0.0
+
+
+class GenerationProfile:
+    """Timings and counters of one generation. Only one profile can be active at a time, see `profiling`."""
+
+    timings: dict[tuple[str, str, int | None], Timing]
+    sweeps: int
+    location_rule_evaluations: int
+    entrance_rule_evaluations: int
+    start: float
+    end: float | None
+
+    def __init__(self) -> None:
+        self.timings = {}
+        self.sweeps = 0
+        self.location_rule_evaluations = 0
+        self.entrance_rule_evaluations = 0
+        self.start = time.perf_counter()
+        self.end = None
+        self._lock = threading.Lock()
+
+    def record(self, step: str, seconds: float, name: str = "", player: int | None = None) -> None:
+        """Add a call of a step taking the given amount of seconds. Repeated calls of a step get summed up."""
+        with self._lock:
+            timing = self.timings.get((step, name, player))
+            if timing is None:
+                timing = self.timings[step, name, player] = Timing(step, name, player)
+            timing.calls += 1
+            timing.seconds += seconds
+
+    def seconds_by_player(self) -> dict[int, float]:
+        """Sums up the timings of each player's World methods."""
+        seconds: dict[int, float] = {}
+        for timing in self.timings.values():
+            if timing.player is not None:
+                seconds[timing.player] = seconds.get(timing.player, 0.0) + timing.seconds
+        return seconds
+
+    def as_dict(self) -> dict[str, Any]:
+        end = self.end if self.end is not None else time.perf_counter()
+        return {
+            "total_seconds": end - self.start,
+            "peak_rss_bytes": get_peak_rss(),
+            "sweeps": self.sweeps,
+            "location_rule_evaluations": self.location_rule_evaluations,
+            "entrance_rule_evaluations": self.entrance_rule_evaluations,
+            "timings": [vars(timing) for timing in self.timings.values()],
+        }
+
+    def write_json(self, path: str, **extra: Any) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({**extra, **self.as_dict()}, f, indent=2)
+
+    def write_csv(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(("step", "name", "player", "calls", "seconds"))
+            for timing in self.timings.values():
+                writer.writerow((timing.step, timing.name, "" if timing.player is None else timing.player,
+                                 timing.calls, f"{timing.seconds:.6f}"))
+
+    def _install_counters(self) -> Callable[[], None]:
+        """Wrap the rule evaluation and sweep methods to count their calls, returns a function undoing that."""
+        from BaseClasses import CollectionState, Entrance, Location
+
+        def count(owner: type, attribute: str, counter: str) -> Callable[[], None]:
+            original = owner.__dict__[attribute]
+
+            @functools.wraps(original)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                with self._lock:  # output steps can evaluate rules in threads
+                    setattr(self, counter, getattr(self, counter) + 1)
+                return original(*args, **kwargs)
+
+            setattr(owner, attribute, wrapper)
+            return lambda: setattr(owner, attribute, original)
+
+        undo = [count(Location, "can_reach", "location_rule_evaluations"),
+                count(Entrance, "can_reach", "entrance_rule_evaluations"),
+                count(CollectionState, "sweep_for_advancements", "sweeps")]
+
+        def uninstall() -> None:
+            for function in undo:
+                function()
+
+        return uninstall
+
+
+active_profile: GenerationProfile | None = None
+"""The profile currently collecting data, if any."""
+
+
+def get_peak_rss() -> int | None:
+    """Returns the peak resident set size of this process in bytes, if the platform supports reading it."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kibibytes, macOS reports bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+@contextmanager
+def profiling() -> Iterator[GenerationProfile]:
+    """Makes a new profile the active one for the duration of the context."""
+    global active_profile
+    if active_profile is not None:
+        raise RuntimeError("Only one generation can be profiled at a time.")
+    profile = active_profile = GenerationProfile()
+    uninstall = profile._install_counters()
+    try:
+        yield profile
+    finally:
+        uninstall()
+        profile.end = time.perf_counter()
+        active_profile = None
+
+
+def record(step: str, seconds: float, name: str = "", player: int | None = None) -> None:
+    """Records a timing into the active profile. Does nothing if no profile is active."""
+    if active_profile is not None:
+        active_profile.record(step, seconds, name, player)
+
+
+def profiled(step: str, name_parameter: str | None = None) -> Callable[[F], F]:
+    """
+    Decorator recording the time spent in a function into the active profile.
+    For generator functions the time spent producing each item is summed up.
+
+    :param step: The step to record the time as.
+    :param name_parameter: The parameter of the function whose argument to record the time by, like a fill's name.
+    """
+    def decorator(function: F) -> F:
+        signature = inspect.signature(function)
+
+        def get_name(args: tuple[Any, ...], kwargs: dict[str, Any]) -> str:
+            if name_parameter is None:
+                return ""
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return str(bound.arguments[name_parameter])
+
+        if inspect.isgeneratorfunction(function):
+            @functools.wraps(function)
+            def generator_wrapper(*args: Any, **kwargs: Any) -> Any:
+                generator = function(*args, **kwargs)
+                if active_profile is None:
+                    return (yield from generator)
+                name = get_name(args, kwargs)
+                seconds = 0.0
+                try:
+                    while True:
+                        start = time.perf_counter()
+                        try:
+                            item = next(generator)
+                        except StopIteration as stop:
+                            return stop.value
+                        finally:
+                            seconds += time.perf_counter() - start
+                        yield item
+                finally:
+                    generator.close()
+                    record(step, seconds, name)
+
+            return generator_wrapper  # type: ignore[return-value]
+
+        @functools.wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if active_profile is None:
+                return function(*args, **kwargs)
+            name = get_name(args, kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(step, time.perf_counter() - start, name)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
@@ -24,24 +24,22 @@ __all__ = [
 
 no_gui = False
 skip_autosave = False
-_world_settings_name_cache: dict[str, str] = {}  # TODO: cache on disk and update when worlds change
+_world_settings_name_cache: dict[str, str] = {}
 _world_settings_name_cache_updated = False
 _lock = Lock()
 
 
 def _update_cache() -> None:
-    """Load all worlds and update world_settings_name_cache"""
+    """Update world_settings_name_cache from the world index, which loads all worlds without lazy world loading"""
     global _world_settings_name_cache_updated
     if _world_settings_name_cache_updated:
         return
 
     try:
-        from worlds.AutoWorld import AutoWorldRegister
-        for world in AutoWorldRegister.world_types.values():
-            annotation = world.__annotations__.get("settings", None)
-            if annotation is None or annotation == "ClassVar[Optional['Group']]":
-                continue
-            _world_settings_name_cache[world.settings_key] = f"{world.__module__}.{world.__name__}"
+        from worlds import world_index
+        for world in world_index.worlds.values():
+            if world.settings_class is not None:
+                _world_settings_name_cache[world.settings_key] = world.settings_class
     finally:
         _world_settings_name_cache_updated = True
 
@@ -615,6 +613,7 @@ class ServerOptions(Group):
     multidata: str | None = None
     savefile: str | None = None
     disable_save: bool = False
+    save_journal: bool = False
     loglevel: str = "info"
     logtime: bool = False
     server_password: ServerPassword | None = None
@@ -689,6 +688,18 @@ class GeneratorOptions(Group):
         start_inventory -> Move remaining items to start_inventory, generate additional filler items to fill locations.
         """
 
+    class OutputProcesses(int):
+        """
+        Amount of processes to generate output files of worlds that support it in, 0 to use threads only
+        Only works on systems that can fork processes, so not on Windows, others warn and use threads
+        """
+
+    class RollProcesses(int):
+        """
+        Amount of processes to parse player files and roll their options in, 0 to do both in the generating process
+        Each player's options are rolled from a random seed of their own, so they don't depend on the amount of processes
+        """
+
     player_files_path: PlayerFilesPath = PlayerFilesPath("Players")
     players: Players = Players(0)
     allow_quantity: AllowQuantity | bool = False
@@ -698,6 +709,8 @@ class GeneratorOptions(Group):
     race: Race = Race(0)
     plando_options: PlandoOptions = PlandoOptions("bosses, connections, texts")
     panic_method: PanicMethod = PanicMethod("swap")
+    output_processes: OutputProcesses = OutputProcesses(0)
+    roll_processes: RollProcesses = RollProcesses(0)
     loglevel: str = "info"
     logtime: bool = False
 
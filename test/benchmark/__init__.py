@@ -5,3 +5,13 @@ if __name__ == "__main__":
     load_worlds.run_load_worlds_benchmark()
     import locations
     locations.run_locations_benchmark()
+    import regions
+    regions.run_regions_benchmark()
+    import hints
+    hints.run_hints_benchmark()
+    import location_store
+    location_store.run_location_store_benchmark()
+    import encode
+    encode.run_encode_benchmark()
+    import patch
+    patch.run_patch_benchmark()
@@ -0,0 +1,66 @@
+def run_encode_benchmark(player_count: int = 200, item_count: int = 1000, iterations: int = 200) -> None:
+    """
+    Run a benchmark of encoding typical server messages with `NetUtils.encode`, comparing the previous encoding after
+    `_scan_for_TypedTuples` to the single pass encoders.
+
+    :param player_count: The number of players in the players package and slot info of the Connected message.
+    :param item_count: The number of items in the ReceivedItems and LocationInfo messages.
+    :param iterations: The number of times to encode each message.
+    """
+    import logging
+
+    from time_it import TimeIt
+
+    from NetUtils import (NetworkItem, NetworkPlayer, NetworkSlot, SlotType, _encode, _encode_python,
+                          _scan_for_TypedTuples, encode)
+    from Utils import init_logging
+
+    init_logging("Benchmark Runner")
+    logger = logging.getLogger("Benchmark")
+
+    encoders = {
+        "scanned": lambda obj: _encode(_scan_for_TypedTuples(obj)),
+        "pure python": _encode_python,
+    }
+    if encode is not _encode_python:
+        encoders["_speedups"] = encode
+
+    items = [NetworkItem(item, item + 100000, item % player_count + 1, item % 3) for item in range(item_count)]
+    messages = {
+        "ReceivedItems": [{"cmd": "ReceivedItems", "index": 0, "items": items}],
+        "LocationInfo": [{"cmd": "LocationInfo", "locations": items}],
+        "RoomUpdate": [{"cmd": "RoomUpdate", "checked_locations": [item.location for item in items]}],
+        "PrintJSON": [{"cmd": "PrintJSON", "type": "ItemSend", "receiving": item.player, "item": item, "data": [
+            {"text": str(item.player), "type": "player_id"},
+            {"text": " sent "},
+            {"text": str(item.item), "type": "item_id", "player": item.player, "flags": item.flags},
+            {"text": " to "},
+            {"text": str(item.player), "type": "player_id"},
+            {"text": " ("},
+            {"text": str(item.location), "type": "location_id", "player": 1},
+            {"text": ")"},
+        ]} for item in items[:140]],
+        "Connected": [{
+            "cmd": "Connected", "team": 0, "slot": 1,
+            "players": [NetworkPlayer(0, slot, f"Player{slot}", f"Player{slot}")
+                        for slot in range(1, player_count + 1)],
+            "missing_locations": list(range(item_count // 2)),
+            "checked_locations": list(range(item_count // 2, item_count)),
+            "slot_info": {slot: NetworkSlot(f"Player{slot}", "Game", SlotType.player)
+                          for slot in range(1, player_count + 1)},
+            "hint_points": 0,
+            "slot_data": {"options": {f"option{option}": option for option in range(50)}},
+        }],
+    }
+
+    for message_name, message in messages.items():
+        for name, encoder in encoders.items():
+            with TimeIt(f"{name} {iterations} times encoding {message_name}", logger):
+                for _ in range(iterations):
+                    encoder(message)
+
+
+if __name__ == "__main__":
+    from path_change import change_home
+    change_home()
+    run_encode_benchmark()
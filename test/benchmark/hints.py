@@ -0,0 +1,51 @@
+def run_hints_benchmark(slots: int = 200, hint_counts: tuple[int, ...] = (1_000, 10_000, 100_000),
+                        checks: int = 100) -> None:
+    """
+    Run a benchmark of rechecking hints after location checks in MultiServer, with a growing number of hints in a
+    room. Every hint is about a location of the checking slot, so all of them are looked at by a full recheck of the
+    slot, while rechecking the newly checked location only touches the hints of that location.
+
+    :param slots: The number of slots in the room.
+    :param hint_counts: The numbers of hints in the room to run the benchmark with.
+    :param checks: The number of locations to check and recheck the hints for.
+    """
+    import logging
+
+    from time_it import TimeIt
+
+    from MultiServer import Context
+    from NetUtils import Hint
+    from Utils import init_logging
+
+    init_logging("Benchmark Runner")
+    logger = logging.getLogger("Benchmark")
+
+    # a Context can only load the game data once per process
+    ctx = Context("", 0, "", "", 0, 0, False)
+
+    def reset_context(hint_count: int) -> None:
+        ctx.hints.clear()
+        ctx.location_checks.clear()
+        for location in range(hint_count):
+            receiving_player = location % slots + 1
+            hint = Hint(receiving_player, 1, location, location, False)
+            ctx.hints[0, 1].add(hint)
+            ctx.hints[0, receiving_player].add(hint)
+        ctx.reindex_hints()
+
+    for hint_count in hint_counts:
+        for indexed in (False, True):
+            reset_context(hint_count)
+            mode = "indexed" if indexed else "full slot"
+            with TimeIt(f"{mode} recheck of {checks} checks with {hint_count} hints", logger) as timer:
+                for location in range(checks):
+                    ctx.location_checks[0, 1].add(location)
+                    changed: set[tuple[int, int]] = set()
+                    ctx.recheck_hints(0, 1, changed, (location,) if indexed else None)
+            logger.info(f"{timer.dif / checks * 1_000_000:.1f} microseconds per check.")
+
+
+if __name__ == "__main__":
+    from path_change import change_home
+    change_home()
+    run_hints_benchmark()
@@ -0,0 +1,59 @@
+def run_location_store_benchmark(player_counts: tuple[int, ...] = (10, 100, 1000), locations_per_player: int = 500,
+                                 lookups: int = 1000) -> None:
+    """
+    Run a benchmark of the hint and collect lookups of the MultiServer location stores, `find_item` and
+    `get_for_player`, with a growing number of players. With the receiver index the time per lookup should stay
+    about the same, as it only depends on the number of matching locations.
+
+    :param player_counts: The numbers of players to create stores for.
+    :param locations_per_player: The number of locations of each player.
+    :param lookups: The number of lookups of each kind to run.
+    """
+    import logging
+    import random
+
+    from time_it import TimeIt
+
+    from NetUtils import LocationStore, _LocationStore
+    from Utils import init_logging
+
+    init_logging("Benchmark Runner")
+    logger = logging.getLogger("Benchmark")
+
+    store_types = {"pure python": _LocationStore}
+    if LocationStore is not _LocationStore:
+        store_types["_speedups"] = LocationStore
+
+    for player_count in player_counts:
+        rand = random.Random(0)
+        # each player gets one copy of each of their items
+        items = {player: list(range(locations_per_player)) for player in range(1, player_count + 1)}
+        for player_items in items.values():
+            rand.shuffle(player_items)
+        receivers = [player for player in items for _ in range(locations_per_player)]
+        rand.shuffle(receivers)
+        locations = {
+            sender: {location: (items[receiver].pop(), receiver, 0)
+                     for location, receiver in enumerate(receivers[(sender - 1) * locations_per_player:
+                                                                   sender * locations_per_player])}
+            for sender in items
+        }
+        slots = [rand.randrange(1, player_count + 1) for _ in range(lookups)]
+        item_ids = [rand.randrange(locations_per_player) for _ in range(lookups)]
+
+        for name, store_type in store_types.items():
+            with TimeIt(f"{name} creating store of {player_count * locations_per_player} locations", logger):
+                store = store_type(locations)
+            with TimeIt(f"{name} {lookups} find_item in {player_count} players", logger):
+                for slot, item_id in zip(slots, item_ids):
+                    for _ in store.find_item({slot}, item_id):
+                        pass
+            with TimeIt(f"{name} {lookups} get_for_player in {player_count} players", logger):
+                for slot in slots:
+                    store.get_for_player(slot)
+
+
+if __name__ == "__main__":
+    from path_change import change_home
+    change_home()
+    run_location_store_benchmark()
@@ -0,0 +1,71 @@
+def run_patch_benchmark(sizes: tuple[int, ...] = (32 << 20, 64 << 20), change_count: int = 20000,
+                        block_size: int = 1 << 20) -> None:
+    """
+    Run a benchmark of creating and applying deltas and tokens on synthetic files, comparing a bsdiff4 delta of the
+    whole file to a block delta.
+
+    :param sizes: The sizes of the synthetic files in bytes.
+    :param change_count: The number of changes made to each file, as well as the number of tokens applied.
+    :param block_size: The block size of the block deltas.
+    """
+    import logging
+    import random
+
+    import bsdiff4
+    from time_it import TimeIt
+
+    from Utils import init_logging
+    from worlds.Files import APPatchExtension, APTokenMixin, APTokenTypes, apply_block_delta, create_block_delta
+
+    init_logging("Benchmark Runner")
+    logger = logging.getLogger("Benchmark")
+
+    class Caller:
+        def __init__(self, data: bytes) -> None:
+            self.data = data
+
+        def get_file(self, file: str) -> bytes:
+            return self.data
+
+    for size in sizes:
+        random.seed(size)
+        # compresses somewhat like a rom, with repeated runs of random data
+        source = bytes(random.getrandbits(8) for _ in range(4096)) * (size // 4096)
+        target = bytearray(source)
+        tokens = APTokenMixin()
+        for _ in range(change_count):
+            offset = random.randrange(size - 64)
+            length = random.randrange(1, 64)
+            data = random.randbytes(length)
+            target[offset:offset + length] = data
+            token_type = random.choice(list(APTokenTypes))
+            if token_type in (APTokenTypes.AND_8, APTokenTypes.OR_8, APTokenTypes.XOR_8):
+                tokens.write_token(token_type, offset, data[0])
+            elif token_type in (APTokenTypes.COPY, APTokenTypes.RLE):
+                tokens.write_token(token_type, offset, (length, random.randrange(size - 64)
+                                                        if token_type == APTokenTypes.COPY else data[0]))
+            else:
+                tokens.write_token(token_type, offset, data)
+        target = bytes(target)
+        name = f"{size >> 20} MiB with {change_count} changes"
+
+        with TimeIt(f"{name} token binary", logger):
+            token_binary = tokens.get_token_binary()
+        with TimeIt(f"{name} applying tokens", logger):
+            APPatchExtension.apply_tokens(Caller(token_binary), source, "token_data.bin")  # type: ignore
+
+        with TimeIt(f"{name} block delta", logger):
+            block_delta = create_block_delta(source, target, block_size)
+        with TimeIt(f"{name} applying block delta", logger):
+            assert apply_block_delta(source, block_delta) == target
+        with TimeIt(f"{name} bsdiff4 delta", logger):
+            delta = bsdiff4.diff(source, target)
+        with TimeIt(f"{name} applying bsdiff4 delta", logger):
+            assert bsdiff4.patch(source, delta) == target
+        logger.info(f"{name} block delta {len(block_delta)} bytes, bsdiff4 delta {len(delta)} bytes")
+
+
+if __name__ == "__main__":
+    from path_change import change_home
+    change_home()
+    run_patch_benchmark()
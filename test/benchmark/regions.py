@@ -0,0 +1,53 @@
+def run_regions_benchmark(games: tuple[str, ...] = ("Blasphemous", "TUNIC", "Celeste (Open World)"),
+                          iterations: int = 20) -> None:
+    """
+    Run a benchmark of `CollectionState.update_reachable_regions` on worlds with large region graphs, by collecting
+    all progression items of the world one at a time and updating the reachable regions after each of them.
+
+    :param games: The games to benchmark.
+    :param iterations: The number of times to collect all progression items into a new state.
+    """
+    import argparse
+    import logging
+
+    from time_it import TimeIt
+
+    from Utils import init_logging
+    from worlds import AutoWorld
+    from worlds.AutoWorld import call_all
+    from BaseClasses import CollectionState, MultiWorld
+
+    init_logging("Benchmark Runner")
+    logger = logging.getLogger("Benchmark")
+
+    gen_steps = ("generate_early", "create_regions", "create_items", "set_rules", "connect_entrances",
+                 "generate_basic", "pre_fill")
+
+    for game in games:
+        world_type = AutoWorld.AutoWorldRegister.world_types[game]
+        multiworld = MultiWorld(1)
+        multiworld.game[1] = game
+        multiworld.player_name = {1: "Tester"}
+        multiworld.set_seed(0)
+        args = argparse.Namespace()
+        for name, option in world_type.options_dataclass.type_hints.items():
+            setattr(args, name, {1: option.from_any(option.default)})
+        multiworld.set_options(args)
+        multiworld.state = CollectionState(multiworld)
+        for step in gen_steps:
+            call_all(multiworld, step)
+
+        items = [item for item in multiworld.itempool if item.advancement]
+        region_count = len(multiworld.regions.region_cache[1])
+        with TimeIt(f"{game} {iterations} times collecting {len(items)} items with {region_count} regions", logger):
+            for _ in range(iterations):
+                state = CollectionState(multiworld)
+                for item in items:
+                    state.collect(item, True)
+                    state.update_reachable_regions(1)
+
+
+if __name__ == "__main__":
+    from path_change import change_home
+    change_home()
+    run_regions_benchmark()
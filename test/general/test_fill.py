@@ -869,6 +869,26 @@ class TestBalanceMultiworldProgression(unittest.TestCase):
         self.assertRegionContains(
             self.player1.regions[2], self.player2.prog_items[0])
 
+    def test_only_moves_required_items(self) -> None:
+        """Test that progression balancing leaves progression items that aren't required in their place"""
+        self.multiworld.worlds[self.player1.id].options.progression_balancing.value = 50
+        self.multiworld.worlds[self.player2.id].options.progression_balancing.value = 50
+
+        unrequired_items = [Item(f"player2_unrequired{i}", ItemClassification.progression, None, self.player2.id)
+                            for i in range(10)]
+        basic_locations = [location for location in self.player1.regions[2].locations
+                           if location.item and not location.item.advancement]
+        for location, item in zip(basic_locations, unrequired_items):
+            location.item = item
+            item.location = location
+
+        balance_multiworld_progression(self.multiworld)
+
+        self.assertRegionContains(
+            self.player1.regions[1], self.player2.prog_items[0])
+        for item in unrequired_items:
+            self.assertRegionContains(self.player1.regions[2], item)
+
     def test_ignores_priority_locations(self) -> None:
         """Test that progression items on priority locations don't get moved by balancing"""
         self.multiworld.worlds[self.player1.id].options.progression_balancing.value = 50
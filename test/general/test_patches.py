@@ -1,6 +1,12 @@
-﻿import unittest
+﻿import os
+import random
+import tempfile
+import unittest
+from typing import Any, ClassVar, Dict
+
 from worlds.AutoWorld import AutoWorldRegister
-from worlds.Files import AutoPatchRegister
+from worlds.Files import (APDeltaPatch, APPatchExtension, APTokenMixin, APTokenTypes, AutoPatchRegister,
+                          apply_block_delta, create_block_delta)
 
 
 class TestPatches(unittest.TestCase):
@@ -9,3 +15,82 @@ class TestPatches(unittest.TestCase):
             with self.subTest(game=game_name):
                 self.assertIn(game_name, AutoWorldRegister.world_types.keys(),
                               f"Patch '{game_name}' does not match the name of any world.")
+
+
+class TokenCaller:
+    def __init__(self, files: Dict[str, bytes]) -> None:
+        self.files = files
+
+    def get_file(self, file: str) -> bytes:
+        return self.files[file]
+
+
+class TestTokens(unittest.TestCase):
+    def test_apply_tokens(self) -> None:
+        """Test that each type of token gets applied in order."""
+        tokens = APTokenMixin()
+        tokens.write_token(APTokenTypes.WRITE, 0, b"\x01\x02\x03\x04")
+        tokens.write_token(APTokenTypes.AND_8, 1, 0x00)
+        tokens.write_token(APTokenTypes.OR_8, 2, 0xF0)
+        tokens.write_token(APTokenTypes.XOR_8, 3, 0xFF)
+        tokens.write_token(APTokenTypes.COPY, 8, (4, 0))
+        tokens.write_token(APTokenTypes.RLE, 12, (3, 0xAA))
+        tokens.write_token(APTokenTypes.WRITE, 13, b"\x55")
+        caller = TokenCaller({"token_data.bin": tokens.get_token_binary()})
+        result = APPatchExtension.apply_tokens(caller, bytes(16), "token_data.bin")  # type: ignore[arg-type]
+        self.assertEqual(result, bytes([1, 0, 0xF3, 0xFB, 0, 0, 0, 0, 1, 0, 0xF3, 0xFB, 0xAA, 0x55, 0xAA, 0]))
+
+
+class TestBlockDelta(unittest.TestCase):
+    def test_round_trip(self) -> None:
+        """Test that a block delta recreates the target from the source, also if their lengths differ."""
+        random.seed(0)
+        source = random.randbytes(10000)
+        for target_length in (0, 5000, 10000, 10100, 25000):
+            with self.subTest(target_length=target_length):
+                target = bytearray(source[:target_length])
+                target.extend(random.randbytes(target_length - len(target)))
+                for offset in random.sample(range(target_length), min(target_length, 20)):
+                    target[offset] ^= 1
+                delta = create_block_delta(source, bytes(target), 1024)
+                self.assertEqual(apply_block_delta(source, delta), target)
+
+    def test_unchanged_blocks(self) -> None:
+        """Test that blocks that did not change are not part of the delta."""
+        source = bytes(range(256)) * 64
+        target = bytearray(source)
+        target[5000] = 0
+        self.assertLess(len(create_block_delta(source, bytes(target), 1024)),
+                        len(create_block_delta(source, bytes(target[::-1]), 1024)))
+        self.assertEqual(apply_block_delta(source, create_block_delta(source, source, 1024)), source)
+
+
+class TestDeltaPatch(unittest.TestCase):
+    class BlockDeltaPatch(APDeltaPatch):
+        hash = "source checksum"
+        block_size: ClassVar[int] = 1024
+        source: ClassVar[bytes] = random.Random(0).randbytes(5000)
+
+        @classmethod
+        def get_source_data(cls) -> bytes:
+            return cls.source
+
+    def test_block_delta_patch(self) -> None:
+        """Test that a delta patch with a block size gets written and applied with a block delta."""
+        target = bytearray(self.BlockDeltaPatch.source)
+        target[3000:3010] = bytes(10)
+        with tempfile.TemporaryDirectory() as directory:
+            patched_path = os.path.join(directory, "patched.bin")
+            with open(patched_path, "wb") as f:
+                f.write(target)
+            patch = self.BlockDeltaPatch(os.path.join(directory, "patch.zip"), player=1, player_name="Player",
+                                         patched_path=patched_path)
+            patch.write()
+            manifest: Dict[str, Any] = patch.get_manifest()
+            self.assertEqual(manifest["compatible_version"], 8)
+            self.assertEqual(manifest["procedure"], [("apply_bsdiff4_blocks", ["delta.bsdiff4blocks"])])
+
+            read_patch = self.BlockDeltaPatch(os.path.join(directory, "patch.zip"))
+            read_patch.patch(os.path.join(directory, "result.bin"))
+            with open(os.path.join(directory, "result.bin"), "rb") as f:
+                self.assertEqual(f.read(), target)
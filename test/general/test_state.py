@@ -1,7 +1,10 @@
 import unittest
+from collections import Counter
 
+from BaseClasses import Item, ItemClassification, Location, Region, SphereAnalysis
+from Fill import FillError
 from worlds.AutoWorld import AutoWorldRegister, call_all
-from . import setup_solo_multiworld
+from . import generate_items, generate_test_multiworld, setup_solo_multiworld
 
 
 class TestBase(unittest.TestCase):
@@ -27,3 +30,140 @@ class TestBase(unittest.TestCase):
                     with self.subTest("Step", step=step):
                         call_all(multiworld, step)
                         self.assertTrue(multiworld.get_all_state(False, allow_partial_entrances=True))
+
+
+class TestCopy(unittest.TestCase):
+    def setUp(self) -> None:
+        self.multiworld = generate_test_multiworld(2)
+        for player in self.multiworld.player_ids:
+            locked = Region("Locked", player, self.multiworld)
+            self.multiworld.regions.append(locked)
+            self.multiworld.get_region("Menu", player).connect(
+                locked, rule=lambda state, p=player: state.has(f"player{p}_progitem0", p))
+        self.items = {player: generate_items(1, player, True)[0] for player in self.multiworld.player_ids}
+
+    def test_copies_are_independent(self) -> None:
+        """Ensure collecting into a copy or into the original state doesn't affect the other."""
+        state = self.multiworld.state
+        state.collect(self.items[1], True)
+        self.assertTrue(state.can_reach("Locked", "Region", 1))
+
+        copy = state.copy()
+        copy.collect(self.items[2], True)
+        state.remove(self.items[1])
+        self.assertTrue(copy.can_reach("Locked", "Region", 1))
+        self.assertTrue(copy.can_reach("Locked", "Region", 2))
+        self.assertFalse(state.can_reach("Locked", "Region", 1))
+        self.assertFalse(state.can_reach("Locked", "Region", 2))
+        self.assertEqual(copy.count(self.items[1].name, 1), 1)
+        self.assertEqual(copy.count(self.items[2].name, 2), 1)
+        self.assertEqual(state.count(self.items[1].name, 1), 0)
+        self.assertEqual(state.count(self.items[2].name, 2), 0)
+
+        copy_of_copy = copy.copy()
+        copy.remove(self.items[2])
+        self.assertEqual(copy_of_copy.count(self.items[2].name, 2), 1)
+        self.assertEqual(copy.count(self.items[2].name, 2), 0)
+        self.assertEqual(dict(copy_of_copy.prog_items), {1: {self.items[1].name: 1}, 2: {self.items[2].name: 1}})
+
+    def test_copied_reachability(self) -> None:
+        """Ensure reachable regions and blocked connections of a copy are not shared with the original state."""
+        state = self.multiworld.state
+        self.assertTrue(state.can_reach("Menu", "Region", 1))
+        copy = state.copy()
+        self.assertTrue(all(copy.stale.values()))
+        exit_ = self.multiworld.get_region("Menu", 1).exits[0]
+        self.assertIn(exit_, copy.blocked_connections[1])
+        copy.blocked_connections[1].clear()
+        self.assertIn(exit_, state.blocked_connections[1])
+        self.assertIn(self.multiworld.get_region("Menu", 1), copy.reachable_regions[1])
+
+
+    def test_references_across_copies(self) -> None:
+        """Ensure per-player data looked up before or after copying stays private to its state."""
+        state = self.multiworld.state
+        counts = state.prog_items[1]
+        copy = state.copy()
+        counts["Held Item"] += 1
+        self.assertEqual(state.count("Held Item", 1), 1)
+        self.assertEqual(copy.count("Held Item", 1), 0)
+
+        copy_counts = copy.prog_items[1]
+        copy_of_copy = copy.copy()
+        copy_counts["Held Item"] += 2
+        second_copy = state.copy()
+        self.assertEqual(copy.count("Held Item", 1), 2)
+        self.assertEqual(copy_of_copy.count("Held Item", 1), 0)
+        self.assertEqual(second_copy.count("Held Item", 1), 1)
+
+        other_counts = copy_of_copy.prog_items[2]
+        other_counts["Held Item"] += 1
+        self.assertEqual(copy_of_copy.count("Held Item", 2), 1)
+        for other in (state, copy, second_copy):
+            self.assertEqual(other.count("Held Item", 2), 0)
+
+    def test_mutating_methods(self) -> None:
+        """Ensure removing and replacing per-player data doesn't affect copies."""
+        state = self.multiworld.state
+        copy = state.copy()
+        removed = copy.prog_items.pop(1)
+        self.assertNotIn(1, copy.prog_items)
+        self.assertIn(1, state.prog_items)
+        removed["Held Item"] += 1
+        self.assertEqual(state.count("Held Item", 1), 0)
+
+        del copy.prog_items[2]
+        self.assertEqual(list(copy.prog_items), [])
+        self.assertEqual(sorted(state.prog_items), [1, 2])
+
+        copy = state.copy()
+        copy.prog_items[1] = Counter({"Replaced Item": 1})
+        self.assertIs(copy.prog_items.setdefault(1, Counter()), copy.prog_items[1])
+        copy.prog_items.setdefault(3, Counter())["New Item"] += 1
+        self.assertEqual(copy.count("Replaced Item", 1), 1)
+        self.assertEqual(copy.count("New Item", 3), 1)
+        self.assertEqual(state.count("Replaced Item", 1), 0)
+        self.assertNotIn(3, state.prog_items)
+        copy.prog_items.clear()
+        self.assertEqual(len(copy.prog_items), 0)
+        self.assertEqual(len(state.prog_items), 2)
+
+
+class TestSphereAnalysis(unittest.TestCase):
+    def setUp(self) -> None:
+        self.multiworld = generate_test_multiworld()
+        menu = self.multiworld.get_region("Menu", 1)
+        locked = Region("Locked", 1, self.multiworld)
+        self.multiworld.regions.append(locked)
+        menu.connect(locked, rule=lambda state: state.has("Event", 1))
+
+        def place(name: str, address: int | None, region: Region, item: Item) -> Location:
+            location = Location(1, name, address, region)
+            region.locations.append(location)
+            location.place_locked_item(item)
+            return location
+
+        place("Event Location", None, menu, Item("Event", ItemClassification.progression, None, 1))
+        place("Key Location", 1, menu, Item("Key", ItemClassification.progression, 1, 1))
+        place("Locked Location", 2, locked, Item("Filler", ItemClassification.filler, 2, 1))
+        self.gated = place("Gated Location", 3, menu, Item("Filler", ItemClassification.filler, 2, 1))
+        self.gated.access_rule = lambda state: state.has("Key", 1)
+        self.multiworld.completion_condition[1] = lambda state: state.has("Key", 1)
+
+    def test_matches_separate_searches(self) -> None:
+        analysis = SphereAnalysis(self.multiworld)
+        self.assertEqual(analysis.sendable_spheres, list(self.multiworld.get_sendable_spheres()))
+        self.assertEqual(len(analysis.sendable_spheres), 2)
+        self.assertFalse(analysis.unreachable)
+        self.assertTrue(analysis.fulfills_accessibility())
+        self.assertTrue(self.multiworld.fulfills_accessibility())
+
+    def test_unreachable_locations(self) -> None:
+        self.gated.access_rule = lambda state: state.has("Missing", 1)
+        analysis = SphereAnalysis(self.multiworld)
+        self.assertEqual(analysis.sendable_spheres, list(self.multiworld.get_sendable_spheres()))
+        self.assertEqual(analysis.unreachable, {self.gated})
+        with self.assertRaises(FillError):
+            analysis.fulfills_accessibility()
+        with self.assertRaises(FillError):
+            self.multiworld.fulfills_accessibility()
@@ -0,0 +1,105 @@
+import os
+import tempfile
+import unittest
+import unittest.mock
+
+import worlds
+from MultiServer import Context
+from worlds.AutoWorld import AutoWorldRegister, World
+from worlds.WorldIndex import LazyWorldTypes, WorldIndex, get_source_keys, get_sources_key
+
+
+class TestWorldIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        cache_path = unittest.mock.patch("Utils.cache_path",
+                                         lambda *path: os.path.join(self.directory.name, *path))
+        cache_path.start()
+        self.addCleanup(self.directory.cleanup)
+        self.addCleanup(cache_path.stop)
+
+    def test_index_matches_worlds(self) -> None:
+        """Test that the index has what the worlds would have if they were imported."""
+        index = worlds.world_index
+        for game, world in AutoWorldRegister.world_types.items():
+            if game not in index.worlds:
+                continue  # like worlds of tests
+            with self.subTest(game=game):
+                indexed_world = index.worlds[game]
+                self.assertEqual(indexed_world.world_version, tuple(world.world_version))
+                self.assertEqual(indexed_world.hint_blacklist, world.hint_blacklist)
+                self.assertEqual(indexed_world.settings_key, world.settings_key)
+                self.assertEqual(indexed_world.item_count, len(world.item_names))
+                self.assertEqual(indexed_world.location_count, len(world.location_names))
+                self.assertEqual(index.data_package[game]["checksum"], world.get_data_package_data()["checksum"])
+
+    def test_save_load(self) -> None:
+        """Test that the saved index gets loaded, with the key of the world files it was made of."""
+        self.assertIsNone(WorldIndex.load())
+        index = worlds.world_index
+        index.save()
+        loaded = WorldIndex.load()
+        assert loaded
+        self.assertEqual(loaded.key, index.key)
+        self.assertEqual(loaded.worlds, index.worlds)
+        self.assertEqual(loaded.data_package.keys(), index.data_package.keys())
+
+    def test_cached_data_package(self) -> None:
+        """Test that the data package of a game is only reused for the same files and tables of the world."""
+        index = worlds.world_index
+        game, indexed_world = next((game, indexed_world) for game, indexed_world in index.worlds.items()
+                                   if indexed_world.item_count > 1)
+        world = AutoWorldRegister.world_types[game]
+        Context("", 0, "", "", 0, 0, False)  # removes the groups from the packages it sends to clients
+        self.assertIs(index.get_data_package(world, indexed_world.source, indexed_world.source_key),
+                      index.data_package[game])
+        self.assertIsNone(index.get_data_package(world, indexed_world.source, "changed files"))
+        self.assertIsNone(index.get_data_package(world, "other source", indexed_world.source_key))
+
+        with unittest.mock.patch.object(world, "item_name_to_id", dict(reversed(world.item_name_to_id.items()))):
+            self.assertIsNone(index.get_data_package(world, indexed_world.source, indexed_world.source_key))
+
+    def test_sources_key(self) -> None:
+        """Test that the key of a world source and of all world sources changes when one of its files does."""
+        with tempfile.TemporaryDirectory() as other_directory:
+            world_sources = [worlds.WorldSource(self.directory.name, relative=False),
+                             worlds.WorldSource(other_directory, relative=False)]
+            with open(os.path.join(self.directory.name, "__init__.py"), "w") as f:
+                f.write("")
+            source_keys = get_source_keys(world_sources)
+            key = get_sources_key(source_keys)
+            self.assertEqual(source_keys, get_source_keys(world_sources))
+            with open(os.path.join(self.directory.name, "__init__.py"), "w") as f:
+                f.write("# changed")
+            changed_source_keys = get_source_keys(world_sources)
+            self.assertNotEqual(source_keys[self.directory.name], changed_source_keys[self.directory.name])
+            self.assertEqual(source_keys[other_directory], changed_source_keys[other_directory])
+            self.assertNotEqual(key, get_sources_key(changed_source_keys))
+
+
+class TestLazyWorldTypes(unittest.TestCase):
+    def test_lazy_loading(self) -> None:
+        """Test that worlds only get loaded once they are looked up."""
+        index = WorldIndex("key", {game: worlds.world_index.worlds[game] for game in ("Archipelago",)}, {}, {})
+        loaded_sources = []
+
+        def load_source(path: str) -> None:
+            loaded_sources.append(path)
+            world_types["Archipelago"] = AutoWorldRegister.world_types["Archipelago"]
+
+        world_types = LazyWorldTypes(index, load_source)
+        self.assertIn("Archipelago", world_types)
+        self.assertNotIn("Unknown Game", world_types)
+        self.assertEqual(list(world_types), ["Archipelago"])
+        self.assertEqual(len(world_types), 1)
+        self.assertEqual(loaded_sources, [])
+
+        self.assertIs(world_types["Archipelago"], AutoWorldRegister.world_types["Archipelago"])
+        self.assertIs(world_types["Archipelago"], AutoWorldRegister.world_types["Archipelago"])
+        self.assertEqual(loaded_sources, [worlds.world_index.worlds["Archipelago"].source])
+        with self.assertRaises(KeyError):
+            world_types["Unknown Game"]
+
+        world_types["Test Game"] = World
+        self.assertEqual(list(world_types), ["Archipelago", "Test Game"])
+        self.assertEqual(len(world_types), 2)
@@ -0,0 +1,90 @@
+# Tests for _speedups.encode and NetUtils.encode
+import enum
+import json
+import math
+import os
+import typing
+import unittest
+
+import NetUtils
+from NetUtils import (ClientStatus, Hint, HintStatus, LocationStore, NetworkItem, NetworkPlayer, NetworkSlot, SlotType,
+                      _LocationStore, _encode, _encode_python, _scan_for_TypedTuples)
+
+ci = bool(os.environ.get("CI"))  # always set in GitHub actions
+
+
+class Empty(typing.NamedTuple):
+    pass
+
+
+class Nested(typing.NamedTuple):
+    item: NetworkItem
+    values: typing.List[typing.Any]
+
+
+class Name(str, enum.Enum):
+    value_a = "a"
+
+
+sample_messages: typing.List[typing.Any] = [
+    [{"cmd": "ReceivedItems", "index": 0, "items": [NetworkItem(1, 2, 3), NetworkItem(-4, -2, 0, 7)]}],
+    [{"cmd": "Connected", "team": 0, "slot": 1, "players": [NetworkPlayer(0, 1, "Alias (Name)", "Name")],
+      "slot_info": {1: NetworkSlot("Name", "Game", SlotType.player),
+                    2: NetworkSlot("Group", "Game", SlotType.group, [1, 3])},
+      "missing_locations": [], "checked_locations": [1, 2], "slot_data": {"key": {"nested": [1.5, None, True]}}}],
+    [{"cmd": "PrintJSON", "data": [{"text": "äöü \"quoted\" \\ \n\t ☃ \U0001F600 \x00"}],
+      "type": "Hint", "hint": Hint(1, 2, 3, 4, False, "", 0, HintStatus.HINT_PRIORITY)}],
+    [{"cmd": "SetReply", "value": {1, 2, 3}, "frozen": frozenset({"a"}), "tuple": (1, (2, 3)), "list": [[], {}]}],
+    {1: "int key", 1.5: "float key", True: "bool key", None: "none key", HintStatus.HINT_FOUND: "enum key",
+     Name.value_a: "str enum key"},
+    [ClientStatus.CLIENT_GOAL, Name.value_a, 0.1, -0.0, 1e100, 2 ** 70, -2 ** 70, False, None, ""],
+    [Empty(), Nested(NetworkItem(1, 2, 3), [NetworkItem(4, 5, 6), (7, 8)])],
+    [float("inf"), float("-inf")],
+    "just a string",
+    [],
+    {},
+]
+
+
+class Base:
+    class TestEncode(unittest.TestCase):
+        encode: typing.Callable[[typing.Any], str]
+
+        def test_same_as_scanned(self) -> None:
+            """Test that messages get encoded the same as by encoding them after _scan_for_TypedTuples."""
+            for message in sample_messages:
+                with self.subTest(message=message):
+                    self.assertEqual(_encode(_scan_for_TypedTuples(message)), self.encode(message))
+
+        def test_decode(self) -> None:
+            encoded = self.encode(sample_messages[0])
+            self.assertEqual([NetworkItem(1, 2, 3), NetworkItem(-4, -2, 0, 7)], NetUtils.decode(encoded)[0]["items"])
+
+        def test_nan(self) -> None:
+            self.assertTrue(math.isnan(json.loads(self.encode([float("nan")]))[0]))
+
+        def test_invalid(self) -> None:
+            with self.assertRaises(TypeError):
+                self.encode([object()])
+            with self.assertRaises(TypeError):
+                self.encode({(1, 2): "tuple key"})
+            with self.assertRaises(TypeError):
+                self.encode(b"bytes")
+            with self.assertRaises(TypeError):
+                # values of NamedTuples are not scanned for sets
+                self.encode(Nested(NetworkItem(1, 2, 3), [{1}]))
+
+
+class TestPurePythonEncode(Base.TestEncode):
+    """Run base tests for the pure python implementation."""
+    def setUp(self) -> None:
+        self.encode = _encode_python
+
+
+@unittest.skipIf(LocationStore is _LocationStore and not ci, "_speedups not available")
+class TestSpeedupsEncode(Base.TestEncode):
+    """Run base tests for the cython implementation."""
+    def setUp(self) -> None:
+        self.assertFalse(LocationStore is _LocationStore, "Failed to load _speedups")
+        import _speedups
+        self.encode = _speedups.encode
@@ -1,9 +1,10 @@
 # Tests for _speedups.LocationStore and NetUtils._LocationStore
 import os
+import sys
 import typing
 import unittest
 import warnings
-from NetUtils import LocationStore, _LocationStore
+from NetUtils import LocationStore, _LocationStore, pack_locations
 
 State = typing.Dict[typing.Tuple[int, int], typing.Set[int]]
 RawLocations = typing.Dict[int, typing.Dict[int, typing.Tuple[int, int, int]]]
@@ -117,6 +118,20 @@ class Base:
             self.assertEqual(self.store.get_for_player(1), {1: {13}, 2: {22, 23}})
             self.assertEqual(self.store.get_for_player(9999), {})
 
+        def test_find_item_order(self) -> None:
+            """Test that find_item yields in the order of the store, like a search through all locations would."""
+            for slots in ({1}, {2}, {1, 2}, {3, 4, 5}, {1, 2, 3, 4, 5}):
+                for seeked_item_id in (11, 12, 13, 21, 22, 23, 99):
+                    expected = [(finding_player, location_id, item_id, receiving_player, item_flags)
+                                for finding_player, locations in self.store.items()
+                                for location_id, (item_id, receiving_player, item_flags) in locations.items()
+                                if receiving_player in slots and item_id == seeked_item_id]
+                    self.assertEqual(list(self.store.find_item(slots, seeked_item_id)), expected)
+
+        def test_get_for_player_order(self) -> None:
+            """Test that get_for_player has the source slots in the order of the store."""
+            self.assertEqual(list(self.store.get_for_player(1)), [1, 2])
+
         def test_get_checked(self) -> None:
             self.assertEqual(self.store.get_checked(full_state, 0, 1), [11, 12, 13])
             self.assertEqual(self.store.get_checked(one_state, 0, 1), [12])
@@ -223,6 +238,55 @@ class Base:
                 self.assertEqual(store.get_remaining(empty_state, 0, 1), [])
                 self.assertEqual(store.get_remaining(full_state, 0, 1), [])
 
+        def test_receiver_index(self) -> None:
+            """Test find_item and get_for_player against a search through all locations of a larger store."""
+            import random
+            rand = random.Random(0)
+            data: RawLocations = {
+                sender: {location: (rand.randrange(20), rand.randrange(1, 12), rand.randrange(8))
+                         for location in rand.sample(range(1000), 100)}
+                for sender in range(1, 11)
+            }
+            store = self.type(data)
+            for slots in ({1}, {11}, {2, 3}, set(range(1, 12)), {12}, {0, 2048}):
+                for seeked_item_id in range(21):
+                    expected = sorted((finding_player, location_id, item_id, receiving_player, item_flags)
+                                      for finding_player, locations in data.items()
+                                      for location_id, (item_id, receiving_player, item_flags) in locations.items()
+                                      if receiving_player in slots and item_id == seeked_item_id)
+                    self.assertEqual(sorted(store.find_item(slots, seeked_item_id)), expected)
+            for slot in range(13):
+                expected = {}
+                for finding_player, locations in data.items():
+                    for location_id, (_, receiving_player, _) in locations.items():
+                        if receiving_player == slot:
+                            expected.setdefault(finding_player, set()).add(location_id)
+                self.assertEqual(store.get_for_player(slot), expected)
+
+        def test_from_buffer(self) -> None:
+            store = self.type.from_buffer(pack_locations(sample_data))
+            self.assertEqual(len(store), len(sample_data))
+            for sender, locations in sample_data.items():
+                self.assertEqual({location: tuple(store[sender][location]) for location in store[sender]}, locations)
+            self.assertEqual(sorted(store.find_item({1, 2}, 99)), [])
+            self.assertEqual(sorted(store.find_item({3, 4}, 99)), [(3, 9, 99, 4, 0), (4, 9, 99, 3, 0)])
+            self.assertEqual(store.get_for_player(2), {1: {11, 12}, 2: {21}})
+
+        def test_from_buffer_no_locations_for_1(self) -> None:
+            store = self.type.from_buffer(pack_locations({
+                1: {},
+                2: {1: (1, 2, 3)},
+            }))
+            self.assertEqual(len(store), 2)
+            self.assertEqual(len(store[1]), 0)
+            self.assertEqual(len(store[2]), 1)
+
+        def test_from_buffer_invalid(self) -> None:
+            with self.assertRaises(ValueError):
+                self.type.from_buffer(b"")
+            with self.assertRaises(ValueError):
+                self.type.from_buffer(pack_locations(sample_data)[:-8])
+
         def test_no_locations_for_1(self) -> None:
             store = self.type({
                 1: {},
@@ -293,6 +357,18 @@ class TestSpeedupsLocationStoreConstructor(Base.TestLocationStoreConstructor):
                 1 << 32: {1: (1, 1, 1)},
             })
 
+    def test_from_buffer_unsorted(self) -> None:
+        from array import array
+        table = array("q", (1, 2, 1, 1, 2, 1, 1, 1, 1, 1, 0, 0))  # locations 2 and 1 of player 1
+        if sys.byteorder != "little":
+            table.byteswap()
+        with self.assertRaises(ValueError):
+            self.type.from_buffer(table.tobytes())
+
+    def test_from_buffer_receiver0(self) -> None:
+        with self.assertRaises(ValueError):
+            self.type.from_buffer(pack_locations({1: {1: (1, 0, 0)}}))
+
     def test_not_a_tuple(self) -> None:
         with self.assertRaises(Exception):
             self.type({
@@ -0,0 +1,79 @@
+# Tests for the sectioned multidata format of NetUtils.MultiDataSections
+import unittest
+import zlib
+
+from NetUtils import (MultiDataSections, encode_multidata, multidata_format_version, pack_locations,
+                      pop_location_store, unpack_locations)
+from Utils import restricted_dumps
+
+sample_multidata = {
+    "seed_name": "12345",
+    "slot_data": {1: {"goal": 1}, 2: {}},
+    "locations": {
+        1: {11: (21, 2, 7), 12: (22, 2, 0)},
+        2: {21: (11, 1, 0)},
+    },
+    "spheres": [{1: {11}}, {1: {12}, 2: {21}}],
+    "datapackage": {"Test": {"checksum": "abc", "version": 0}},
+}
+
+
+class TestMultiDataSections(unittest.TestCase):
+    def setUp(self) -> None:
+        self.data = encode_multidata(sample_multidata)
+        self.multidata = MultiDataSections(self.data)
+
+    def test_format_version(self) -> None:
+        self.assertEqual(self.data[0], multidata_format_version)
+        with self.assertRaises(ValueError):
+            MultiDataSections(bytes([3]) + zlib.compress(restricted_dumps(sample_multidata)))
+
+    def test_sections(self) -> None:
+        self.assertEqual(list(self.multidata), list(sample_multidata))
+        self.assertEqual(dict(self.multidata), sample_multidata)
+        self.assertIn("spheres", self.multidata)
+        self.assertNotIn("checks_in_area", self.multidata)
+        self.assertEqual(self.multidata.get("checks_in_area", {}), {})
+
+    def test_lazy(self) -> None:
+        """Only the sections that are accessed get decoded."""
+        self.assertEqual(self.multidata["seed_name"], "12345")
+        self.assertIs(self.multidata["slot_data"], self.multidata["slot_data"])
+        self.assertEqual(set(self.multidata._decoded), {"seed_name", "slot_data"})
+
+    def test_truncated(self) -> None:
+        with self.assertRaises(ValueError):
+            MultiDataSections(self.data[:-1])
+
+    def test_reencode(self) -> None:
+        """Sections that were not accessed are copied as is, changes to accessed sections are written."""
+        self.assertEqual(encode_multidata(self.multidata), self.data)
+        self.multidata["datapackage"]["Test"]["version"] = 1
+        del self.multidata["spheres"]
+        self.multidata["race_mode"] = 1
+        reencoded = MultiDataSections(encode_multidata(self.multidata))
+        self.assertEqual(list(reencoded), ["seed_name", "slot_data", "locations", "datapackage", "race_mode"])
+        self.assertEqual(reencoded["datapackage"], {"Test": {"checksum": "abc", "version": 1}})
+        self.assertEqual(reencoded["locations"], sample_multidata["locations"])
+        self.assertEqual(reencoded["race_mode"], 1)
+
+    def test_pop_location_store(self) -> None:
+        for multidata in (self.multidata, MultiDataSections(self.data), dict(sample_multidata)):
+            if multidata is self.multidata:
+                _ = multidata["locations"]  # already decoded
+            store = pop_location_store(multidata)
+            self.assertNotIn("locations", multidata)
+            self.assertEqual(len(store), 2)
+            self.assertEqual(tuple(store[1][11]), (21, 2, 7))
+            self.assertEqual(sorted(store.find_item({1}, 11)), [(2, 21, 11, 1, 0)])
+
+    def test_locations_round_trip(self) -> None:
+        for locations in (
+            sample_multidata["locations"],
+            {1: {}, 2: {21: (11, 1, 0)}, 3: {}},
+            {2: {21: (11, 5, 0)}, 5: {51: (21, 2, 1), 52: (22, 5, 0)}},
+        ):
+            with self.subTest(locations=locations):
+                unpacked = unpack_locations(pack_locations(locations))
+                self.assertEqual(unpacked, locations)
+                self.assertEqual(list(unpacked), list(locations))
@@ -1,9 +1,13 @@
 # Tests for Generate.py (ArchipelagoGenerate.exe)
 
+import json
 import unittest
+import unittest.mock
+import multiprocessing
 import os
 import os.path
 import sys
+import zipfile
 
 from pathlib import Path
 from tempfile import TemporaryDirectory
@@ -93,6 +97,147 @@ class TestGenerateMain(unittest.TestCase):
 
         self.assertOutput(self.output_tempdir.name)
 
+    def test_generate_profile_report(self):
+        sys.argv = [sys.argv[0], '--seed', '0',
+                    '--player_files_path', str(self.abs_input_dir),
+                    '--outputpath', self.output_tempdir.name,
+                    '--profile_report']
+        multiworld = Main.main(*Generate.main())
+
+        self.assertOutput(self.output_tempdir.name)
+        report_base = Path(self.output_tempdir.name) / f"AP_{multiworld.seed_name}_Profile"
+        with open(report_base.with_suffix(".json"), encoding="utf-8") as f:
+            report = json.load(f)
+        self.assertEqual(report["seed_name"], multiworld.seed_name)
+        self.assertEqual([player["name"] for player in report["players"]], list(multiworld.player_name.values()))
+        self.assertGreater(report["sweeps"], 0)
+        self.assertGreater(report["location_rule_evaluations"], 0)
+        steps = {timing["step"] for timing in report["timings"]}
+        for step in ("create_regions", "call_all", "fill_restrictive", "fulfills_accessibility", "playthrough"):
+            self.assertIn(step, steps)
+        self.assertTrue(report_base.with_suffix(".csv").exists())
+
+    @unittest.skipUnless("fork" in multiprocessing.get_all_start_methods(), "requires forking processes")
+    def test_generate_output_processes(self):
+        from settings import get_settings
+        from worlds.AutoWorld import AutoWorldRegister
+
+        def generate_output(world, output_directory: str) -> None:
+            with open(os.path.join(output_directory, f"Process{world.player}.txt"), "w") as f:
+                f.write(str(os.getpid()))
+
+        world_type = AutoWorldRegister.world_types["APQuest"]
+        settings = get_settings()
+        output_processes_backup = settings.generator.output_processes
+        settings.generator.output_processes = settings.generator.OutputProcesses(2)
+        try:
+            with unittest.mock.patch.object(world_type, "generate_output", generate_output, create=True), \
+                    unittest.mock.patch.object(world_type, "process_safe_output", True, create=True):
+                sys.argv = [sys.argv[0], '--seed', '0',
+                            '--player_files_path', str(self.abs_input_dir),
+                            '--outputpath', self.output_tempdir.name]
+                Main.main(*Generate.main())
+        finally:
+            settings.generator.output_processes = output_processes_backup
+
+        self.assertOutput(self.output_tempdir.name)
+        with zipfile.ZipFile(next(Path(self.output_tempdir.name).glob("*.zip"))) as zf:
+            self.assertNotEqual(str(os.getpid()), zf.read("Process1.txt").decode())
+        self.assertIsNone(Main._output_multiworld)
+
+    @unittest.skipUnless("fork" in multiprocessing.get_all_start_methods(), "requires forking processes")
+    def test_generate_output_processes_same_output(self):
+        """Test that a world's output files are the same when generated in a process instead of a thread."""
+        import io
+        from settings import get_settings
+
+        settings = get_settings()
+        output_processes_backup = settings.generator.output_processes
+        patches = []
+        with TemporaryDirectory() as player_files_path:
+            with open(os.path.join(player_files_path, "Emerald.yaml"), "w") as f:
+                f.write("name: Player1\ngame: Pokemon Emerald\nPokemon Emerald: {}\n")
+            try:
+                for output_processes in (0, 2):
+                    settings.generator.output_processes = settings.generator.OutputProcesses(output_processes)
+                    with TemporaryDirectory() as output_path, \
+                            unittest.mock.patch.object(Main, "_output_process_pool",
+                                                       wraps=Main._output_process_pool) as process_pool:
+                        sys.argv = [sys.argv[0], '--seed', '0',
+                                    '--player_files_path', player_files_path,
+                                    '--outputpath', output_path]
+                        Main.main(*Generate.main())
+                        self.assertEqual(output_processes > 0, process_pool.called)
+                        with zipfile.ZipFile(next(Path(output_path).glob("*.zip"))) as zf:
+                            patch_name = next(name for name in zf.namelist() if name.endswith(".apemerald"))
+                            with zipfile.ZipFile(io.BytesIO(zf.read(patch_name))) as patch:
+                                patches.append({name: patch.read(name) for name in patch.namelist()})
+            finally:
+                settings.generator.output_processes = output_processes_backup
+
+        self.assertEqual(patches[0].keys(), patches[1].keys())
+        for name in patches[0]:
+            self.assertEqual(patches[0][name], patches[1][name], name)
+
+    def test_generate_output_processes_without_fork(self):
+        """Test that output is generated in threads with a warning where processes can't be forked."""
+        from settings import get_settings
+
+        settings = get_settings()
+        output_processes_backup = settings.generator.output_processes
+        settings.generator.output_processes = settings.generator.OutputProcesses(2)
+        try:
+            with unittest.mock.patch.object(Main.multiprocessing, "get_all_start_methods", return_value=["spawn"]), \
+                    unittest.mock.patch.object(Main, "_output_process_pool") as process_pool, \
+                    self.assertLogs(level="WARNING") as logs:
+                sys.argv = [sys.argv[0], '--seed', '0',
+                            '--player_files_path', str(self.abs_input_dir),
+                            '--outputpath', self.output_tempdir.name]
+                Main.main(*Generate.main())
+        finally:
+            settings.generator.output_processes = output_processes_backup
+
+        self.assertOutput(self.output_tempdir.name)
+        process_pool.assert_not_called()
+        self.assertTrue(any("output_processes" in message for message in logs.output))
+
+    def test_generate_batch(self):
+        base_argv = ['--player_files_path', str(self.abs_input_dir), '--outputpath', self.output_tempdir.name]
+        jobs = ["# comment", "--seed 1", "", "--seed 2 --not_an_option", "--seed 3"]
+        results = Generate.run_batch(jobs, base_argv)
+
+        self.assertEqual([2, 4, 5], [result.line for result in results])
+        self.assertEqual([1, None, 3], [result.seed for result in results])
+        self.assertIsNone(results[0].error)
+        self.assertIsNotNone(results[1].error)
+        self.assertEqual({f"AP_{results[0].seed_name}.zip", f"AP_{results[2].seed_name}.zip"},
+                         {path.name for path in Path(self.output_tempdir.name).glob("*.zip")})
+
+    def test_generate_checkpoint_resume(self):
+        sys.argv = [sys.argv[0], '--seed', '0',
+                    '--player_files_path', str(self.abs_input_dir),
+                    '--outputpath', self.output_tempdir.name,
+                    '--checkpoint']
+        multiworld = Main.main(*Generate.main())
+        placements = {(location.player, location.name): (location.item.player, location.item.name)
+                      for location in multiworld.get_filled_locations()}
+        checkpoint_path = Path(self.output_tempdir.name) / f"AP_{multiworld.seed_name}_Checkpoint.apcheckpoint"
+        self.assertTrue(checkpoint_path.exists())
+        del multiworld
+
+        sys.argv = [sys.argv[0],
+                    '--player_files_path', str(self.abs_input_dir),
+                    '--outputpath', self.output_tempdir.name,
+                    '--resume', str(checkpoint_path)]
+        with unittest.mock.patch.object(Main, "distribute_items_restrictive",
+                                        side_effect=AssertionError("fill was not restored")):
+            multiworld = Main.main(*Generate.main())
+
+        self.assertOutput(self.output_tempdir.name)
+        self.assertEqual(0, multiworld.seed)
+        self.assertEqual(placements, {(location.player, location.name): (location.item.player, location.item.name)
+                                      for location in multiworld.get_filled_locations()})
+
 
 class TestGenerateWeights(TestGenerateMain):
     """Tests Generate.py using a weighted file to generate for multiple players."""
@@ -108,6 +253,12 @@ class TestGenerateWeights(TestGenerateMain):
     # don't need to run these tests
     test_generate_absolute = None
     test_generate_relative = None
+    test_generate_output_processes = None
+    test_generate_output_processes_same_output = None
+    test_generate_output_processes_without_fork = None
+    test_generate_profile_report = None
+    test_generate_checkpoint_resume = None
+    test_generate_batch = None
 
     def test_generate_yaml(self):
         from settings import get_settings
@@ -126,8 +277,8 @@ class TestGenerateWeights(TestGenerateMain):
 
         # there's likely a better way to do this, but hardcode the results from seed 1 to ensure they're always this
         expected_results = {
-            "accessibility": [0, 2, 0, 2, 2],
-            "progression_balancing": [0, 50, 99, 0, 50],
+            "accessibility": [0, 0, 0, 2, 2],
+            "progression_balancing": [0, 99, 0, 99, 0],
         }
 
         self.assertEqual(seed, 1)
@@ -137,3 +288,62 @@ class TestGenerateWeights(TestGenerateMain):
                     result, getattr(namespace, option_name)[player].value,
                     "Generated results from weights file did not match expected value."
                 )
+
+    def generate_settings(self, *argv: str) -> dict[str, dict[int, object]]:
+        from settings import get_settings
+        from Utils import user_path, local_path
+        settings = get_settings()
+        settings.generator.player_files_path = settings.generator.PlayerFilesPath(self.yaml_input_dir)
+        settings.generator.players = 5
+        settings._filename = None
+        user_path_backup = user_path.cached_path
+        user_path.cached_path = local_path()
+        try:
+            sys.argv = [sys.argv[0], "--seed", "1", *argv]
+            namespace, seed = Generate.main()
+        finally:
+            user_path.cached_path = user_path_backup
+        return {option_name: {player: option.value for player, option in getattr(namespace, option_name).items()}
+                for option_name in ("accessibility", "progression_balancing")}
+
+    def test_generate_roll_processes(self):
+        """Tests that rolled options do not depend on the amount of processes they are rolled in."""
+        rolled = self.generate_settings("--roll_processes", "0")
+        self.assertEqual(rolled, self.generate_settings("--roll_processes", "1"))
+        self.assertEqual(rolled, self.generate_settings("--roll_processes", "3"))
+        same_rolled = self.generate_settings("--roll_processes", "0", "--sameoptions")
+        self.assertEqual(same_rolled, self.generate_settings("--roll_processes", "1", "--sameoptions"))
+        self.assertEqual(same_rolled, self.generate_settings("--roll_processes", "3", "--sameoptions"))
+
+    def test_weights_cache(self):
+        """Tests that weights of the same content are only parsed once."""
+        with TemporaryDirectory() as cache_dir, \
+                unittest.mock.patch("Utils.cache_path", lambda *path: os.path.join(cache_dir, *path)):
+            weights_path = str(self.abs_input_dir / "weights.yaml")
+            weights = Generate.read_weights_yamls(weights_path)
+            with unittest.mock.patch.object(Generate, "parse_weights_yamls",
+                                            side_effect=AssertionError("weights were parsed again")):
+                self.assertEqual(weights, Generate.read_weights_yamls(weights_path))
+                self.assertEqual([weights], Generate.read_all_weights_yamls([weights_path], 2))
+            self.assertIsNot(weights[0], Generate.read_weights_yamls(weights_path)[0])
+
+    def test_clean_weights_cache(self):
+        """Tests that unused cached weights get removed, but the cache is only scanned once per interval."""
+        with TemporaryDirectory() as cache_dir, \
+                unittest.mock.patch("Utils.cache_path", lambda *path: os.path.join(cache_dir, *path)):
+            os.makedirs(os.path.join(cache_dir, "weights"))
+            unused = [os.path.join(cache_dir, "weights", f"{index}.pickle") for index in range(2)]
+            for path in unused:
+                with open(path, "wb"):
+                    pass
+                os.utime(path, (0, 0))
+
+            Generate.clean_weights_cache()
+            self.assertEqual([os.path.exists(path) for path in unused], [False, False])
+            with open(unused[0], "wb"):
+                pass
+            os.utime(unused[0], (0, 0))
+            Generate.clean_weights_cache()
+            self.assertTrue(os.path.exists(unused[0]))
+            Generate.clean_weights_cache(interval=0)
+            self.assertFalse(os.path.exists(unused[0]))
@@ -1,5 +1,40 @@
+import asyncio
+import json
+import os
+import tempfile
 import unittest
-from MultiServer import Context, ServerCommandProcessor
+import unittest.mock
+
+import websockets
+
+from MultiServer import (Client, Context, SaveJournal, ServerCommandProcessor, process_client_cmd,
+                         register_location_checks)
+from NetUtils import Hint, HintStatus, MultiData, NetworkSlot, SlotType, encode
+from Utils import Version
+
+
+def make_multidata() -> MultiData:
+    """A multidata of two players of a game with ten locations each, sending items to each other."""
+    return {
+        "slot_data": {1: {"option": 1}, 2: {}},
+        "slot_info": {1: NetworkSlot("Player1", "Test", SlotType.player),
+                      2: NetworkSlot("Player2", "Test", SlotType.player)},
+        "connect_names": {"Player1": (0, 1), "Player2": (0, 2)},
+        "locations": {1: {location: (location, 2, 0) for location in range(1, 11)},
+                      2: {location: (location, 1, 0) for location in range(1, 11)}},
+        "checks_in_area": {},
+        "server_options": {},
+        "er_hint_data": {},
+        "precollected_items": {1: [100], 2: []},
+        "precollected_hints": {1: set(), 2: set()},
+        "version": (0, 6, 2),
+        "tags": ["AP"],
+        "minimum_versions": {"server": (0, 0, 0), "clients": {1: (0, 6, 2), 2: (0, 6, 2)}},
+        "seed_name": "12345",
+        "spheres": [],
+        "datapackage": {},
+        "race_mode": 0,
+    }
 
 
 class TestResolvePlayerName(unittest.TestCase):
@@ -38,3 +73,448 @@ class TestResolvePlayerName(unittest.TestCase):
         assert p.resolve_player("ABC") == (1, 2, "abc"), "case insensitive resolves when 1 match"
         assert p.resolve_player("abcd") == (1, 3, "abCD"), "case insensitive resolves when 1 match"
         assert not p.resolve_player("aB"), "partial name shouldn't resolve to player"
+
+
+class TestHintIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        # a Context can only load the game data once per process
+        with unittest.mock.patch.object(Context, "_load_game_data"):
+            self.ctx = Context("", 0, "", "", 0, 0, False)
+        self.hints = [Hint(2, 1, location, location, False) for location in range(10)]
+        self.other_hint = Hint(1, 2, 3, 100, False)
+        for hint in self.hints:
+            self.ctx.hints[0, 1].add(hint)
+            self.ctx.hints[0, 2].add(hint)
+        self.ctx.hints[0, 1].add(self.other_hint)
+        self.ctx.hints[0, 2].add(self.other_hint)
+        self.ctx.reindex_hints()
+
+    def test_get_hint(self) -> None:
+        self.assertEqual(self.hints[3], self.ctx.get_hint(0, 1, 3))
+        self.assertEqual(self.other_hint, self.ctx.get_hint(0, 2, 3))
+        self.assertIsNone(self.ctx.get_hint(0, 1, 10))
+        self.assertIsNone(self.ctx.get_hint(1, 1, 3))
+
+    def test_recheck_locations(self) -> None:
+        """Test that rechecking checked locations only finds their hints, for every slot the hints concern."""
+        self.ctx.location_checks[0, 1] |= {3, 4}
+        changed: set[tuple[int, int]] = set()
+        self.ctx.recheck_hints(0, 1, changed, {3, 4})
+
+        self.assertEqual({(0, 1), (0, 2)}, changed)
+        for slot in (1, 2):
+            found = {(hint.finding_player, hint.location) for hint in self.ctx.hints[0, slot] if hint.found}
+            self.assertEqual({(1, 3), (1, 4)}, found)
+            self.assertTrue(all(hint.status == HintStatus.HINT_FOUND
+                                for hint in self.ctx.hints[0, slot] if hint.found))
+        self.assertTrue(self.ctx.get_hint(0, 1, 3).found)
+        self.assertFalse(self.ctx.get_hint(0, 2, 3).found)
+
+        # the same as a full recheck
+        hints = {key: set(hints) for key, hints in self.ctx.hints.items()}
+        self.ctx.recheck_hints()
+        self.assertEqual(hints, self.ctx.hints)
+
+    def test_replace_hint(self) -> None:
+        new_hint = self.hints[5].re_prioritize(self.ctx, HintStatus.HINT_AVOID)
+        for slot in (1, 2):
+            self.ctx.replace_hint(0, slot, self.hints[5], new_hint)
+        self.assertEqual(HintStatus.HINT_AVOID, self.ctx.get_hint(0, 1, 5).status)
+
+        self.ctx.location_checks[0, 1].add(5)
+        self.ctx.recheck_hints(0, 1, None, {5})
+        self.assertEqual(HintStatus.HINT_FOUND, self.ctx.get_hint(0, 1, 5).status)
+        self.assertNotIn(new_hint, self.ctx.hints[0, 2])
+
+
+class TestSaveJournal(unittest.IsolatedAsyncioTestCase):
+    # changes broadcast to clients, which needs an event loop
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.save_filename = os.path.join(directory.name, "test.apsave")
+
+    def make_context(self, journal: bool = True) -> Context:
+        # a Context can only load the game data once per process
+        with unittest.mock.patch.object(Context, "_load_game_data"):
+            ctx = Context("", 0, "", "", 0, 0, False)
+        ctx._load(make_multidata(), {}, False)
+        ctx.save_filename = self.save_filename
+        with unittest.mock.patch.object(Context, "_start_async_saving"):
+            ctx.init_save(True, journal)
+        return ctx
+
+    def make_changes(self, ctx: Context, locations: range) -> None:
+        register_location_checks(ctx, 0, 1, locations)
+        ctx.notify_hints(0, [Hint(1, 2, location, location, False) for location in locations])
+        ctx.stored_data[f"key{locations.start}"] = list(locations)
+        ctx.save_journal.add_stored_data(f"key{locations.start}")
+        ctx.name_aliases[0, 2] = f"alias{locations.start}"
+
+    def assertSameSave(self, first: Context, second: Context) -> None:
+        first_save = first.get_save()
+        second_save = second.get_save()
+        self.assertEqual(first_save.keys(), second_save.keys())
+        for key in first_save:
+            self.assertEqual(first_save[key], second_save[key], key)
+
+    async def test_replay(self) -> None:
+        """Test that changes get appended to the journal and replayed when loading."""
+        ctx = self.make_context()
+        self.assertTrue(ctx._save())  # starts with a full save
+        save_modified = os.stat(self.save_filename).st_mtime_ns
+        for start in (1, 4):
+            self.make_changes(ctx, range(start, start + 3))
+            self.assertTrue(ctx._save())
+        self.assertEqual(save_modified, os.stat(self.save_filename).st_mtime_ns)
+        self.assertEqual(2, len(SaveJournal.read_file(open(ctx.journal_filename, "rb").read())[1]))
+
+        loaded = self.make_context()
+        self.assertSameSave(ctx, loaded)
+        self.assertEqual(set(range(1, 7)), loaded.location_checks[0, 1])
+        self.assertEqual(6, len(loaded.received_items[0, 2, True]))
+        self.assertEqual("alias4", loaded.name_aliases[0, 2])
+        self.assertFalse(loaded.save_journal.should_compact())
+
+    async def test_compaction(self) -> None:
+        """Test that the journal gets written into a new full save once it is larger than the save."""
+        ctx = self.make_context()
+        ctx._save()
+        self.make_changes(ctx, range(1, 4))
+        ctx._save()
+        ctx.save_journal.save_size = 0
+        self.make_changes(ctx, range(4, 7))
+        ctx._save()
+        journal_id, entries, complete = SaveJournal.read_file(open(ctx.journal_filename, "rb").read())
+        self.assertEqual([], entries)
+        self.assertEqual(ctx.save_journal.journal_id, journal_id)
+        self.assertSameSave(ctx, self.make_context())
+
+        # without journal, the save is read as usual
+        self.assertSameSave(ctx, self.make_context(journal=False))
+
+    async def test_replay_without_journal(self) -> None:
+        """Test that the journal of a save is replayed when loading it without journaled saving."""
+        ctx = self.make_context()
+        ctx._save()
+        self.make_changes(ctx, range(1, 4))
+        ctx._save()
+
+        loaded = self.make_context(journal=False)
+        self.assertSameSave(ctx, loaded)
+        self.assertIsNone(loaded.save_journal)
+        loaded._save()
+        self.assertSameSave(ctx, self.make_context())
+
+    async def test_incomplete_entry(self) -> None:
+        """Test that an entry cut off by a crash is ignored and leads to a full save next time."""
+        ctx = self.make_context()
+        ctx._save()
+        self.make_changes(ctx, range(1, 4))
+        ctx._save()
+        expected = self.make_context()
+        with open(ctx.journal_filename, "ab") as f:
+            f.write(SaveJournal.entry_header.pack(100) + b"cut off")
+
+        loaded = self.make_context()
+        self.assertSameSave(expected, loaded)
+        self.assertTrue(loaded.save_journal.should_compact())
+
+    async def test_other_journal(self) -> None:
+        """Test that a journal of another save is not applied."""
+        ctx = self.make_context()
+        ctx._save()
+        self.make_changes(ctx, range(1, 4))
+        ctx._save()
+        with open(ctx.journal_filename, "r+b") as f:
+            f.write(SaveJournal.file_header.pack(ctx.save_journal.journal_id + 1))
+
+        loaded = self.make_context()
+        self.assertEqual(set(), loaded.location_checks[0, 1])
+        self.assertTrue(loaded.save_journal.should_compact())
+
+
+class ClientTestCase(unittest.IsolatedAsyncioTestCase):
+    """Base for tests of the messages sent to clients of a Context with the test multidata."""
+    def setUp(self) -> None:
+        # a Context can only load the game data once per process
+        with unittest.mock.patch.object(Context, "_load_game_data"):
+            self.ctx = Context("", 0, "", "", 0, 0, False)
+        self.ctx._load(make_multidata(), {}, False)
+
+    def make_client(self) -> Client:
+        socket = unittest.mock.Mock(open=True, extensions=[], send=unittest.mock.AsyncMock())
+        client = Client(socket, self.ctx)
+        self.ctx.endpoints.append(client)
+        return client
+
+    async def connect(self, client: Client, name: str = "Player1") -> None:
+        await process_client_cmd(self.ctx, client, {
+            "cmd": "Connect", "password": None, "game": "Test", "name": name, "uuid": "uuid",
+            "version": Version(0, 6, 2), "tags": [], "items_handling": 0b111,
+        })
+        await self.flush(client)
+
+    @staticmethod
+    async def flush(client: Client) -> None:
+        """Wait until the messages queued for a client are sent."""
+        await asyncio.sleep(0)
+        if client.sender:
+            await client.sender
+
+    def get_sent(self, client: Client, cmd: str) -> list[dict]:
+        return [msg for call in client.socket.send.await_args_list
+                for msg in json.loads(call.args[0]) if msg["cmd"] == cmd]
+
+    async def asyncTearDown(self) -> None:
+        for client in self.ctx.endpoints:
+            await self.flush(client)
+
+
+class TestEncodedMessages(ClientTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.ctx.gamespackage = {"Test": {"item_name_to_id": {"Item": 1}, "location_name_to_id": {"Location": 1},
+                                          "checksum": "0"}}
+
+    async def test_connected(self) -> None:
+        """Test that the Connected and ReceivedItems messages are the same as without encoded parts."""
+        register_location_checks(self.ctx, 0, 2, [1, 2])
+        client = self.make_client()
+        await self.connect(client)
+
+        expected = json.loads(encode([{
+            "cmd": "Connected",
+            "team": 0, "slot": 1,
+            "players": self.ctx.get_players_package(),
+            "missing_locations": list(range(1, 11)),
+            "checked_locations": [],
+            "slot_info": self.ctx.slot_info,
+            "hint_points": 0,
+            "slot_data": {"option": 1},
+        }, {
+            "cmd": "ReceivedItems", "index": 0,
+            "items": self.ctx.start_inventory[1] + self.ctx.received_items[0, 1, True],
+        }]))
+        self.assertEqual(expected[:1], self.get_sent(client, "Connected"))
+        self.assertEqual(expected[1:], self.get_sent(client, "ReceivedItems"))
+        self.assertEqual(3, client.send_index)
+
+    async def test_items_cache(self) -> None:
+        """Test that items received after the items got encoded are added to the cached encoding."""
+        client = self.make_client()
+        await self.connect(client)
+        register_location_checks(self.ctx, 0, 2, [1, 2])
+        self.ctx.encode_received_items(client)
+        register_location_checks(self.ctx, 0, 2, [3])
+        await process_client_cmd(self.ctx, client, {"cmd": "Sync"})
+        await asyncio.sleep(0)
+
+        items = self.get_sent(client, "ReceivedItems")[-1]["items"]
+        self.assertEqual([100, 1, 2, 3], [item["item"] for item in items])
+
+        # replaced lists, like by loading a save, are encoded again
+        self.ctx.received_items[0, 1, True] = self.ctx.received_items[0, 1, True][:1]
+        await process_client_cmd(self.ctx, client, {"cmd": "Sync"})
+        await asyncio.sleep(0)
+        items = self.get_sent(client, "ReceivedItems")[-1]["items"]
+        self.assertEqual([100, 1], [item["item"] for item in items])
+
+    async def test_alias(self) -> None:
+        """Test that the cached players package changes with aliases."""
+        client = self.make_client()
+        await self.connect(client)
+        self.ctx.name_aliases[0, 2] = "Alias"
+        await self.connect(client)
+
+        players = self.get_sent(client, "Connected")[-1]["players"]
+        self.assertEqual("Alias (Player2)", players[1]["alias"])
+
+    async def test_data_package(self) -> None:
+        client = self.make_client()
+        await process_client_cmd(self.ctx, client, {"cmd": "GetDataPackage", "games": ["Test", "Other"]})
+        await process_client_cmd(self.ctx, client, {"cmd": "GetDataPackage"})
+
+        expected = json.loads(encode({"games": self.ctx.gamespackage}))
+        self.assertEqual([expected, expected], [msg["data"] for msg in self.get_sent(client, "DataPackage")])
+
+
+class TestOutbox(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        # a Context can only load the game data once per process
+        with unittest.mock.patch.object(Context, "_load_game_data"):
+            self.ctx = Context("", 0, "", "", 0, 0, False)
+        self.sending = asyncio.Event()
+        self.sending.set()
+        socket = unittest.mock.Mock(open=True, send=unittest.mock.AsyncMock(side_effect=self.send),
+                                    close=unittest.mock.AsyncMock())
+        self.client = Client(socket, self.ctx)
+        self.ctx.endpoints.append(self.client)
+
+    async def send(self, frame: str) -> None:
+        await self.sending.wait()
+
+    def get_frames(self) -> list[list[dict]]:
+        return [json.loads(call.args[0]) for call in self.client.socket.send.await_args_list]
+
+    async def test_coalesce(self) -> None:
+        """Test that messages queued within one iteration of the event loop are sent in one frame."""
+        for index in range(3):
+            self.ctx.queue_encoded_msgs(self.client, encode([{"cmd": "Test", "index": index}]))
+        self.assertTrue(await self.ctx.send_msgs(self.client, [{"cmd": "Test", "index": 3}, {"cmd": "Test"}]))
+
+        self.assertEqual([[{"cmd": "Test", "index": index} for index in range(4)] + [{"cmd": "Test"}]],
+                         self.get_frames())
+        self.assertEqual([], self.client.outbox)
+        self.assertIsNone(self.client.sender)
+
+    async def test_frame_size(self) -> None:
+        self.ctx.max_frame_size = 60  # two messages per frame
+        for index in range(5):
+            self.ctx.queue_encoded_msgs(self.client, encode([{"cmd": "Test", "index": index}]))
+        self.assertTrue(await self.ctx.send_encoded_msgs(self.client, "[]"))
+
+        frames = self.get_frames()
+        self.assertEqual(3, len(frames))
+        self.assertEqual(list(range(5)), [msg["index"] for frame in frames for msg in frame])
+
+    async def test_empty(self) -> None:
+        """Test that sending no messages succeeds without sending anything."""
+        self.assertTrue(await self.ctx.send_msgs(self.client, []))
+        self.assertTrue(await self.ctx.send_encoded_msgs(self.client, "[]"))
+        self.assertIsNone(self.client.sender)
+        self.assertEqual([], self.get_frames())
+        self.client.socket.open = False
+        self.assertFalse(await self.ctx.send_msgs(self.client, []))
+
+    async def test_slow_client(self) -> None:
+        """Test that messages queued while a frame is being sent are sent together after it."""
+        self.sending.clear()
+        sent = asyncio.create_task(self.ctx.send_msgs(self.client, [{"cmd": "Test", "index": 0}]))
+        while not self.client.socket.send.called:
+            await asyncio.sleep(0)
+        for index in range(1, 4):
+            self.ctx.broadcast([self.client], [{"cmd": "Test", "index": index}])
+        self.assertFalse(sent.done())
+        self.sending.set()
+        self.assertTrue(await sent)
+        if self.client.sender:
+            await self.client.sender
+
+        self.assertEqual([[0], [1, 2, 3]], [[msg["index"] for msg in frame] for frame in self.get_frames()])
+
+    async def test_outbox_size(self) -> None:
+        """Test that clients with too many messages waiting for them get disconnected."""
+        self.ctx.max_outbox_size = 100
+        self.sending.clear()
+        self.ctx.queue_encoded_msgs(self.client, encode([{"cmd": "Test", "index": 0}]))
+        await asyncio.sleep(0)
+        for index in range(1, 10):
+            # only warns once
+            with self.assertLogs(self.ctx.logger) if index == 4 else self.assertNoLogs(self.ctx.logger):
+                self.assertEqual(index < 4, self.ctx.queue_encoded_msgs(
+                    self.client, encode([{"cmd": "Test", "index": index}])))
+        await asyncio.sleep(0)
+        self.client.socket.close.assert_awaited_once()
+        self.sending.set()
+
+    async def test_closed(self) -> None:
+        self.client.socket.send.side_effect = websockets.ConnectionClosed(None, None)
+        with self.assertLogs(self.ctx.logger):
+            self.assertFalse(await self.ctx.send_msgs(self.client, [{"cmd": "Test"}]))
+        self.assertNotIn(self.client, self.ctx.endpoints)
+        self.client.socket.open = False
+        self.assertFalse(self.ctx.queue_encoded_msgs(self.client, encode([{"cmd": "Test"}])))
+
+
+class TestDataStorage(ClientTestCase):
+    async def asyncSetUp(self) -> None:
+        self.client = self.make_client()
+        self.other_client = self.make_client()
+        await self.connect(self.client)
+        await self.connect(self.other_client, "Player2")
+        self.client.socket.send.reset_mock()
+        self.other_client.socket.send.reset_mock()
+
+    async def process(self, client: Client, args: dict) -> None:
+        with unittest.mock.patch.object(self.ctx, "save") as save:
+            await process_client_cmd(self.ctx, client, args)
+        self.saves = save.call_count
+        await self.flush(client)
+
+    async def test_set(self) -> None:
+        await self.process(self.client, {"cmd": "Set", "key": "counter", "default": 1, "want_reply": True,
+                                         "operations": [{"operation": "add", "value": 2},
+                                                        {"operation": "floor"}]})
+        self.assertEqual(3, self.ctx.stored_data["counter"])
+        reply = self.get_sent(self.client, "SetReply")
+        self.assertEqual([{"cmd": "SetReply", "key": "counter", "default": 1, "want_reply": True,
+                           "operations": [{"operation": "add", "value": 2}, {"operation": "floor"}],
+                           "original_value": 1, "value": 3, "slot": 1}], reply)
+        self.assertEqual({"counter": 1}, self.ctx.stored_data_sizes)
+
+    async def test_bulk_set(self) -> None:
+        """Test that a Set with multiple sets applies all of them and notifies each subscriber once."""
+        self.ctx.set_stored_data("list", [1])
+        await self.process(self.other_client, {"cmd": "SetNotify", "prefixes": ["test_"], "keys": ["list"]})
+        await self.process(self.client, {"cmd": "Set", "tag": "bulk", "sets": [
+            {"key": "test_b", "operations": [{"operation": "replace", "value": "b"}]},
+            {"key": "test_a", "default": 1, "operations": [{"operation": "add", "value": 1}]},
+            {"key": "list", "operations": [{"operation": "update", "value": [1, 2]}], "want_reply": True},
+            {"key": "test_a", "operations": [{"operation": "mul", "value": 3}]},
+        ]})
+
+        self.assertEqual({"list": [1, 2], "test_a": 6, "test_b": "b"}, self.ctx.stored_data)
+        self.assertEqual(["list", "test_a", "test_b"], self.ctx.stored_data_keys)
+        self.assertEqual(1, self.saves)
+        frames = self.other_client.socket.send.await_args_list
+        self.assertEqual(1, len(frames))
+        replies = json.loads(frames[0].args[0])
+        self.assertEqual([("test_b", 0, "b"), ("test_a", 1, 2), ("list", [1], [1, 2]), ("test_a", 2, 6)],
+                         [(reply["key"], reply["original_value"], reply["value"]) for reply in replies])
+        self.assertTrue(all(reply["tag"] == "bulk" for reply in replies))
+        self.assertEqual([("list", [1, 2])], [(reply["key"], reply["value"])
+                                             for reply in self.get_sent(self.client, "SetReply")])
+
+    async def test_bulk_set_atomic(self) -> None:
+        """Test that nothing is set if an operation of a bulk Set fails."""
+        self.ctx.set_stored_data("list", [1])
+        await self.process(self.client, {"cmd": "Set", "sets": [
+            {"key": "list", "operations": [{"operation": "update", "value": [2]}]},
+            {"key": "number", "default": 1, "operations": [{"operation": "add", "value": "text"}]},
+        ]})
+        self.assertEqual({"list": [1]}, self.ctx.stored_data)
+        self.assertEqual(0, self.saves)
+        self.assertEqual(["arguments"], [msg["type"] for msg in self.get_sent(self.client, "InvalidPacket")])
+
+        await self.process(self.client, {"cmd": "Set", "sets": [
+            {"key": "list", "operations": [{"operation": "update", "value": [2]}]},
+            {"key": "_read_race_mode", "operations": [{"operation": "replace", "value": 1}]},
+        ]})
+        self.assertEqual({"list": [1]}, self.ctx.stored_data)
+        self.assertEqual(2, len(self.get_sent(self.client, "InvalidPacket")))
+
+    async def test_get_prefixes(self) -> None:
+        for key in ("a", "test", "test_1", "test_2", "tesu"):
+            self.ctx.set_stored_data(key, key)
+        await self.process(self.client, {"cmd": "Get", "keys": ["a", "missing"], "prefixes": ["test_", "z"]})
+        self.assertEqual([{"a": "a", "missing": None, "test_1": "test_1", "test_2": "test_2"}],
+                         [msg["keys"] for msg in self.get_sent(self.client, "Retrieved")])
+
+        await self.process(self.client, {"cmd": "Get", "prefixes": ["tes"]})
+        self.assertEqual({"test", "test_1", "test_2", "tesu"}, set(self.get_sent(self.client, "Retrieved")[-1]["keys"]))
+
+        await self.process(self.client, {"cmd": "Get", "prefixes": [1]})
+        self.assertEqual(1, len(self.get_sent(self.client, "InvalidPacket")))
+
+    async def test_index_save(self) -> None:
+        """Test that the keys and sizes of the data storage of a loaded save are indexed."""
+        self.ctx.set_stored_data("b", [1, 2, 3])
+        self.ctx.set_stored_data("a", "text")
+        save = self.ctx.get_save()
+        self.ctx.stored_data = {}
+        self.ctx.index_stored_data()
+        self.ctx.set_save(save)
+        self.assertEqual(["a", "b"], self.ctx.stored_data_keys)
+        self.assertEqual({"a": 6, "b": 7}, self.ctx.stored_data_sizes)
+        self.assertEqual(["b"], self.ctx.get_stored_data_keys("b"))
@@ -0,0 +1,137 @@
+import asyncio
+import threading
+import unittest
+import unittest.mock
+from uuid import uuid4
+
+from WebHostLib import dispatch
+from . import TestBase
+
+
+class TestNotifier(unittest.TestCase):
+    def test_wait(self) -> None:
+        """Test that waiting returns what got notified since the last wait, and None if nothing was."""
+        notifier: dispatch.Notifier[int] = dispatch.Notifier()
+        self.assertIsNone(notifier.wait(0))
+        notifier.notify(1)
+        notifier.notify(2)
+        notifier.notify()
+        self.assertEqual({1, 2}, notifier.wait(0))
+        self.assertIsNone(notifier.wait(0))
+        notifier.notify()
+        self.assertEqual(set(), notifier.wait(0))
+
+    def test_wake(self) -> None:
+        """Test that a notification wakes a waiting thread."""
+        notifier: dispatch.Notifier[int] = dispatch.Notifier()
+        result = []
+        thread = threading.Thread(target=lambda: result.append(notifier.wait(10)))
+        thread.start()
+        notifier.notify(1)
+        thread.join(5)
+        self.assertEqual([{1}], result)
+
+
+class TestDispatchRoutes(TestBase):
+    def setUp(self) -> None:
+        from pony.orm import db_session
+        from WebHostLib.models import Room, Seed
+
+        super().setUp()
+        dispatch.rooms.wait(0)  # forget notifications of other tests
+        with self.client.session_transaction() as session:
+            session["_id"] = uuid4()
+            with db_session:
+                self.room_id = Room(seed=Seed(multidata=b"", owner=session["_id"]), owner=session["_id"]).id
+
+    def test_command_notifies_room(self) -> None:
+        """Test that posting a command notifies of its room once it is in the database."""
+        from flask import url_for
+        from pony.orm import db_session, select
+        from WebHostLib.models import Command
+
+        with self.app.app_context(), self.app.test_request_context():
+            url = url_for("host_room_command", room=self.room_id)
+        self.client.post(url, data={"cmd": "/help"})
+        self.assertEqual({self.room_id}, dispatch.rooms.wait(0))
+        with db_session:
+            self.assertEqual(["/help"], list(select(command.commandtext for command in Command)))
+
+    def test_room_page_notifies_room(self) -> None:
+        """Test that opening the page of an inactive room notifies of it once its activity is in the database."""
+        import datetime
+        from flask import url_for
+        from pony.orm import db_session
+        from Utils import utcnow
+        from WebHostLib.models import Room
+
+        with db_session:
+            Room.get(id=self.room_id).last_activity -= datetime.timedelta(days=1)
+        with self.app.app_context(), self.app.test_request_context():
+            url = url_for("host_room", room=self.room_id)
+        response = self.client.get(url)
+        response.close()
+        self.assertEqual({self.room_id}, dispatch.rooms.wait(0))
+        with db_session:
+            self.assertGreater(Room.get(id=self.room_id).last_activity,
+                               utcnow() - datetime.timedelta(minutes=1))
+        self.client.get(url).close()
+        self.assertIsNone(dispatch.rooms.wait(0))
+
+    def test_job_poll_interval(self) -> None:
+        """Test that the database is checked for jobs rarely when the website of the process notifies of them."""
+        from WebHostLib.autolauncher import get_job_poll_interval
+
+        config = {"SELFHOST": True, "JOB_POLL_INTERVAL": 0.1, "NOTIFIED_JOB_POLL_INTERVAL": 5}
+        self.assertEqual(5, get_job_poll_interval(config))
+        self.assertEqual(0.1, get_job_poll_interval({**config, "SELFHOST": False}))
+
+    def test_take_commands(self) -> None:
+        """Test that the commands of rooms are taken from the database in the order they were queued."""
+        from pony.orm import db_session, select
+        from WebHostLib.customserver import DBCommandListener
+        from WebHostLib.models import Command, Room, Seed
+
+        with db_session:
+            room = Room.get(id=self.room_id)
+            other_room = Room(seed=Seed(multidata=b"", owner=room.owner), owner=room.owner)
+            Command(room=room, commandtext="/first")
+            Command(room=other_room, commandtext="/other")
+            Command(room=room, commandtext="/second")
+            other_room_id = other_room.id
+
+        self.assertEqual([(self.room_id, "/first"), (self.room_id, "/second")],
+                         DBCommandListener._take_commands((self.room_id,)))
+        self.assertEqual([], DBCommandListener._take_commands((self.room_id,)))
+        with db_session:
+            self.assertEqual([other_room_id], list(select(command.room.id for command in Command)))
+
+
+class TestDBCommandListener(unittest.TestCase):
+    def test_notify(self) -> None:
+        """Test that a notified room runs its commands right away, and other rooms wait for the next poll."""
+        from WebHostLib.customserver import DBCommandListener
+
+        async def run() -> None:
+            listener = DBCommandListener(asyncio.get_running_loop(), 60)
+            ran: list[str] = []
+            listener.processors = {"room": ran.append, "other room": ran.append}  # type: ignore
+            queried = []
+
+            def take_commands(room_ids):
+                queried.append(set(room_ids))
+                return [(room_id, f"command of {room_id}") for room_id in room_ids]
+
+            with unittest.mock.patch.object(listener, "_take_commands", take_commands):
+                task = asyncio.create_task(listener.run())
+                listener.notify("room")
+                listener.notify("stopped room")
+                for _ in range(100):
+                    await asyncio.sleep(0.01)
+                    if ran:
+                        break
+                task.cancel()
+            self.assertEqual([{"room"}], queried)
+            self.assertEqual(["command of room"], ran)
+
+        asyncio.run(run())
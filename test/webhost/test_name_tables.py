@@ -0,0 +1,116 @@
+import os
+import tempfile
+import unittest
+import unittest.mock
+
+from WebHostLib.name_tables import NameLookup, name_tables_max_age, open_name_tables, write_name_tables
+
+
+class TestNameTables(unittest.TestCase):
+    gamespackage = {
+        "Archipelago": {
+            "checksum": "a",
+            "item_name_to_id": {"Nothing": -1},
+            "location_name_to_id": {"Cheat Console": -1, "Server": -2},
+        },
+        "Game": {
+            "checksum": "g",
+            "item_name_to_id": {"Sword": 10, "Shield": 2, "Bogen": 7, "Ünicode": 1 << 40},
+            "location_name_to_id": {"Chest": 5},
+        },
+        "Old Game": {
+            "item_name_to_id": {"Key": 1},
+            "location_name_to_id": {},
+        },
+        "Empty": {
+            "checksum": "e",
+            "item_name_to_id": {},
+            "location_name_to_id": {},
+        },
+    }
+    item_name_groups = {"Game": {"Everything": {"Sword", "Shield", "Bogen"}}}
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        cache_path = unittest.mock.patch("Utils.cache_path",
+                                         lambda *path: os.path.join(self.directory.name, *path))
+        cache_path.start()
+        self.addCleanup(self.directory.cleanup)
+        self.addCleanup(cache_path.stop)
+
+    def test_tables(self) -> None:
+        """Test that the tables of each game hold its data package."""
+        tables = open_name_tables(write_name_tables(self.gamespackage, self.item_name_groups, {}))
+        self.assertEqual(set(tables.games), {"Archipelago", "Game", "Empty"})
+        game = tables.get("Game", "g")
+        assert game
+        self.assertEqual(dict(game.item_names), {10: "Sword", 2: "Shield", 7: "Bogen", 1 << 40: "Ünicode"})
+        self.assertEqual(dict(game.location_names), {5: "Chest"})
+        self.assertNotIn(3, game.item_names)
+        self.assertNotIn("10", game.item_names)
+        with self.assertRaises(KeyError):
+            game.item_names[3]
+        self.assertEqual(set(game.all_item_and_group_names), {"Sword", "Shield", "Bogen", "Ünicode", "Everything"})
+        self.assertIn("Everything", game.all_item_and_group_names)
+        self.assertNotIn("Chest", game.all_item_and_group_names)
+        self.assertNotIn(10, game.all_item_and_group_names)
+        self.assertEqual(len(tables.games["Empty"].item_names), 0)
+        self.assertEqual(len(tables.games["Empty"].all_location_and_group_names), 0)
+
+    def test_checksum(self) -> None:
+        """Test that tables are only used for the data package they were written of."""
+        tables = open_name_tables(write_name_tables(self.gamespackage, {}, {}))
+        self.assertIsNotNone(tables.get("Game", "g"))
+        self.assertIsNone(tables.get("Game", "custom"))
+        self.assertIsNone(tables.get("Game", None))
+        self.assertIsNone(tables.get("Old Game", None))
+
+    def test_same_file(self) -> None:
+        """Test that the same data packages are written once, and other data packages replace them once expired."""
+        path = write_name_tables(self.gamespackage, {}, {})
+        self.assertEqual(path, write_name_tables(dict(reversed(self.gamespackage.items())), {}, {}))
+        other_path = write_name_tables({"Game": self.gamespackage["Game"]}, {}, {})
+        self.assertNotEqual(path, other_path)
+        self.assertEqual(sorted(os.listdir(os.path.dirname(path))),
+                         sorted((os.path.basename(path), os.path.basename(other_path))))
+
+        expired = os.path.getmtime(path) - name_tables_max_age - 1
+        os.utime(path, (expired, expired))
+        write_name_tables({"Other Game": self.gamespackage["Game"]}, {}, {})
+        self.assertNotIn(os.path.basename(path), os.listdir(os.path.dirname(path)))
+        self.assertIn(os.path.basename(other_path), os.listdir(os.path.dirname(path)))
+
+    def test_lookup(self) -> None:
+        """Test that a lookup goes through the tables in order and names unknown ids without storing them."""
+        tables = open_name_tables(write_name_tables(self.gamespackage, {}, {}))
+        lookup = NameLookup("Unknown item (ID:{})", {10: "Override"}, tables.games["Archipelago"].item_names,
+                            tables.games["Game"].item_names)
+        self.assertEqual(lookup[10], "Override")
+        self.assertEqual(lookup[-1], "Nothing")
+        self.assertEqual(lookup[2], "Shield")
+        self.assertEqual(lookup[3], "Unknown item (ID:3)")
+        self.assertNotIn(3, lookup)
+        self.assertIn(-1, lookup)
+
+
+class TestWebHostContextNameTables(unittest.IsolatedAsyncioTestCase):
+    async def test_missing_file(self) -> None:
+        """Test that rooms build their own name tables if the shared ones can't be opened."""
+        import logging
+        from WebHostLib.customserver import WebHostContext
+
+        game_package = {"checksum": "a", "item_name_to_id": {"Nothing": -1}, "location_name_to_id": {"Server": -2}}
+        with tempfile.TemporaryDirectory() as directory:
+            static_server_data = {
+                "non_hintable_names": {},
+                "gamespackage": {"Archipelago": game_package},
+                "item_name_groups": {"Archipelago": {}},
+                "location_name_groups": {"Archipelago": {}},
+                "name_tables_path": os.path.join(directory, "name_tables_removed.bin"),
+            }
+            logger = logging.getLogger("TestWebHostContext")
+            with self.assertLogs(logger, logging.WARNING):
+                ctx = WebHostContext(static_server_data, logger)
+        self.assertIsNone(ctx.name_tables)
+        ctx._init_game_data()
+        self.assertEqual(ctx.item_names["Archipelago"][-1], "Nothing")
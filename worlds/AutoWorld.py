@@ -10,10 +10,12 @@ from random import Random
 from typing import (Any, ClassVar, Dict, FrozenSet, List, Optional, Self, Set, TextIO, Tuple,
                     TYPE_CHECKING, Type, Union)
 
+import generation_profile
 from Options import item_and_loc_options, ItemsAccessibility, OptionGroup, PerGameCommonOptions
 from BaseClasses import CollectionState, Entrance
 from rule_builder.rules import CustomRuleRegister, Rule
 from Utils import Version
+from .WorldIndex import LazyWorldTypes
 
 if TYPE_CHECKING:
     from BaseClasses import CollectionRule, Item, Location, MultiWorld, Region, Tutorial
@@ -89,7 +91,10 @@ class AutoWorldRegister(type):
         new_class = super().__new__(mcs, name, bases, dct)
         new_class.__file__ = sys.modules[new_class.__module__].__file__
         if "game" in dct:
-            if dct["game"] in AutoWorldRegister.world_types:
+            registered = AutoWorldRegister.world_types
+            if isinstance(registered, LazyWorldTypes):
+                registered = registered.loaded  # the other games are only indexed yet
+            if dct["game"] in registered:
                 raise RuntimeError(f"""Game {dct["game"]} already registered in 
                 {AutoWorldRegister.world_types[dct["game"]].__file__} when attempting to register from
                 {new_class.__file__}.""")
@@ -168,6 +173,8 @@ def _timed_call(method: Callable[..., Any], *args: Any,
     start = time.perf_counter()
     ret = method(*args)
     taken = time.perf_counter() - start
+    if generation_profile.active_profile:
+        generation_profile.record(method.__name__, taken, getattr(getattr(method, "__self__", None), "game", ""), player)
     if taken > 1.0:
         if player and multiworld:
             perf_logger.info(f"Took {taken:.4f} seconds in {method.__qualname__} for player {player}, "
@@ -197,6 +204,7 @@ def call_single(multiworld: "MultiWorld", method_name: str, player: int, *args:
         return ret
 
 
+@generation_profile.profiled("call_all", "method_name")
 def call_all(multiworld: "MultiWorld", method_name: str, *args: Any) -> None:
     world_types: Set[AutoWorldRegister] = set()
     for player in multiworld.player_ids:
@@ -214,6 +222,7 @@ def call_all(multiworld: "MultiWorld", method_name: str, *args: Any) -> None:
     call_stage(multiworld, method_name, *args)
 
 
+@generation_profile.profiled("call_stage", "method_name")
 def call_stage(multiworld: "MultiWorld", method_name: str, *args: Any) -> None:
     world_types = {multiworld.worlds[player].__class__ for player in multiworld.player_ids}
     for world_type in sorted(world_types, key=lambda world: world.__name__):
@@ -324,6 +333,11 @@ class World(metaclass=AutoWorldRegister):
     If False, everything is rechecked at every step, which is slower computationally, 
     but may be desirable in complex/dynamic worlds."""
 
+    process_safe_output: ClassVar[bool] = False
+    """If True, generate_output may be run in a forked process when the generator's output_processes setting is used.
+    Only set this if generate_output does nothing besides writing files to the output directory,
+    as any changes it makes to the world, the multiworld or the spoiler are lost."""
+
     multiworld: "MultiWorld"
     """autoset on creation. The MultiWorld object for the currently generating multiworld."""
     player: int
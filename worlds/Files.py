@@ -2,14 +2,16 @@ from __future__ import annotations
 
 import abc
 import json
+import struct
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from enum import IntEnum
 import os
 import threading
 from io import BytesIO
 
-from typing import (ClassVar, Dict, List, Literal, Tuple, Any, Optional, Union, BinaryIO, overload, Sequence,
-                    TYPE_CHECKING)
+from typing import (Callable, ClassVar, Dict, List, Literal, Tuple, Any, Optional, Union, BinaryIO, overload,
+                    Sequence, TYPE_CHECKING)
 
 import bsdiff4
 
@@ -93,7 +95,7 @@ class AutoPatchExtensionRegister(abc.ABCMeta):
             return handler
 
 
-container_version: int = 7
+container_version: int = 8
 
 
 def is_ap_player_container(game: str, data: bytes, player: int):
@@ -312,6 +314,8 @@ class APProcedurePatch(APAutoPatchInterface):
         manifest["procedure"] = self.procedure
         if self.procedure == APDeltaPatch.procedure:
             manifest["compatible_version"] = 5
+        elif any(step == "apply_bsdiff4_blocks" for step, args in self.procedure):
+            manifest["compatible_version"] = 8
         return manifest
 
     def read_contents(self, opened_zipfile: zipfile.ZipFile) -> Dict[str, Any]:
@@ -329,8 +333,8 @@ class APProcedurePatch(APAutoPatchInterface):
     def write_contents(self, opened_zipfile: zipfile.ZipFile) -> None:
         super(APProcedurePatch, self).write_contents(opened_zipfile)
         for file in self.files:
-            opened_zipfile.writestr(file, self.files[file],
-                                    compress_type=zipfile.ZIP_STORED if file.endswith(".bsdiff4") else None)
+            opened_zipfile.writestr(file, self.files[file], compress_type=zipfile.ZIP_STORED
+                                    if file.endswith((".bsdiff4", ".bsdiff4blocks")) else None)
 
     def get_file(self, file: str) -> bytes:
         """ Retrieves a file from the patch container."""
@@ -368,17 +372,82 @@ class APDeltaPatch(APProcedurePatch):
     procedure = [
         ("apply_bsdiff4", ["delta.bsdiff4"])
     ]
+    block_size: ClassVar[Optional[int]] = None
+    """If set, the delta is made of blocks of this size in delta.bsdiff4blocks instead, see `create_block_delta`.
+    Much faster to create for large files, but the patch can only be applied by versions supporting container
+    version 8."""
 
     def __init__(self, *args: Any, patched_path: str = "", **kwargs: Any) -> None:
         super(APDeltaPatch, self).__init__(*args, **kwargs)
         self.patched_path = patched_path
+        if self.block_size and self.procedure == APDeltaPatch.procedure:
+            self.procedure = [("apply_bsdiff4_blocks", ["delta.bsdiff4blocks"])]
 
     def write_contents(self, opened_zipfile: zipfile.ZipFile) -> None:
-        self.write_file("delta.bsdiff4",
-                        bsdiff4.diff(self.get_source_data_with_cache(), open(self.patched_path, "rb").read()))
+        with open(self.patched_path, "rb") as f:
+            patched_data = f.read()
+        if self.block_size:
+            self.write_file("delta.bsdiff4blocks",
+                            create_block_delta(self.get_source_data_with_cache(), patched_data, self.block_size))
+        else:
+            self.write_file("delta.bsdiff4", bsdiff4.diff(self.get_source_data_with_cache(), patched_data))
         super(APDeltaPatch, self).write_contents(opened_zipfile)
 
 
+block_delta_header = struct.Struct("<4sIQI")
+"""Magic, block size, length of the target and number of changed blocks of a block delta."""
+block_delta_block_header = struct.Struct("<II")
+"""Index and length of the bsdiff4 patch of a changed block of a block delta."""
+
+
+def _map_blocks(function: Callable[[bytes, bytes], bytes], blocks: List[Tuple[bytes, bytes]]) -> List[bytes]:
+    """Call a bsdiff4 function for each block, in parallel threads, as bsdiff4 releases the GIL while working."""
+    if len(blocks) < 2:
+        return [function(*block) for block in blocks]
+    with ThreadPoolExecutor(min(len(blocks), os.cpu_count() or 1)) as executor:
+        return list(executor.map(lambda block: function(*block), blocks))
+
+
+def create_block_delta(source: bytes, target: bytes, block_size: int = 1 << 20) -> bytes:
+    """
+    Create a delta to get target from source, made of a bsdiff4 patch of each block of target that differs from the
+    block at the same offset of source. The blocks get diffed in parallel, and as the time bsdiff4 takes grows faster
+    than the size of the data, diffing blocks is faster than diffing the whole file even without threads.
+    Changes that move data between blocks make for a larger delta than bsdiff4 would make of the whole file.
+    """
+    changed = [index for index, start in enumerate(range(0, len(target), block_size))
+               if source[start:start + block_size] != target[start:start + block_size]]
+    patches = _map_blocks(bsdiff4.diff, [(source[index * block_size:(index + 1) * block_size],
+                                          target[index * block_size:(index + 1) * block_size])
+                                         for index in changed])
+    data = [block_delta_header.pack(b"APBD", block_size, len(target), len(changed))]
+    for index, patch in zip(changed, patches):
+        data.append(block_delta_block_header.pack(index, len(patch)))
+        data.append(patch)
+    return b"".join(data)
+
+
+def apply_block_delta(source: bytes, delta: bytes) -> bytes:
+    """Apply a delta created by `create_block_delta` to source."""
+    magic, block_size, target_length, block_count = block_delta_header.unpack_from(delta)
+    if magic != b"APBD":
+        raise InvalidDataError("Not a block delta.")
+    position = block_delta_header.size
+    blocks: List[Tuple[int, bytes]] = []
+    for _ in range(block_count):
+        index, length = block_delta_block_header.unpack_from(delta, position)
+        position += block_delta_block_header.size
+        blocks.append((index, delta[position:position + length]))
+        position += length
+    target = bytearray(source[:target_length])
+    target.extend(bytes(target_length - len(target)))
+    patched = _map_blocks(bsdiff4.patch, [(source[index * block_size:(index + 1) * block_size], patch)
+                                          for index, patch in blocks])
+    for (index, _), block in zip(blocks, patched):
+        target[index * block_size:index * block_size + len(block)] = block
+    return bytes(target)
+
+
 class APTokenTypes(IntEnum):
     WRITE = 0
     COPY = 1
@@ -388,6 +457,16 @@ class APTokenTypes(IntEnum):
     XOR_8 = 5
 
 
+token_header = struct.Struct("<BII")
+"""Type, offset and size of the arguments of a token in a token binary."""
+token_range = struct.Struct("<II")
+"""Length and source offset or value of a COPY or RLE token."""
+# plain ints, as looking up the members of an enum is slow in loops over many tokens
+_write_token = int(APTokenTypes.WRITE)
+_byte_operation_tokens = frozenset(map(int, (APTokenTypes.AND_8, APTokenTypes.OR_8, APTokenTypes.XOR_8)))
+_range_tokens = frozenset(map(int, (APTokenTypes.COPY, APTokenTypes.RLE)))
+
+
 class APTokenMixin:
     """
     A class that defines functions for generating a token binary, for use in patches.
@@ -404,27 +483,24 @@ class APTokenMixin:
         Returns the token binary created from stored tokens.
         :return: A bytes object representing the token data.
         """
-        data = bytearray()
-        data.extend(len(self._tokens).to_bytes(4, "little"))
+        data = [len(self._tokens).to_bytes(4, "little")]
+        pack_header = token_header.pack
         for token_type, offset, args in self._tokens:
-            data.append(token_type)
-            data.extend(offset.to_bytes(4, "little"))
-            if token_type in [APTokenTypes.AND_8, APTokenTypes.OR_8, APTokenTypes.XOR_8]:
+            if token_type in _byte_operation_tokens:
                 assert isinstance(args, int), f"Arguments to AND/OR/XOR must be of type int, not {type(args)}"
-                data.extend(int.to_bytes(1, 4, "little"))
-                data.append(args)
-            elif token_type in [APTokenTypes.COPY, APTokenTypes.RLE]:
+                data.append(pack_header(token_type, offset, 1))
+                data.append(bytes((args,)))
+            elif token_type in _range_tokens:
                 assert isinstance(args, tuple), f"Arguments to COPY/RLE must be of type tuple, not {type(args)}"
-                data.extend(int.to_bytes(8, 4, "little"))
-                data.extend(args[0].to_bytes(4, "little"))
-                data.extend(args[1].to_bytes(4, "little"))
-            elif token_type == APTokenTypes.WRITE:
+                data.append(pack_header(token_type, offset, 8))
+                data.append(token_range.pack(*args))
+            elif token_type == _write_token:
                 assert isinstance(args, bytes), f"Arguments to WRITE must be of type bytes, not {type(args)}"
-                data.extend(len(args).to_bytes(4, "little"))
-                data.extend(args)
+                data.append(pack_header(token_type, offset, len(args)))
+                data.append(args)
             else:
                 raise ValueError(f"Unknown token type {token_type}")
-        return bytes(data)
+        return b"".join(data)
 
     @overload
     def write_token(self,
@@ -477,36 +553,42 @@ class APPatchExtension(metaclass=AutoPatchExtensionRegister):
         """Applies the given bsdiff4 from the patch onto the current file."""
         return bsdiff4.patch(rom, caller.get_file(patch))
 
+    @staticmethod
+    def apply_bsdiff4_blocks(caller: APProcedurePatch, rom: bytes, patch: str) -> bytes:
+        """Applies the given block delta from the patch onto the current file, see `create_block_delta`."""
+        return apply_block_delta(rom, caller.get_file(patch))
+
     @staticmethod
     def apply_tokens(caller: APProcedurePatch, rom: bytes, token_file: str) -> bytes:
         """Applies the given token file from the patch onto the current file."""
-        token_data = caller.get_file(token_file)
+        token_data = memoryview(caller.get_file(token_file))
         rom_data = bytearray(rom)
         token_count = int.from_bytes(token_data[0:4], "little")
+        read_header = token_header.unpack_from
+        read_range = token_range.unpack_from
+        and_8, or_8, xor_8 = int(APTokenTypes.AND_8), int(APTokenTypes.OR_8), int(APTokenTypes.XOR_8)
+        copy, rle = int(APTokenTypes.COPY), int(APTokenTypes.RLE)
         bpr = 4
+        # tokens may overlap, so they have to be applied one by one in order, but each is a single slice operation
         for _ in range(token_count):
-            token_type = token_data[bpr:bpr + 1][0]
-            offset = int.from_bytes(token_data[bpr + 1:bpr + 5], "little")
-            size = int.from_bytes(token_data[bpr + 5:bpr + 9], "little")
-            data = token_data[bpr + 9:bpr + 9 + size]
-            if token_type in [APTokenTypes.AND_8, APTokenTypes.OR_8, APTokenTypes.XOR_8]:
-                arg = data[0]
-                if token_type == APTokenTypes.AND_8:
-                    rom_data[offset] = rom_data[offset] & arg
-                elif token_type == APTokenTypes.OR_8:
-                    rom_data[offset] = rom_data[offset] | arg
-                else:
-                    rom_data[offset] = rom_data[offset] ^ arg
-            elif token_type in [APTokenTypes.COPY, APTokenTypes.RLE]:
-                length = int.from_bytes(data[:4], "little")
-                value = int.from_bytes(data[4:], "little")
-                if token_type == APTokenTypes.COPY:
-                    rom_data[offset: offset + length] = rom_data[value: value + length]
-                else:
-                    rom_data[offset: offset + length] = bytes([value] * length)
+            token_type, offset, size = read_header(token_data, bpr)
+            bpr += token_header.size
+            if token_type == and_8:
+                rom_data[offset] &= token_data[bpr]
+            elif token_type == or_8:
+                rom_data[offset] |= token_data[bpr]
+            elif token_type == xor_8:
+                rom_data[offset] ^= token_data[bpr]
+            elif token_type == copy:
+                length, source = read_range(token_data, bpr)
+                rom_data[offset:offset + length] = rom_data[source:source + length]
+            elif token_type == rle:
+                length, value = read_range(token_data, bpr)
+                rom_data[offset:offset + length] = bytes((value,)) * length
             else:
+                data = token_data[bpr:bpr + size]
                 rom_data[offset:offset + len(data)] = data
-            bpr += 9 + size
+            bpr += size
         return bytes(rom_data)
 
     @staticmethod
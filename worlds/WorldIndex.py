@@ -0,0 +1,243 @@
+"""
+A cached index of the installed worlds, for lazy world loading.
+
+Importing `worlds` normally imports every world to register it. With lazy world loading, which the
+`ARCHIPELAGO_LAZY_WORLDS` environment variable turns on, the index written by the last full import is used instead,
+if no world file changed since. `AutoWorldRegister.world_types` then is a `LazyWorldTypes`, which imports a world only
+once its class is accessed, and the data package, hint blacklists and settings of all worlds come from the index.
+A full import still reuses the indexed data packages of the worlds whose files did not change, instead of building
+them and their checksums again.
+"""
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import logging
+import os
+import sys
+from collections.abc import Iterator, Mapping, MutableMapping, Set
+from typing import TYPE_CHECKING, Any, Callable
+
+if TYPE_CHECKING:
+    from NetUtils import GamesPackage
+    from worlds import WorldSource
+    from worlds.AutoWorld import World
+
+__all__ = ["IndexedWorld", "LazyWorldTypes", "WorldIndex", "get_index_path", "get_source_keys", "get_sources_key",
+           "get_world_source", "lazy_world_loading"]
+
+index_version = 2
+
+lazy_world_loading = os.environ.get("ARCHIPELAGO_LAZY_WORLDS", "").lower() in ("1", "true", "yes")
+"""Whether importing `worlds` should only import worlds once they are used."""
+
+
+@dataclasses.dataclass
+class IndexedWorld:
+    """What the index knows of the world of a game without importing it."""
+    game: str
+    source: str
+    """The path of the world's `WorldSource`."""
+    source_key: str
+    """Identifies the files of the world's source, see `get_source_keys`."""
+    world_version: tuple[int, int, int]
+    manifest: dict[str, Any]
+    hidden: bool
+    hint_blacklist: frozenset[str]
+    settings_key: str
+    settings_class: str | None
+    """The qualified name of the world's settings class, None if it has none."""
+    item_count: int
+    location_count: int
+
+
+@dataclasses.dataclass
+class WorldIndex:
+    key: str
+    """Identifies the world files the index was made of, see `get_sources_key`."""
+    worlds: dict[str, IndexedWorld]
+    """The indexed worlds by game, in the order they got registered in."""
+    data_package: dict[str, GamesPackage]
+    failed_world_loads: dict[str, str]
+
+    @classmethod
+    def build(cls, key: str, source_keys: dict[str, str], world_sources: list[WorldSource],
+              world_types: Mapping[str, type[World]], data_package: dict[str, GamesPackage],
+              failed_world_loads: dict[str, str]) -> WorldIndex:
+        """Index the worlds of a full import of `worlds`."""
+        worlds: dict[str, IndexedWorld] = {}
+        for game, world in world_types.items():
+            source = get_world_source(world, world_sources)
+            if source is None:
+                continue  # not part of a world source, like worlds made up by tests
+            annotation = world.__annotations__.get("settings", None)
+            has_settings = annotation is not None and annotation != "ClassVar[Optional['Group']]"
+            worlds[game] = IndexedWorld(
+                game, source, source_keys[source], tuple(world.world_version), world.manifest, world.hidden,
+                frozenset(world.hint_blacklist), world.settings_key,
+                f"{world.__module__}.{world.__name__}" if has_settings else None,
+                len(world.item_names), len(world.location_names))
+        return cls(key, worlds, {game: data_package[game] for game in worlds}, dict(failed_world_loads))
+
+    @classmethod
+    def load(cls) -> WorldIndex | None:
+        """The cached index, which is of the installed worlds if its key is the current `get_sources_key`."""
+        from Utils import restricted_loads
+        try:
+            with open(get_index_path(), "rb") as f:
+                data = restricted_loads(f.read())
+        except FileNotFoundError:
+            return None
+        except Exception as e:  # a broken cache should only mean importing all worlds
+            logging.debug(f"Could not read world index: {e}")
+            return None
+        if data.get("index_version") != index_version:
+            return None
+        return cls(data["key"], {game: IndexedWorld(**world) for game, world in data["worlds"].items()},
+                   data["data_package"], data["failed_world_loads"])
+
+    def save(self) -> None:
+        """Write the index into the cache directory, replacing the previous one."""
+        from Utils import restricted_dumps
+        path = get_index_path()
+        data = {
+            "index_version": index_version,
+            "key": self.key,
+            "worlds": {game: dataclasses.asdict(world) for game, world in self.worlds.items()},
+            "data_package": self.data_package,
+            "failed_world_loads": self.failed_world_loads,
+        }
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(restricted_dumps(data))
+            os.replace(temp_path, path)
+        except OSError as e:
+            logging.debug(f"Could not write world index: {e}")
+
+    def get_data_package(self, world: type[World], source: str | None, source_key: str | None) -> GamesPackage | None:
+        """
+        The indexed data package of a world, if it is of the same files of the same world source.
+        Some worlds number their items or locations in an order that differs between runs, which changes the checksum,
+        so the names and ids of the world are checked to be the same in the same order, which is cheap next to
+        building the checksum again.
+        """
+        indexed = self.worlds.get(world.game)
+        if indexed is None or indexed.source != source or indexed.source_key != source_key:
+            return None
+        data_package = self.data_package[world.game]
+        if not (_same_order(world.item_name_to_id, data_package["item_name_to_id"])
+                and _same_order(world.location_name_to_id, data_package["location_name_to_id"])
+                and _same_groups(world.item_name_groups, data_package["item_name_groups"])
+                and _same_groups(world.location_name_groups, data_package["location_name_groups"])):
+            return None
+        return data_package
+
+
+def _same_order(name_to_id: Mapping[str, int], indexed_name_to_id: Mapping[str, int]) -> bool:
+    return len(name_to_id) == len(indexed_name_to_id) and list(name_to_id.items()) == list(indexed_name_to_id.items())
+
+
+def _same_groups(groups: Mapping[str, Set[str]], indexed_groups: Mapping[str, list[str]]) -> bool:
+    return groups.keys() == indexed_groups.keys() and all(
+        len(group) == len(indexed_groups[name]) and group.issuperset(indexed_groups[name])
+        for name, group in groups.items())
+
+
+def get_index_path() -> str:
+    from Utils import cache_path
+    return cache_path("worlds", "index.pickle")
+
+
+def get_world_source(world: type[World], world_sources: list[WorldSource]) -> str | None:
+    """The path of the world source a world type is from, None if it is not from one."""
+    if not world.__module__.startswith("worlds."):
+        return None
+    name = world.__module__.split(".")[1]
+    return next((source.path for source in world_sources
+                 if os.path.basename(source.path).rsplit(".", 1)[0] == name), None)
+
+
+def get_source_keys(world_sources: list[WorldSource]) -> dict[str, str]:
+    """
+    Hash of the path, modification time and size of the files of each world source, as well as of the versions of
+    Archipelago and Python, to tell if what got indexed of a world is still valid.
+    """
+    from Utils import __version__
+    source_keys: dict[str, str] = {}
+    for source in world_sources:
+        key = hashlib.sha256(repr((index_version, __version__, sys.version_info[:2],
+                                   source.path, source.is_zip, source.relative)).encode())
+        if source.is_zip:
+            stat = os.stat(source.resolved_path)
+            key.update(repr((stat.st_mtime_ns, stat.st_size)).encode())
+        else:
+            for directory, directories, files in os.walk(source.resolved_path):
+                directories[:] = sorted(name for name in directories if name != "__pycache__")
+                for name in sorted(files):
+                    stat = os.stat(os.path.join(directory, name))
+                    key.update(repr((os.path.relpath(os.path.join(directory, name), source.resolved_path),
+                                     stat.st_mtime_ns, stat.st_size)).encode())
+        source_keys[source.path] = key.hexdigest()
+    return source_keys
+
+
+def get_sources_key(source_keys: dict[str, str]) -> str:
+    """Hash of the keys of all world sources, to tell if an index is of the installed worlds."""
+    return hashlib.sha256(repr(sorted(source_keys.items())).encode()).hexdigest()
+
+
+class LazyWorldTypes(MutableMapping[str, "type[World]"]):
+    """
+    The registered world types by game, which imports the world of a game only once it is looked up.
+    Checking if a game is registered and iterating the games does not import anything, looking up the worlds of all
+    games, like with `values` and `items`, imports all worlds.
+    """
+    loaded: dict[str, type[World]]
+    """The world types that got imported already."""
+
+    def __init__(self, index: WorldIndex, load_source: Callable[[str], None]) -> None:
+        """
+        :param index: The index of the worlds to load.
+        :param load_source: Imports the world source of a path.
+        """
+        self.loaded = {}
+        self._index = index
+        self._load_source = load_source
+
+    def __getitem__(self, game: str) -> type[World]:
+        world = self.loaded.get(game)
+        if world is None:
+            indexed = self._index.worlds.get(game)
+            if indexed is None:
+                raise KeyError(game)
+            self._load_source(indexed.source)
+            world = self.loaded.get(game)
+            if world is None:
+                raise KeyError(game)
+        return world
+
+    def __setitem__(self, game: str, world: type[World]) -> None:
+        self.loaded[game] = world
+        indexed = self._index.worlds.get(game)
+        if indexed is not None:
+            from Utils import Version
+            world.world_version = Version(*indexed.world_version)
+            world.manifest = indexed.manifest
+
+    def __delitem__(self, game: str) -> None:
+        if game not in self:
+            raise KeyError(game)
+        self.loaded.pop(game, None)
+        self._index.worlds.pop(game, None)
+
+    def __contains__(self, game: object) -> bool:
+        return game in self.loaded or game in self._index.worlds
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self._index.worlds
+        yield from (game for game in self.loaded if game not in self._index.worlds)
+
+    def __len__(self) -> int:
+        return len(self._index.worlds) + sum(game not in self._index.worlds for game in self.loaded)
@@ -13,8 +13,10 @@ from types import ModuleType
 from typing import List, Sequence
 from zipfile import ZipFile, BadZipFile
 
-from NetUtils import DataPackage
+from NetUtils import DataPackage, GamesPackage
 from Utils import local_path, user_path, Version, version_tuple, tuplize_version, messagebox
+from .WorldIndex import (LazyWorldTypes, WorldIndex, get_source_keys, get_sources_key, get_world_source,
+                         lazy_world_loading)
 
 local_folder = os.path.dirname(__file__)
 user_folder = user_path("worlds") if user_path() != local_path() else user_path("custom_worlds")
@@ -26,6 +28,7 @@ except OSError:  # can't access/write?
 __all__ = [
     "network_data_package",
     "AutoWorldRegister",
+    "world_index",
     "world_sources",
     "local_folder",
     "user_folder",
@@ -92,131 +95,174 @@ for folder in (folder for folder in (user_folder, local_folder) if folder):
             elif entry.is_file() and entry.name.endswith(".apworld"):
                 world_sources.append(WorldSource(file_name, is_zip=True, relative=relative))
 
-# import all submodules to trigger AutoWorldRegister
 world_sources.sort()
-apworlds: list[WorldSource] = []
-for world_source in world_sources:
-    # load all loose files first:
-    if world_source.is_zip:
-        apworlds.append(world_source)
-    else:
-        world_source.load()
-
-from .AutoWorld import AutoWorldRegister
-
-for world_source in world_sources:
-    if not world_source.is_zip:
-        # look for manifest
-        manifest = {}
-        for dirpath, dirnames, filenames in os.walk(world_source.resolved_path):
-            for file in filenames:
-                if file.endswith("archipelago.json"):
-                    with open(os.path.join(dirpath, file), mode="r", encoding="utf-8") as manifest_file:
-                        manifest = json.load(manifest_file)
+source_keys = get_source_keys(world_sources)
+sources_key = get_sources_key(source_keys)
+
+apworld_module_specs: dict[str, importlib.machinery.ModuleSpec] = {}
+
+
+class APWorldModuleFinder(importlib.abc.MetaPathFinder):
+    def find_spec(
+            self, fullname: str, _path: Sequence[str] | None, _target: ModuleType = None
+    ) -> importlib.machinery.ModuleSpec | None:
+        return apworld_module_specs.get(fullname)
+
+
+def register_apworld(apworld_source: WorldSource) -> None:
+    """Make the world of an .apworld importable as a submodule of worlds."""
+    if not apworld_module_specs:
+        sys.meta_path.insert(0, APWorldModuleFinder())
+    importer = zipimport.zipimporter(apworld_source.resolved_path)
+    world_name = Path(apworld_source.path).stem
+    apworld_module_specs[f"worlds.{world_name}"] = importer.find_spec(f"worlds.{world_name}")
+
+
+# import all submodules to trigger AutoWorldRegister, or only the index of them with lazy world loading
+cached_index = WorldIndex.load()
+world_index = cached_index if lazy_world_loading and cached_index and cached_index.key == sources_key else None
+if world_index is None:
+    apworlds: list[WorldSource] = []
+    for world_source in world_sources:
+        # load all loose files first:
+        if world_source.is_zip:
+            apworlds.append(world_source)
+        else:
+            world_source.load()
+
+    from .AutoWorld import AutoWorldRegister, World
+
+    for world_source in world_sources:
+        if not world_source.is_zip:
+            # look for manifest
+            manifest = {}
+            for dirpath, dirnames, filenames in os.walk(world_source.resolved_path):
+                for file in filenames:
+                    if file.endswith("archipelago.json"):
+                        with open(os.path.join(dirpath, file), mode="r", encoding="utf-8") as manifest_file:
+                            manifest = json.load(manifest_file)
+                        break
+                if manifest:
                     break
-            if manifest:
-                break
-        game = manifest.get("game")
-        if game in AutoWorldRegister.world_types:
-            AutoWorldRegister.world_types[game].world_version = tuplize_version(manifest.get("world_version", "0.0.0"))
-            AutoWorldRegister.world_types[game].manifest = manifest
-
-if apworlds:
-    # encapsulation for namespace / gc purposes
-    def load_apworlds() -> None:
-        global apworlds
-        from .Files import APWorldContainer, InvalidDataError
-        core_compatible: list[tuple[WorldSource, APWorldContainer]] = []
-
-        def fail_world(game_name: str, reason: str, add_as_failed_to_load: bool = True) -> None:
-            if add_as_failed_to_load:
-                failed_world_loads[game_name] = reason
-            logging.warning(reason)
-
-        for apworld_source in apworlds:
-            apworld: APWorldContainer = APWorldContainer(apworld_source.resolved_path)
-            # populate metadata
-            try:
-                apworld.read()
-            except InvalidDataError as e:
-                if version_tuple < (0, 7, 0):
-                    logging.error(
-                        f"Invalid or missing manifest file for {apworld_source.resolved_path}. "
-                        "This apworld will stop working with Archipelago 0.7.0."
-                    )
-                    logging.error(e)
+            game = manifest.get("game")
+            if game in AutoWorldRegister.world_types:
+                AutoWorldRegister.world_types[game].world_version = \
+                    tuplize_version(manifest.get("world_version", "0.0.0"))
+                AutoWorldRegister.world_types[game].manifest = manifest
+
+    if apworlds:
+        # encapsulation for namespace / gc purposes
+        def load_apworlds() -> None:
+            global apworlds
+            from .Files import APWorldContainer, InvalidDataError
+            core_compatible: list[tuple[WorldSource, APWorldContainer]] = []
+
+            def fail_world(game_name: str, reason: str, add_as_failed_to_load: bool = True) -> None:
+                if add_as_failed_to_load:
+                    failed_world_loads[game_name] = reason
+                logging.warning(reason)
+
+            for apworld_source in apworlds:
+                apworld: APWorldContainer = APWorldContainer(apworld_source.resolved_path)
+                # populate metadata
+                try:
+                    apworld.read()
+                except InvalidDataError as e:
+                    if version_tuple < (0, 7, 0):
+                        logging.error(
+                            f"Invalid or missing manifest file for {apworld_source.resolved_path}. "
+                            "This apworld will stop working with Archipelago 0.7.0."
+                        )
+                        logging.error(e)
+                    else:
+                        raise e
+                except BadZipFile as e:
+                    err_message = (f"The world source {apworld_source.resolved_path} is not a valid zip. "
+                                   "It is likely either corrupted, or was packaged incorrectly.")
+
+                    if sys.stdout:
+                        raise RuntimeError(err_message) from e
+                    else:
+                        messagebox("Couldn't load worlds", err_message, error=True)
+                        sys.exit(1)
+
+                if apworld.minimum_ap_version and apworld.minimum_ap_version > version_tuple:
+                    fail_world(apworld.game,
+                               f"Did not load {apworld_source.path} "
+                               f"as its minimum core version {apworld.minimum_ap_version} "
+                               f"is higher than current core version {version_tuple}.")
+                elif apworld.maximum_ap_version and apworld.maximum_ap_version < version_tuple:
+                    fail_world(apworld.game,
+                               f"Did not load {apworld_source.path} "
+                               f"as its maximum core version {apworld.maximum_ap_version} "
+                               f"is lower than current core version {version_tuple}.")
                 else:
-                    raise e
-            except BadZipFile as e:
-                err_message = (f"The world source {apworld_source.resolved_path} is not a valid zip. "
-                               "It is likely either corrupted, or was packaged incorrectly.")
+                    core_compatible.append((apworld_source, apworld))
+            # load highest version first
+            core_compatible.sort(
+                key=lambda element: element[1].world_version if element[1].world_version else Version(0, 0, 0),
+                reverse=True)
 
-                if sys.stdout:
-                    raise RuntimeError(err_message) from e
+            for apworld_source, apworld in core_compatible:
+                if apworld.game and apworld.game in AutoWorldRegister.world_types:
+                    fail_world(apworld.game,
+                               f"Did not load {apworld_source.path} "
+                               f"as its game {apworld.game} is already loaded.",
+                               add_as_failed_to_load=False)
                 else:
-                    messagebox("Couldn't load worlds", err_message, error=True)
-                    sys.exit(1)
-
-            if apworld.minimum_ap_version and apworld.minimum_ap_version > version_tuple:
-                fail_world(apworld.game,
-                           f"Did not load {apworld_source.path} "
-                           f"as its minimum core version {apworld.minimum_ap_version} "
-                           f"is higher than current core version {version_tuple}.")
-            elif apworld.maximum_ap_version and apworld.maximum_ap_version < version_tuple:
-                fail_world(apworld.game,
-                           f"Did not load {apworld_source.path} "
-                           f"as its maximum core version {apworld.maximum_ap_version} "
-                           f"is lower than current core version {version_tuple}.")
-            else:
-                core_compatible.append((apworld_source, apworld))
-        # load highest version first
-        core_compatible.sort(
-            key=lambda element: element[1].world_version if element[1].world_version else Version(0, 0, 0),
-            reverse=True)
-
-        apworld_module_specs = {}
-        class APWorldModuleFinder(importlib.abc.MetaPathFinder):
-            def find_spec(
-                    self, fullname: str, _path: Sequence[str] | None, _target: ModuleType = None
-            ) -> importlib.machinery.ModuleSpec | None:
-                return apworld_module_specs.get(fullname)
+                    register_apworld(apworld_source)
+                    apworld_source.load()
+                    if apworld.game in AutoWorldRegister.world_types:
+                        # world could fail to load at this point
+                        if apworld.world_version:
+                            AutoWorldRegister.world_types[apworld.game].world_version = apworld.world_version
 
-        sys.meta_path.insert(0, APWorldModuleFinder())
+                        assert apworld.path
+                        with ZipFile(apworld.path, "r") as zf:
+                            manifest = apworld.read_contents(zf)
+                        # version/compatible_version shouldn't be needed by world,
+                        # makes it consistent with folder world
+                        manifest.pop("version", None)
+                        manifest.pop("compatible_version", None)
+                        AutoWorldRegister.world_types[apworld.game].manifest = manifest
+
+        load_apworlds()
+        del load_apworlds
+
+    del apworlds
+
+    # Build the data package for each game, unless the index has the same data package.
+    def get_data_package(world_name: str, world: type[World]) -> GamesPackage:
+        if cached_index:
+            source = get_world_source(world, world_sources)
+            data_package = cached_index.get_data_package(world, source, source_keys.get(source))
+            if data_package:
+                return data_package
+        return world.get_data_package_data()
+
+    network_data_package: DataPackage = {
+        "games": {world_name: get_data_package(world_name, world)
+                  for world_name, world in AutoWorldRegister.world_types.items()},
+    }
+    del get_data_package
+    world_index = WorldIndex.build(sources_key, source_keys, world_sources, AutoWorldRegister.world_types,
+                                   network_data_package["games"], failed_world_loads)
+    if not cached_index or cached_index.key != sources_key:
+        world_index.save()
+else:
+    # only import worlds once they are used, see WorldIndex
+    def load_world_source(path: str) -> None:
+        next(world_source for world_source in world_sources if world_source.path == path).load()
 
-        for apworld_source, apworld in core_compatible:
-            if apworld.game and apworld.game in AutoWorldRegister.world_types:
-                fail_world(apworld.game,
-                           f"Did not load {apworld_source.path} "
-                           f"as its game {apworld.game} is already loaded.",
-                           add_as_failed_to_load=False)
-            else:
-                importer = zipimport.zipimporter(apworld_source.resolved_path)
-                world_name = Path(apworld.path).stem
-
-                spec = importer.find_spec(f"worlds.{world_name}")
-                apworld_module_specs[f"worlds.{world_name}"] = spec
-
-                apworld_source.load()
-                if apworld.game in AutoWorldRegister.world_types:
-                    # world could fail to load at this point
-                    if apworld.world_version:
-                        AutoWorldRegister.world_types[apworld.game].world_version = apworld.world_version
-
-                    assert apworld.path
-                    with ZipFile(apworld.path, "r") as zf:
-                        manifest = apworld.read_contents(zf)
-                    # version/compatible_version shouldn't be needed by world, makes it consistent with folder world
-                    manifest.pop("version", None)
-                    manifest.pop("compatible_version", None)
-                    AutoWorldRegister.world_types[apworld.game].manifest = manifest
-
-    load_apworlds()
-    del load_apworlds
-
-del apworlds
-
-# Build the data package for each game.
-network_data_package: DataPackage = {
-    "games": {world_name: world.get_data_package_data() for world_name, world in AutoWorldRegister.world_types.items()},
-}
+    # the worlds of .apworlds can be imported directly, like by settings, so they all get registered right away
+    indexed_sources = {indexed_world.source for indexed_world in world_index.worlds.values()}
+    for world_source in world_sources:
+        if world_source.is_zip and world_source.path in indexed_sources:
+            register_apworld(world_source)
+    del indexed_sources
 
+    from .AutoWorld import AutoWorldRegister
+    AutoWorldRegister.world_types = LazyWorldTypes(world_index, load_world_source)
+    failed_world_loads.update(world_index.failed_world_loads)
+    network_data_package = {"games": world_index.data_package}
+del cached_index
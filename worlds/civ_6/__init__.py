@@ -85,6 +85,7 @@ class CivVIWorld(World):
 
     game = "Civilization VI"
     topology_present = False
+    process_safe_output = True
     options_dataclass = CivVIOptions
     options: CivVIOptions  # type: ignore
 
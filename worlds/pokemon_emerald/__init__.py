@@ -101,6 +101,8 @@ class PokemonEmeraldWorld(World):
     game = "Pokemon Emerald"
     web = PokemonEmeraldWebWorld()
     topology_present = True
+    # generate_output only changes the modified data it creates and deletes again, and writes the patch
+    process_safe_output = True
 
     settings_key = "pokemon_emerald_settings"
     settings: ClassVar[PokemonEmeraldSettings]
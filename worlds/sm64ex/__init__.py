@@ -31,6 +31,7 @@ class SM64World(World):
 
     game: str = "Super Mario 64"
     topology_present = False
+    process_safe_output = True
 
     web = SM64Web()
 
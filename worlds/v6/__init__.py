@@ -29,6 +29,7 @@ class V6World(World):
 
     game: str = "VVVVVV"
     topology_present = False
+    process_safe_output = True
     web = V6Web()
 
     item_name_to_id = item_table